@@ -0,0 +1,178 @@
+"""
+Read state for broadcast notifications.
+
+A broadcast is stored once. For each user, a broadcast counts as read if its id is
+at or below the user's `BroadcastReadCursor.read_up_to`, or if the user has a
+`BroadcastReceipt` for it (individually read items above the cursor). Users only see
+broadcasts created after they joined, and never their own.
+
+Marking everything read moves the cursor and drops the receipts, so per-user state
+stays O(1) plus a handful of receipts, however many broadcasts there are.
+
+Unread counts are served from Redis (broker) with one pipelined read:
+`notif:broadcast:latest` is the newest broadcast id, and `notif:bunread:<user_id>`
+holds `upto` (newest id when the user's count was loaded) and `count` (their unread
+broadcasts up to it). The unread count is `count + (latest - upto)`. New broadcasts
+only move `latest` (and take one off the sender's count); marking read adjusts the
+user's `count`. A missing hash is loaded from Postgres on the next read and expires
+after `NOTIFICATION_UNREAD_TTL`, which bounds drift (e.g. from retention).
+"""
+import logging
+
+from django.db.models import Max
+
+from varsigram.redis_client import get_redis
+
+from .models import BroadcastNotification, BroadcastReadCursor, BroadcastReceipt
+from .unread import UNREAD_TTL
+
+logger = logging.getLogger(__name__)
+
+LATEST_BROADCAST_KEY = 'notif:broadcast:latest'
+
+# Raise the latest broadcast id, never lower it
+SET_MAX_LUA = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 1
+"""
+# Adjust a user's cached count only if it is loaded
+ADJUST_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+return redis.call('HINCRBY', KEYS[1], 'count', ARGV[1])
+"""
+
+_scripts = {}
+
+
+def _get_script(name, source):
+    if name not in _scripts:
+        _scripts[name] = get_redis('broker').register_script(source)
+    return _scripts[name]
+
+
+def broadcast_unread_key(user_id):
+    return f"notif:bunread:{user_id}"
+
+
+def visible_broadcasts(user):
+    return BroadcastNotification.objects.filter(created_at__gte=user.date_joined).exclude(sender=user)
+
+
+def read_cursor(user):
+    cursor = BroadcastReadCursor.objects.filter(user=user).values_list('read_up_to', flat=True).first()
+    return cursor or 0
+
+
+def _latest_broadcast_id():
+    return BroadcastNotification.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def _unread_from_db(user, upto=None):
+    """Two COUNTs over indexed ranges above the cursor (and up to `upto`, if given)."""
+    cursor = read_cursor(user)
+    broadcasts = visible_broadcasts(user).filter(id__gt=cursor)
+    receipts = BroadcastReceipt.objects.filter(user=user, broadcast_id__gt=cursor)
+    if upto is not None:
+        broadcasts, receipts = broadcasts.filter(id__lte=upto), receipts.filter(broadcast_id__lte=upto)
+    unread = broadcasts.count()
+    if not unread:
+        return 0
+    return unread - receipts.count()
+
+
+def unread_broadcast_count(user):
+    """One pipelined Redis read; a cold user costs one MAX and two COUNTs."""
+    try:
+        r = get_redis('broker')
+        pipe = r.pipeline(transaction=False)
+        pipe.get(LATEST_BROADCAST_KEY)
+        pipe.hmget(broadcast_unread_key(user.id), ['upto', 'count'])
+        latest, (upto, count) = pipe.execute()
+        if upto is None or count is None:
+            upto = _latest_broadcast_id()
+            count = _unread_from_db(user, upto)
+            pipe = r.pipeline(transaction=False)
+            pipe.hset(broadcast_unread_key(user.id), mapping={'upto': upto, 'count': count})
+            pipe.expire(broadcast_unread_key(user.id), UNREAD_TTL)
+            pipe.execute()
+            if latest is None:
+                _get_script('set_max', SET_MAX_LUA)(keys=[LATEST_BROADCAST_KEY], args=[upto])
+                latest = upto
+        return max(0, int(count) + max(0, int(latest or 0) - int(upto)))
+    except Exception:
+        logger.warning(f"Broadcast unread counter unavailable for user {user.id}; counting in Postgres", exc_info=True)
+    return _unread_from_db(user)
+
+
+def _adjust_broadcast_unread(user_id, delta):
+    try:
+        _get_script('adjust', ADJUST_LUA)(keys=[broadcast_unread_key(user_id)], args=[delta])
+    except Exception:
+        logger.warning(f"Failed to adjust broadcast unread counter for user {user_id}", exc_info=True)
+
+
+def note_broadcast_created(broadcast):
+    """Count a committed broadcast: raise the latest id and take it off the sender's count."""
+    try:
+        _get_script('set_max', SET_MAX_LUA)(keys=[LATEST_BROADCAST_KEY], args=[broadcast.id])
+    except Exception:
+        logger.warning(f"Failed to record broadcast {broadcast.id} in Redis", exc_info=True)
+    if broadcast.sender_id:
+        _adjust_broadcast_unread(broadcast.sender_id, -1)
+
+
+def broadcast_page(user, limit, keyset=None):
+    """Return up to `limit` broadcasts (newest first) with `is_read`/`read_at` resolved for `user`.
+
+    `keyset` is an optional Q selecting the broadcasts after the last item already seen.
+    """
+    broadcasts = visible_broadcasts(user)
+    if keyset is not None:
+        broadcasts = broadcasts.filter(keyset)
+    broadcasts = list(broadcasts.order_by('-created_at', '-id')[:limit])
+    if not broadcasts:
+        return []
+
+    cursor = read_cursor(user)
+    receipts = dict(
+        BroadcastReceipt.objects.filter(
+            user=user, broadcast_id__in=[b.id for b in broadcasts if b.id > cursor]
+        ).values_list('broadcast_id', 'read_at')
+    )
+    for b in broadcasts:
+        b.is_read = b.id <= cursor or b.id in receipts
+        b.read_at = receipts.get(b.id)
+    return broadcasts
+
+
+def mark_broadcast_read(user, broadcast):
+    """Record that `user` read one broadcast. Returns False if it was already read."""
+    if broadcast.id <= read_cursor(user):
+        return False
+    _, created = BroadcastReceipt.objects.get_or_create(user=user, broadcast=broadcast)
+    if created:
+        _adjust_broadcast_unread(user.id, -1)
+    return created
+
+
+def mark_all_broadcasts_read(user):
+    """Move the user's cursor to the newest broadcast and drop the receipts it covers. Returns how many became read."""
+    unread = unread_broadcast_count(user)
+    latest = BroadcastNotification.objects.order_by('-id').values_list('id', flat=True).first()
+    if latest is None:
+        return 0
+    BroadcastReadCursor.objects.update_or_create(user=user, defaults={'read_up_to': latest})
+    BroadcastReceipt.objects.filter(user=user, broadcast_id__lte=latest).delete()
+    try:
+        pipe = get_redis('broker').pipeline(transaction=False)
+        pipe.hset(broadcast_unread_key(user.id), mapping={'upto': latest, 'count': 0})
+        pipe.expire(broadcast_unread_key(user.id), UNREAD_TTL)
+        pipe.execute()
+    except Exception:
+        logger.warning(f"Failed to reset broadcast unread counter for user {user.id}", exc_info=True)
+    return unread
@@ -0,0 +1,55 @@
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .realtime import broadcast_groups, set_online, total_unread_count, user_group
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live notification stream for the authenticated user (`ws/notifications/?token=<access>`).
+
+    Sends the current unread count on connect, then forwards events pushed through
+    notifications_app.realtime: `notification`, `unread_count`, `broadcast` and
+    `feed_new_posts`. Broadcasts of types the user muted are never delivered.
+    Clients may send `{"type": "ping"}` to keep the socket alive.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.user_id = user.id
+        self.groups_joined = [user_group(user.id), *broadcast_groups(user.notification_mutes)]
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+        await sync_to_async(set_online)(user.id, 1)
+        unread_count = await database_sync_to_async(total_unread_count)(user)
+        await self.send_json({'type': 'unread_count', 'unread_count': unread_count})
+
+    async def disconnect(self, code):
+        if not hasattr(self, 'groups_joined'):
+            return
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        await sync_to_async(set_online)(self.user_id, -1)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def mutes_changed(self, message):
+        wanted = [user_group(self.user_id), *broadcast_groups(message['mutes'])]
+        for group in set(self.groups_joined) - set(wanted):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in set(wanted) - set(self.groups_joined):
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.groups_joined = wanted
+
+    async def push_event(self, message):
+        payload = message.get('payload') or {}
+        if message.get('event') == 'broadcast' and str(payload.get('sender_id')) == str(self.user_id):
+            return  # senders never see their own broadcasts
+        await self.send_json({'type': message['event'], **payload})
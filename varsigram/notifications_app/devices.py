@@ -0,0 +1,101 @@
+"""
+Per-user registry of active FCM tokens, cached in Redis.
+
+`devices:<user_id>` is a set of the user's active registration tokens plus the
+`__loaded__` marker, so users without devices are cached too and a send never queries
+`Device`. Sets are filled from Postgres on a miss (one query for every missing user in
+the batch) and dropped whenever a user's devices change: register/unregister, FCM
+reporting a token as unregistered, and `prune_stale_devices`.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from varsigram.redis_client import get_redis
+
+from .models import Device
+
+logger = logging.getLogger(__name__)
+
+DEVICES_LOADED = '__loaded__'
+DEVICE_TOKENS_TTL = getattr(settings, 'DEVICE_TOKENS_TTL', 60 * 60 * 24)  # 1 day
+
+
+def devices_key(user_id):
+    return f"devices:{user_id}"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _tokens_from_db(user_ids):
+    tokens = {uid: [] for uid in user_ids}
+    devices = Device.objects.filter(user_id__in=user_ids, active=True).values_list('user_id', 'registration_id')
+    for user_id, token in devices.iterator(chunk_size=2000):
+        tokens[user_id].append(token)
+    return tokens
+
+
+def get_user_tokens(user_ids):
+    """Return {user_id: [active tokens]} for the users that have any.
+
+    One pipelined SMEMBERS per batch; users missing from Redis cost one shared query.
+    Falls back to Postgres if Redis is unavailable.
+    """
+    ids = [int(uid) for uid in user_ids]
+    if not ids:
+        return {}
+    try:
+        r = get_redis('cache')
+        pipe = r.pipeline(transaction=False)
+        for uid in ids:
+            pipe.smembers(devices_key(uid))
+        found = {}
+        missing = []
+        for uid, members in zip(ids, pipe.execute()):
+            if not members:
+                missing.append(uid)
+                continue
+            found[uid] = [t for t in map(_decode, members) if t != DEVICES_LOADED]
+
+        if missing:
+            loaded = _tokens_from_db(missing)
+            pipe = r.pipeline(transaction=False)
+            for uid, tokens in loaded.items():
+                pipe.sadd(devices_key(uid), DEVICES_LOADED, *tokens)
+                pipe.expire(devices_key(uid), DEVICE_TOKENS_TTL)
+            pipe.execute()
+            found.update(loaded)
+    except Exception:
+        logger.warning("Device registry unavailable; loading tokens from Postgres", exc_info=True)
+        found = _tokens_from_db(ids)
+    return {uid: tokens for uid, tokens in found.items() if tokens}
+
+
+def invalidate_user_devices(user_ids):
+    """Drop the cached token sets once the current transaction commits (best-effort)."""
+    keys = [devices_key(uid) for uid in {uid for uid in user_ids if uid is not None}]
+    if not keys:
+        return
+
+    def drop():
+        try:
+            get_redis('cache').delete(*keys)
+        except Exception:
+            logger.warning("Failed to invalidate cached device tokens", exc_info=True)
+
+    transaction.on_commit(drop)
+
+
+def deactivate_tokens(tokens):
+    """Mark `tokens` inactive with one UPDATE and drop their owners' cached sets. Returns rows updated."""
+    tokens = list(tokens)
+    if not tokens:
+        return 0
+    devices = Device.objects.filter(registration_id__in=tokens, active=True)
+    user_ids = set(devices.values_list('user_id', flat=True))
+    updated = devices.update(active=False)
+    invalidate_user_devices(user_ids)
+    return updated
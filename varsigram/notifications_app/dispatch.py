@@ -0,0 +1,180 @@
+"""
+Asynchronous dispatch of personal notifications.
+
+Request handlers call `notify(recipient_id, type, title, body, data)`, which costs one
+pipelined Redis round trip: the event is appended to `notif:pending:<recipient_id>` and,
+if no flush is scheduled for that recipient yet, `flush_user_notifications` is queued
+with a countdown of `NOTIFICATION_GROUP_WINDOW_SECONDS`. Everything that reaches the
+recipient within that window is handled by the one flush on the `notifications` queue:
+one device query, one bulk INSERT and one FCM batch. More than
+`NOTIFICATION_GROUP_PUSH_LIMIT` events collapse into a single summary push; every event
+still gets its own `Notification` row.
+
+Likes, comments and rewards on a post are coalesced instead: events for the same
+(recipient, type, post) are kept in the hash `notif:group:<recipient>:<type>:<post_id>`
+keyed by actor, and `flush_notification_group` runs once per
+`NOTIFICATION_COALESCE_WINDOW_SECONDS`. It emits one aggregated notification
+("Ada and 23 others liked your post.") that updates the recipient's unread row for that
+post if there is one, so rows and pushes are bounded by distinct (recipient, type, post)
+per window rather than by engagement volume.
+
+Events are enqueued after the surrounding transaction commits. If Redis is unavailable
+the event is handed to `deliver_notifications` directly, ungrouped.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+GROUP_WINDOW_SECONDS = getattr(settings, 'NOTIFICATION_GROUP_WINDOW_SECONDS', 10)
+GROUP_PUSH_LIMIT = getattr(settings, 'NOTIFICATION_GROUP_PUSH_LIMIT', 3)
+COALESCE_WINDOW_SECONDS = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW_SECONDS', 60)
+PENDING_TTL = 60 * 60  # safety net if a flush task is lost
+
+# Types coalesced per post, with the body used once more than one actor is involved
+COALESCE_TEMPLATES = {
+    'like': '{actors} liked your post.',
+    'comment': '{actors} commented on your post.',
+    'reward_point': '{actors} rewarded your post.',
+}
+
+
+def pending_key(recipient_id):
+    return f"notif:pending:{recipient_id}"
+
+
+def flush_lock_key(recipient_id):
+    return f"notif:flush:{recipient_id}"
+
+
+def group_key(recipient_id, type, post_id):
+    return f"notif:group:{recipient_id}:{type}:{post_id}"
+
+
+def group_flush_lock_key(recipient_id, type, post_id):
+    return f"notif:groupflush:{recipient_id}:{type}:{post_id}"
+
+
+def build_event(type, title, body, data=None, actor_id=None, actor_name=None):
+    event = {'type': type, 'title': title, 'body': body, 'data': {**(data or {}), 'type': type}}
+    post_id = event['data'].get('post_id')
+    if type in COALESCE_TEMPLATES and post_id and actor_id is not None:
+        event.update({
+            'group_key': f"{type}:{post_id}",
+            'actor_id': str(actor_id),
+            'actor_name': actor_name or '',
+            'count': 1,
+            'ts': time.time(),
+        })
+    return event
+
+
+def aggregate_body(type, actor_name, total):
+    """'Ada', 'Ada and 1 other', 'Ada and 23 others' rendered into the type's template."""
+    others = total - 1
+    if others <= 0:
+        actors = actor_name
+    else:
+        actors = f"{actor_name} and {others} other{'s' if others > 1 else ''}"
+    return COALESCE_TEMPLATES[type].format(actors=actors)
+
+
+def _enqueue_group(recipient_id, event):
+    from .tasks import deliver_notifications, flush_notification_group
+    post_id = event['data']['post_id']
+    key = group_key(recipient_id, event['type'], post_id)
+    try:
+        pipe = get_redis('broker').pipeline(transaction=True)
+        # One field per actor, so an actor who likes, unlikes and likes again counts once
+        pipe.hset(key, event['actor_id'], json.dumps(event))
+        pipe.expire(key, PENDING_TTL)
+        pipe.set(group_flush_lock_key(recipient_id, event['type'], post_id), '1', nx=True, ex=COALESCE_WINDOW_SECONDS)
+        _, _, scheduled = pipe.execute()
+    except Exception:
+        logger.warning(f"Notification buffer unavailable; sending to user {recipient_id} uncoalesced", exc_info=True)
+        deliver_notifications.delay(recipient_id, [event])
+        return
+    if scheduled:
+        flush_notification_group.apply_async(args=[recipient_id, event['type'], post_id], countdown=COALESCE_WINDOW_SECONDS)
+
+
+def _enqueue(recipient_id, event):
+    from .preferences import is_muted
+    from .tasks import deliver_notifications, flush_user_notifications
+    if is_muted(recipient_id, event['type']):
+        return
+    if 'group_key' in event and COALESCE_WINDOW_SECONDS > 0:
+        _enqueue_group(recipient_id, event)
+        return
+    if GROUP_WINDOW_SECONDS <= 0:
+        deliver_notifications.delay(recipient_id, [event])
+        return
+    try:
+        pipe = get_redis('broker').pipeline(transaction=True)
+        pipe.rpush(pending_key(recipient_id), json.dumps(event))
+        pipe.expire(pending_key(recipient_id), PENDING_TTL)
+        pipe.set(flush_lock_key(recipient_id), '1', nx=True, ex=GROUP_WINDOW_SECONDS)
+        _, _, scheduled = pipe.execute()
+    except Exception:
+        logger.warning(f"Notification buffer unavailable; sending to user {recipient_id} ungrouped", exc_info=True)
+        deliver_notifications.delay(recipient_id, [event])
+        return
+    if scheduled:
+        flush_user_notifications.apply_async(args=[recipient_id], countdown=GROUP_WINDOW_SECONDS)
+
+
+def notify(recipient_id, type, title, body, data=None, actor_id=None, actor_name=None):
+    """Queue a personal notification for `recipient_id`; never blocks on the database or FCM.
+
+    Likes, comments and rewards that pass `actor_id`/`actor_name` and a `post_id` in
+    `data` are coalesced per post.
+    """
+    if not recipient_id:
+        return
+    event = build_event(type, title, body, data, actor_id=actor_id, actor_name=actor_name)
+    try:
+        recipient_id = int(recipient_id)
+        transaction.on_commit(lambda: _enqueue(recipient_id, event), robust=True)
+    except Exception:
+        logger.exception(f"Failed to queue {type} notification for user {recipient_id}")
+
+
+def take_pending(recipient_id):
+    """Atomically remove and return the events buffered for `recipient_id`.
+
+    The flush lock is released first, so an event arriving from here on schedules its
+    own flush instead of waiting on this one.
+    """
+    r = get_redis('broker')
+    r.delete(flush_lock_key(recipient_id))
+    pipe = r.pipeline(transaction=True)
+    pipe.lrange(pending_key(recipient_id), 0, -1)
+    pipe.delete(pending_key(recipient_id))
+    raw, _ = pipe.execute()
+    return [json.loads(item) for item in raw]
+
+
+def take_group(recipient_id, type, post_id):
+    """Atomically remove the coalesced events for one (recipient, type, post) and merge them.
+
+    Returns the newest event with `count` set to the number of distinct actors and
+    `actor_ids` listing them, or None.
+    """
+    r = get_redis('broker')
+    r.delete(group_flush_lock_key(recipient_id, type, post_id))
+    key = group_key(recipient_id, type, post_id)
+    pipe = r.pipeline(transaction=True)
+    pipe.hvals(key)
+    pipe.delete(key)
+    raw, _ = pipe.execute()
+    events = [json.loads(item) for item in raw]
+    if not events:
+        return None
+    latest = max(events, key=lambda e: e.get('ts', 0))
+    return {**latest, 'count': len(events), 'actor_ids': [e['actor_id'] for e in events]}
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from notifications_app.retention import (
+    ARCHIVE_READ, READ_RETENTION_DAYS, expired_read_notifications, purge_archived_notifications,
+    purge_old_broadcasts, purge_read_notifications,
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive read notifications older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=READ_RETENTION_DAYS,
+                            help=f'Keep read notifications for this many days (default {READ_RETENTION_DAYS})')
+        parser.add_argument('--archive', action='store_true', default=ARCHIVE_READ,
+                            help='Copy rows to ArchivedNotification before deleting them')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be removed')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = expired_read_notifications(options['days']).count()
+            self.stdout.write(f'{count} read notifications are older than {options["days"]} days.')
+            return
+        removed = purge_read_notifications(
+            days=options['days'], archive=options['archive'], max_batches=options['max_batches'],
+        )
+        archived_deleted = purge_archived_notifications()
+        broadcasts_deleted = purge_old_broadcasts()
+        verb = 'Archived' if options['archive'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} read notifications; deleted {archived_deleted} expired archive rows '
+            f'and {broadcasts_deleted} old broadcasts.'
+        ))
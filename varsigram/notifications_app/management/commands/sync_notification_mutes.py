@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from notifications_app.preferences import sync_notification_mutes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis notification mute bitmaps from User.notification_mutes'
+
+    def handle(self, *args, **options):
+        count = sync_notification_mutes()
+        self.stdout.write(self.style.SUCCESS(f'Synced notification mutes for {count} users.'))
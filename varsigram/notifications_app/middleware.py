@@ -0,0 +1,43 @@
+"""
+JWT authentication for websocket connections.
+
+Browsers cannot set headers on a websocket handshake, so the access token is read
+from the `token` query parameter (or an `Authorization: Bearer` header for native
+clients) and validated with the same simplejwt settings as the REST API.
+"""
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    if not raw_token:
+        return AnonymousUser()
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except Exception:
+        return AnonymousUser()
+
+
+def _token_from_scope(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if query.get('token'):
+        return query['token'][0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            scheme, _, token = value.decode().partition(' ')
+            if scheme.lower() == 'bearer':
+                return token.strip()
+    return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user'] = await get_user_for_token(_token_from_scope(scope))
+        return await super().__call__(scope, receive, send)
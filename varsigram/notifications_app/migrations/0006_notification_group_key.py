@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications_app', '0005_broadcastnotification_broadcastreadcursor_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='group_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'group_key'], name='notification_user_group_idx'),
+        ),
+    ]
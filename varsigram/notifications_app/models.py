@@ -33,12 +33,103 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True) # When the notification was marked as read
+    # Set on coalesced notifications ("<type>:<post_id>"); new events for the same key update the unread row
+    group_key = models.CharField(max_length=255, blank=True, null=True)
 
     class Meta:
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ['-created_at'] # Order by most recent first
+        indexes = [
+            models.Index(fields=['user', 'group_key'], name='notification_user_group_idx'),
+            # List pages: keyset on (created_at, id) per user
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_recent_idx'),
+            # Unread counts and mark-all-read
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_unread_idx'),
+            # Retention sweeps over read notifications
+            models.Index(fields=['read_at'], condition=models.Q(is_read=True), name='notification_read_at_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.email}: {self.title} ({'Read' if self.is_read else 'Unread'})"
 
+
+
+class ArchivedNotification(models.Model):
+    """
+    A read `Notification` moved out of the hot table by the retention job (see
+    notifications_app.retention). Keeps the original id; not shown in the app.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_notifications')
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    data = models.JSONField(blank=True, null=True)
+    group_key = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Archived Notification"
+        verbose_name_plural = "Archived Notifications"
+
+    def __str__(self):
+        return f"Archived notification {self.id} for user {self.user_id}"
+
+
+class BroadcastNotification(models.Model):
+    """
+    A notification shown to every user (e.g. "New Post"), stored once instead of one
+    `Notification` row per recipient. Read state lives in `BroadcastReadCursor` and
+    `BroadcastReceipt` (see notifications_app.broadcasts).
+    """
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='sent_broadcasts',
+        blank=True,
+        null=True,  # Senders do not see their own broadcasts
+    )
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    data = models.JSONField(blank=True, null=True, help_text="Custom data payload for the notification")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Broadcast Notification"
+        verbose_name_plural = "Broadcast Notifications"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Broadcast: {self.title} ({self.created_at:%Y-%m-%d %H:%M})"
+
+
+class BroadcastReadCursor(models.Model):
+    """Every broadcast with id <= `read_up_to` counts as read for the user."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='broadcast_cursor',
+    )
+    read_up_to = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Broadcasts read up to {self.read_up_to} for user {self.user_id}"
+
+
+class BroadcastReceipt(models.Model):
+    """Sparse per-user override: a single broadcast newer than the cursor that the user has read."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='broadcast_receipts')
+    broadcast = models.ForeignKey(BroadcastNotification, on_delete=models.CASCADE, related_name='receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'broadcast'], name='unique_broadcast_receipt')
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} read broadcast {self.broadcast_id}"
@@ -0,0 +1,197 @@
+"""
+Per-user notification mutes.
+
+The source of truth is `User.notification_mutes`, a bitfield over `MUTE_BITS`. For
+filtering during sends it is mirrored into one Redis bitmap per type
+(`notif:mute:<type>`, bit = user id, on the broker Redis), so a chunk of recipients is
+checked with a single `BITFIELD ... GET u1 <user_id>` per type and muted users are
+dropped before any device lookup, row or push is built.
+
+`notif:mute:synced` marks the bitmaps as complete; it is set by
+`sync_notification_mutes` (management command of the same name). Until then, e.g. on
+a fresh Redis, filters read the bitfield from Postgres instead. While a sync runs
+(`notif:mute:syncing`), every mute change is also logged to `notif:mute:changes`; the
+sync replays those users from Postgres after its swap, so no change is lost to the RENAME.
+"""
+import logging
+import uuid
+
+from django.db import transaction
+from django.db.models import F
+
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Notification type -> bit in User.notification_mutes
+MUTE_BITS = {
+    'new_post': 1,
+    'like': 2,
+    'follow': 4,
+    'reward_point': 8,
+}
+# Names used by the preferences endpoint
+PREFERENCE_TYPES = {
+    'mute_new_posts': 'new_post',
+    'mute_likes': 'like',
+    'mute_follows': 'follow',
+    'mute_rewards': 'reward_point',
+}
+MUTES_SYNCED_KEY = 'notif:mute:synced'
+MUTES_SYNCING_KEY = 'notif:mute:syncing'
+MUTES_CHANGES_KEY = 'notif:mute:changes'
+SYNC_CHUNK_SIZE = 1000
+TMP_KEY_TTL = 60 * 60  # safety net if a sync dies before the swap
+
+
+def mute_key(type):
+    return f"notif:mute:{type}"
+
+
+def preferences_from_bits(bits):
+    return {name: bool(bits & MUTE_BITS[type]) for name, type in PREFERENCE_TYPES.items()}
+
+
+def _queue_bits(pipe, user_id, bits):
+    for type, bit in MUTE_BITS.items():
+        pipe.setbit(mute_key(type), int(user_id), 1 if bits & bit else 0)
+
+
+def _write_bits(user_id, bits):
+    try:
+        r = get_redis('broker')
+        syncing = r.exists(MUTES_SYNCING_KEY)
+        pipe = r.pipeline(transaction=True)
+        _queue_bits(pipe, user_id, bits)
+        if syncing:
+            # The running sync may RENAME over this write; it replays logged users afterwards
+            pipe.rpush(MUTES_CHANGES_KEY, int(user_id))
+            pipe.expire(MUTES_CHANGES_KEY, TMP_KEY_TTL)
+        pipe.execute()
+    except Exception:
+        logger.warning(f"Failed to update notification mute bitmaps for user {user_id}", exc_info=True)
+
+
+def set_user_mutes(user, changes):
+    """Apply {preference name: bool} to the user's bitfield and mirror it to Redis after commit."""
+    bits = user.notification_mutes
+    for name, muted in changes.items():
+        bit = MUTE_BITS[PREFERENCE_TYPES[name]]
+        bits = bits | bit if muted else bits & ~bit
+    if bits != user.notification_mutes:
+        user.notification_mutes = bits
+        user.save(update_fields=['notification_mutes'])
+
+        def apply():
+            from .realtime import push_mutes_changed
+            _write_bits(user.id, bits)
+            push_mutes_changed(user.id, bits)
+
+        transaction.on_commit(apply)
+    return preferences_from_bits(bits)
+
+
+def _unmuted_from_db(user_ids, type):
+    from users.models import User
+    bit = MUTE_BITS[type]
+    muted = set(
+        User.objects.filter(id__in=user_ids)
+        .annotate(muted=F('notification_mutes').bitand(bit))
+        .filter(muted=bit)
+        .values_list('id', flat=True)
+    )
+    return [uid for uid in user_ids if uid not in muted]
+
+
+def unmuted_user_ids(user_ids, type):
+    """Return `user_ids` (order kept) minus the users who muted `type`.
+
+    One BITFIELD command for the whole list once the bitmaps are synced; one query otherwise.
+    """
+    ids = [int(uid) for uid in user_ids]
+    if not ids or type not in MUTE_BITS:
+        return ids
+    try:
+        r = get_redis('broker')
+        if r.exists(MUTES_SYNCED_KEY):
+            op = r.bitfield(mute_key(type))
+            for uid in ids:
+                op.get('u1', uid)
+            return [uid for uid, muted in zip(ids, op.execute()) if not muted]
+    except Exception:
+        logger.warning(f"Mute bitmap unavailable for {type}; using Postgres", exc_info=True)
+    return _unmuted_from_db(ids, type)
+
+
+def is_muted(user_id, type):
+    return not unmuted_user_ids([user_id], type)
+
+
+def _build_and_swap(r, suffix):
+    """Write every muted user's bits to temp bitmaps and RENAME them over the live ones."""
+    from users.models import User
+    tmp_keys = {type: f"{mute_key(type)}:tmp:{suffix}" for type in MUTE_BITS}
+    written = {type: 0 for type in MUTE_BITS}
+    users = User.objects.filter(notification_mutes__gt=0).values_list('id', 'notification_mutes')
+
+    count = 0
+    pipe = r.pipeline(transaction=False)
+    for user_id, bits in users.iterator(chunk_size=SYNC_CHUNK_SIZE):
+        for type, bit in MUTE_BITS.items():
+            if bits & bit:
+                pipe.setbit(tmp_keys[type], user_id, 1)
+                written[type] += 1
+        count += 1
+        if count % SYNC_CHUNK_SIZE == 0:
+            pipe.execute()
+    for tmp in tmp_keys.values():
+        pipe.expire(tmp, TMP_KEY_TTL)
+    pipe.execute()
+
+    pipe = r.pipeline(transaction=True)
+    for type, tmp in tmp_keys.items():
+        if written[type]:
+            pipe.rename(tmp, mute_key(type))
+            pipe.persist(mute_key(type))
+        else:
+            pipe.delete(mute_key(type))
+    pipe.set(MUTES_SYNCED_KEY, '1')
+    pipe.execute()
+    return count
+
+
+def _replay_changes(r):
+    """Rewrite the live bits of users whose mutes changed during a sync, from Postgres."""
+    from users.models import User
+    pipe = r.pipeline(transaction=True)
+    pipe.lrange(MUTES_CHANGES_KEY, 0, -1)
+    pipe.delete(MUTES_CHANGES_KEY)
+    user_ids = {int(uid) for uid in pipe.execute()[0]}
+    if not user_ids:
+        return 0
+    pipe = r.pipeline(transaction=False)
+    for user_id, bits in User.objects.filter(id__in=user_ids).values_list('id', 'notification_mutes'):
+        _queue_bits(pipe, user_id, bits)
+    pipe.execute()
+    return len(user_ids)
+
+
+def sync_notification_mutes():
+    """Rebuild every mute bitmap from Postgres and swap them in atomically. Returns users with mutes.
+
+    Changes committed while the sync runs are logged by `_write_bits` and replayed
+    from Postgres after the swap. Only one sync runs at a time.
+    """
+    r = get_redis('broker')
+    suffix = uuid.uuid4().hex[:12]
+    # Set before reading Postgres: a change that misses the marker is already in the read
+    if not r.set(MUTES_SYNCING_KEY, suffix, nx=True, ex=TMP_KEY_TTL):
+        logger.warning("Notification mute sync already running; skipping")
+        return 0
+    try:
+        count = _build_and_swap(r, suffix)
+        replayed = _replay_changes(r)
+    finally:
+        r.delete(MUTES_SYNCING_KEY)
+    logger.info(f"Synced notification mute bitmaps for {count} users ({replayed} changed during the sync)")
+    return count
@@ -0,0 +1,145 @@
+"""
+Server push over websockets (see notifications_app.consumers).
+
+Every authenticated connection joins `user.<user_id>` and one `broadcasts.<type>`
+group per broadcast type the user has not muted (see notifications_app.preferences),
+so muted users never receive those frames. When a user changes their mutes, their
+open sockets are told to re-join (`push_mutes_changed`). Pipelines call
+`push_to_user`/`push_to_users`/`push_broadcast` after they have written their data;
+the consumer forwards each message as `{"type": <event>, ...payload}`.
+
+`ws:online` (cache Redis) counts open connections per user, so senders skip users who
+are not connected with one HMGET instead of a channel-layer round trip per user.
+A process that dies without disconnecting leaves its users marked online until their
+next connect/disconnect; the cost is a few wasted sends.
+
+All functions are best-effort: failures are logged and never reach the caller.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from varsigram.redis_client import get_redis
+
+from .preferences import MUTE_BITS
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_TYPES = ('new_post',)
+ONLINE_HASH = 'ws:online'
+
+
+def user_group(user_id):
+    return f"user.{user_id}"
+
+
+def broadcast_group(type):
+    return f"broadcasts.{type}"
+
+
+def broadcast_groups(mutes):
+    """Broadcast groups a socket joins for a user with the `mutes` bitfield."""
+    return [broadcast_group(type) for type in BROADCAST_TYPES if not mutes & MUTE_BITS.get(type, 0)]
+
+
+def set_online(user_id, delta):
+    """Count a connection opening (+1) or closing (-1) for `user_id`."""
+    try:
+        r = get_redis('cache')
+        if r.hincrby(ONLINE_HASH, str(user_id), delta) <= 0:
+            r.hdel(ONLINE_HASH, str(user_id))
+    except Exception:
+        logger.warning(f"Failed to update websocket presence for user {user_id}", exc_info=True)
+
+
+def online_user_ids(user_ids):
+    """Return the subset of `user_ids` with an open websocket (all of them if Redis is unavailable)."""
+    ids = [int(uid) for uid in user_ids]
+    if not ids:
+        return []
+    try:
+        counts = get_redis('cache').hmget(ONLINE_HASH, [str(uid) for uid in ids])
+    except Exception:
+        logger.warning("Websocket presence unavailable; pushing to every user", exc_info=True)
+        return ids
+    return [uid for uid, count in zip(ids, counts) if count is not None and int(count) > 0]
+
+
+def _message(event, payload):
+    return {'type': 'push.event', 'event': event, 'payload': payload or {}}
+
+
+async def _group_send_many(layer, groups, message):
+    for group in groups:
+        await layer.group_send(group, message)
+
+
+def _send(groups, message):
+    layer = get_channel_layer()
+    if layer is None or not groups:
+        return
+    async_to_sync(_group_send_many)(layer, groups, message)
+
+
+def push_to_users(user_ids, event, payload=None):
+    """Send one event to every connected user in `user_ids`."""
+    try:
+        _send([user_group(uid) for uid in online_user_ids(user_ids)], _message(event, payload))
+    except Exception:
+        logger.warning(f"Failed to push {event} over websockets", exc_info=True)
+
+
+def push_to_user(user_id, event, payload=None):
+    push_to_users([user_id], event, payload)
+
+
+def push_broadcast(event, payload, type):
+    """Send one event to every connection that has not muted `type`; consumers drop it for the sender (`payload.sender_id`)."""
+    try:
+        _send([broadcast_group(type)], _message(event, payload))
+    except Exception:
+        logger.warning(f"Failed to broadcast {event} over websockets", exc_info=True)
+
+
+def total_unread_count(user):
+    """Personal plus broadcast unread count, as returned by `unread_count/`."""
+    from .broadcasts import unread_broadcast_count
+    from .unread import get_unread_count
+    return get_unread_count(user.id) + unread_broadcast_count(user)
+
+
+def push_unread_count(user_id):
+    """Push the user's current unread count if they are connected."""
+    try:
+        if not online_user_ids([user_id]):
+            return
+        from users.models import User
+        user = User.objects.get(pk=user_id)
+        _send([user_group(user_id)], _message('unread_count', {'unread_count': total_unread_count(user)}))
+    except Exception:
+        logger.warning(f"Failed to push unread count to user {user_id}", exc_info=True)
+
+
+def push_notifications(user_id, notifications):
+    """Push newly created or updated personal notifications, then the new unread count."""
+    try:
+        if not notifications or not online_user_ids([user_id]):
+            return
+        from .serializers import NotificationSerializer
+        groups = [user_group(user_id)]
+        for notification in notifications:
+            _send(groups, _message('notification', NotificationSerializer(notification).data))
+    except Exception:
+        logger.warning(f"Failed to push notifications to user {user_id}", exc_info=True)
+        return
+    push_unread_count(user_id)
+
+
+def push_mutes_changed(user_id, mutes):
+    """Tell the user's open sockets to re-join broadcast groups for their new mutes."""
+    try:
+        if online_user_ids([user_id]):
+            _send([user_group(user_id)], {'type': 'mutes.changed', 'mutes': mutes})
+    except Exception:
+        logger.warning(f"Failed to push mute changes to user {user_id}", exc_info=True)
@@ -0,0 +1,123 @@
+"""
+Retention for personal notifications.
+
+Read notifications older than `NOTIFICATION_READ_RETENTION_DAYS` (by `read_at`, or by
+`created_at` for rows read before `read_at` was recorded) are removed from the hot
+`Notification` table in primary-key batches of `NOTIFICATION_RETENTION_BATCH_SIZE`,
+one short transaction each. With `NOTIFICATION_ARCHIVE_READ` they are copied to
+`ArchivedNotification` first; archived rows are dropped after
+`NOTIFICATION_ARCHIVE_RETENTION_DAYS`. Unread notifications are never touched, so the
+unread counters stay exact.
+
+Broadcasts (and, by cascade, their read receipts) are deleted
+`NOTIFICATION_BROADCAST_RETENTION_DAYS` after they were sent, read or not. Cached
+broadcast unread counts are dropped afterwards so they reload without them.
+
+Runs daily from `notifications_app.tasks.purge_old_notifications`; the
+`purge_notifications` management command runs it by hand.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from varsigram.redis_client import get_redis
+
+from .broadcasts import broadcast_unread_key
+from .models import ArchivedNotification, BroadcastNotification, Notification
+
+logger = logging.getLogger(__name__)
+
+READ_RETENTION_DAYS = getattr(settings, 'NOTIFICATION_READ_RETENTION_DAYS', 90)
+ARCHIVE_READ = getattr(settings, 'NOTIFICATION_ARCHIVE_READ', False)
+ARCHIVE_RETENTION_DAYS = getattr(settings, 'NOTIFICATION_ARCHIVE_RETENTION_DAYS', 365)
+RETENTION_BATCH_SIZE = getattr(settings, 'NOTIFICATION_RETENTION_BATCH_SIZE', 1000)
+BROADCAST_RETENTION_DAYS = getattr(settings, 'NOTIFICATION_BROADCAST_RETENTION_DAYS', 90)
+
+ARCHIVED_FIELDS = ('id', 'user_id', 'title', 'body', 'data', 'group_key', 'created_at', 'read_at')
+
+
+def expired_read_notifications(days=READ_RETENTION_DAYS):
+    cutoff = timezone.now() - timedelta(days=days)
+    return Notification.objects.filter(is_read=True).filter(
+        Q(read_at__lt=cutoff) | Q(read_at__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def _move_batch(pks, archive):
+    with transaction.atomic():
+        if archive:
+            rows = Notification.objects.filter(pk__in=pks).values(*ARCHIVED_FIELDS)
+            ArchivedNotification.objects.bulk_create(
+                [ArchivedNotification(**row) for row in rows], ignore_conflicts=True,
+            )
+        return Notification.objects.filter(pk__in=pks).delete()[0]
+
+
+def purge_read_notifications(days=READ_RETENTION_DAYS, archive=ARCHIVE_READ, batch_size=RETENTION_BATCH_SIZE,
+                             max_batches=None):
+    """Remove (or archive) expired read notifications in batches. Returns rows removed."""
+    expired = expired_read_notifications(days)
+    removed = batches = 0
+    while max_batches is None or batches < max_batches:
+        pks = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        removed += _move_batch(pks, archive)
+        batches += 1
+    logger.info(f"Notification retention: {'archived' if archive else 'deleted'} {removed} read notifications")
+    return removed
+
+
+def purge_archived_notifications(days=ARCHIVE_RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE):
+    """Delete archived notifications older than `days`, in batches. Returns rows deleted."""
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = ArchivedNotification.objects.filter(archived_at__lt=cutoff)
+    deleted = 0
+    while True:
+        pks = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        deleted += ArchivedNotification.objects.filter(pk__in=pks).delete()[0]
+    if deleted:
+        logger.info(f"Notification retention: deleted {deleted} archived notifications")
+    return deleted
+
+
+
+def _drop_broadcast_unread_counters():
+    try:
+        r = get_redis('broker')
+        batch = []
+        for key in r.scan_iter(match=broadcast_unread_key('*'), count=1000):
+            batch.append(key)
+            if len(batch) >= RETENTION_BATCH_SIZE:
+                r.delete(*batch)
+                batch = []
+        if batch:
+            r.delete(*batch)
+    except Exception:
+        logger.warning("Failed to drop cached broadcast unread counters", exc_info=True)
+
+
+def purge_old_broadcasts(days=BROADCAST_RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE):
+    """Delete broadcasts older than `days` and their receipts, in batches. Returns broadcasts deleted."""
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = BroadcastNotification.objects.filter(created_at__lt=cutoff)
+    deleted = 0
+    while True:
+        pks = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic():
+            # Receipts go with their broadcast (CASCADE)
+            deleted += BroadcastNotification.objects.filter(pk__in=pks).delete()[1].get(
+                BroadcastNotification._meta.label, 0
+            )
+    if deleted:
+        _drop_broadcast_unread_counters()
+        logger.info(f"Notification retention: deleted {deleted} broadcasts")
+    return deleted
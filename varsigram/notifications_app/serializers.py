@@ -1,6 +1,6 @@
 # notifications_app/serializers.py
 from rest_framework import serializers
-from .models import Device, Notification
+from .models import BroadcastNotification, Device, Notification
 
 class DeviceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,7 +9,27 @@ class DeviceSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'active']
 
 class NotificationSerializer(serializers.ModelSerializer):
+    kind = serializers.SerializerMethodField()
+
     class Meta:
         model = Notification
-        fields = ['id', 'title', 'body', 'data', 'is_read', 'created_at', 'read_at']
+        fields = ['id', 'kind', 'title', 'body', 'data', 'is_read', 'created_at', 'read_at']
         read_only_fields = ['id', 'user', 'created_at', 'read_at'] # is_read can be updated by PATCH
+
+    def get_kind(self, obj):
+        return 'personal'
+
+
+class BroadcastNotificationSerializer(serializers.ModelSerializer):
+    """Broadcast with the per-user read state resolved by notifications_app.broadcasts.broadcast_page."""
+    kind = serializers.SerializerMethodField()
+    is_read = serializers.BooleanField(read_only=True, default=False)
+    read_at = serializers.DateTimeField(read_only=True, default=None)
+
+    class Meta:
+        model = BroadcastNotification
+        fields = ['id', 'kind', 'title', 'body', 'data', 'is_read', 'created_at', 'read_at']
+        read_only_fields = fields
+
+    def get_kind(self, obj):
+        return 'broadcast'
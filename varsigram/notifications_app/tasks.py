@@ -1,24 +1,236 @@
+import logging
+from datetime import timedelta
 from celery import shared_task
-from .utils import send_push_notification
+from django.conf import settings
+from django.utils import timezone
+from firebase_admin import messaging
+from .devices import get_user_tokens, invalidate_user_devices
+from .dispatch import GROUP_PUSH_LIMIT, aggregate_body, take_group, take_pending
+from .broadcasts import note_broadcast_created
+from .models import BroadcastNotification, Device, Notification
+from .preferences import sync_notification_mutes, unmuted_user_ids
+from .realtime import push_broadcast, push_notifications
+from .retention import purge_archived_notifications, purge_old_broadcasts, purge_read_notifications
+from .unread import adjust_unread, reconcile_unread_counts
+from .serializers import BroadcastNotificationSerializer
+from .utils import push_data, send_push_messages
 from users.models import User
 
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = getattr(settings, 'NOTIFICATION_BROADCAST_CHUNK_SIZE', 1000)
+DEVICE_STALE_DAYS = getattr(settings, 'DEVICE_STALE_DAYS', 270)
+DEVICE_INACTIVE_RETENTION_DAYS = getattr(settings, 'DEVICE_INACTIVE_RETENTION_DAYS', 30)
+DEVICE_PRUNE_BATCH_SIZE = 1000
+
+
 @shared_task
 def notify_all_users_new_post(author_id, author_name, post_content, post_id, author_profile_pic_url=None, **kwargs):
     """Notify all users about a new post.
 
+    Stores the notification once as a `BroadcastNotification`, then streams user IDs in
+    primary-key order and fans the push out to `notify_users_chunk` subtasks of
+    `NOTIFICATION_BROADCAST_CHUNK_SIZE` users each, so no single task holds the whole
+    user table or runs O(users) sequential round trips.
+
     The task accepts an optional `author_profile_pic_url` and extra kwargs to
     remain compatible with previously queued tasks that may include different
     argument sets.
     """
-    users = User.objects.exclude(id=author_id)
-    for user in users:
-        data_payload = {"type": "new_post", "post_id": post_id}
-        if author_profile_pic_url:
-            data_payload["author_profile_pic_url"] = author_profile_pic_url
-
-        send_push_notification(
-            user=user,
-            title="New Post",
-            body=f"{author_name} just posted: {post_content[:50]}...",
-            data=data_payload
-        )
\ No newline at end of file
+    data_payload = {"type": "new_post", "post_id": post_id}
+    if author_profile_pic_url:
+        data_payload["author_profile_pic_url"] = author_profile_pic_url
+    title = "New Post"
+    body = f"{author_name} just posted: {post_content[:50]}..."
+    broadcast = BroadcastNotification.objects.create(sender_id=author_id, title=title, body=body, data=data_payload)
+    note_broadcast_created(broadcast)
+    push_broadcast('broadcast', {**BroadcastNotificationSerializer(broadcast).data, 'sender_id': author_id}, 'new_post')
+
+    user_ids = User.objects.exclude(id=author_id).order_by('id').values_list('id', flat=True)
+    chunk = []
+    chunks = 0
+    for user_id in user_ids.iterator(chunk_size=BROADCAST_CHUNK_SIZE):
+        chunk.append(user_id)
+        if len(chunk) >= BROADCAST_CHUNK_SIZE:
+            notify_users_chunk.delay(chunk, title, body, data_payload, broadcast_id=broadcast.id)
+            chunk = []
+            chunks += 1
+    if chunk:
+        notify_users_chunk.delay(chunk, title, body, data_payload, broadcast_id=broadcast.id)
+        chunks += 1
+    logger.info(f"Queued new-post broadcast for post {post_id} in {chunks} chunks")
+
+
+@shared_task
+def notify_users_chunk(user_ids, title, body, data, broadcast_id):
+    """Push broadcast `broadcast_id` to each of `user_ids` that has an active device.
+
+    The notification itself is stored once as a `BroadcastNotification`; every push
+    carries its id. Tokens come from the cached device registry (one pipelined Redis
+    call) and go out in FCM `send_each` calls of up to 500 messages (see `send_push_messages`).
+    """
+    # Users who muted this type are dropped before any device lookup is made
+    user_ids = unmuted_user_ids(user_ids, (data or {}).get('type'))
+    tokens_by_user = get_user_tokens(user_ids)
+    if not tokens_by_user:
+        return 0
+
+    payload = push_data({**(data or {}), 'broadcast_id': broadcast_id})
+    messages = [
+        messaging.Message(notification=messaging.Notification(title=title, body=body), data=payload, token=token)
+        for tokens in tokens_by_user.values() for token in tokens
+    ]
+    sent = send_push_messages(messages)
+    logger.info(f"Pushed broadcast {broadcast_id}: {sent}/{len(messages)} messages to {len(tokens_by_user)} users")
+    return sent
+
+
+@shared_task
+def flush_user_notifications(recipient_id):
+    """Deliver everything `notify` buffered for one recipient during the grouping window."""
+    try:
+        events = take_pending(recipient_id)
+    except Exception:
+        logger.exception(f"Failed to read buffered notifications for user {recipient_id}")
+        return 0
+    return deliver_notifications(recipient_id, events)
+
+
+@shared_task
+def flush_notification_group(recipient_id, type, post_id):
+    """Deliver the coalesced events for one (recipient, type, post) at the end of its window."""
+    try:
+        event = take_group(recipient_id, type, post_id)
+    except Exception:
+        logger.exception(f"Failed to read coalesced {type} notifications for user {recipient_id}")
+        return 0
+    return deliver_notifications(recipient_id, [event] if event else [])
+
+
+def _apply_coalesced(recipient_id, event):
+    """Fold a coalesced event into the recipient's unread row for the same post, or create one.
+
+    Returns (notification, created).
+
+    `data.actor_ids` holds the distinct actors folded in so far and `data.actor_count`
+    their number, so an actor who comes back in a later window is not counted twice and
+    a row that keeps collecting likes reads "Ada and 23 others liked your post."
+    """
+    existing = (
+        Notification.objects
+        .filter(user_id=recipient_id, group_key=event['group_key'], is_read=False)
+        .order_by('-id')
+        .first()
+    )
+    actor_ids = set((existing.data or {}).get('actor_ids', [])) if existing else set()
+    actor_ids.update(event.get('actor_ids') or [event['actor_id']])
+    total = len(actor_ids)
+    body = event['body'] if total == 1 else aggregate_body(event['type'], event['actor_name'], total)
+    data = {**event['data'], 'actor_ids': sorted(actor_ids), 'actor_count': total}
+    if existing is None:
+        return Notification.objects.create(
+            user_id=recipient_id, title=event['title'], body=body, data=data, group_key=event['group_key'],
+        ), True
+    existing.title, existing.body, existing.data = event['title'], body, data
+    existing.created_at = timezone.now()  # move it back to the top of the list
+    existing.save(update_fields=['title', 'body', 'data', 'created_at'])
+    return existing, False
+
+
+@shared_task
+def deliver_notifications(recipient_id, events):
+    """Persist and push a group of events for one recipient.
+
+    Tokens come from the cached device registry; one bulk INSERT; coalesced events update the unread row for
+    their post instead (see `_apply_coalesced`). Up to `NOTIFICATION_GROUP_PUSH_LIMIT`
+    notifications are pushed individually; a larger group is pushed as one summary
+    message carrying the newest notification's id.
+    """
+    if not events:
+        return 0
+    tokens = get_user_tokens([recipient_id]).get(int(recipient_id))
+    if not tokens:
+        return 0
+
+    notifications = Notification.objects.bulk_create([
+        Notification(user_id=recipient_id, title=e['title'], body=e['body'], data=e.get('data'))
+        for e in events if 'group_key' not in e
+    ])
+    created = len(notifications)
+    for event in events:
+        if 'group_key' in event:
+            notification, is_new = _apply_coalesced(recipient_id, event)
+            notifications.append(notification)
+            created += is_new
+    adjust_unread({recipient_id: created})
+
+    if len(notifications) > GROUP_PUSH_LIMIT:
+        latest = notifications[-1]
+        pushes = [(
+            f"You have {len(notifications)} new notifications",
+            latest.body,
+            {'type': 'summary', 'count': len(notifications), 'notification_id': latest.id},
+        )]
+    else:
+        pushes = [
+            (n.title, n.body, {**{k: v for k, v in (n.data or {}).items() if k != 'actor_ids'}, 'notification_id': n.id})
+            for n in notifications
+        ]
+
+    messages = [
+        messaging.Message(notification=messaging.Notification(title=title, body=body), data=push_data(data), token=token)
+        for title, body, data in pushes for token in tokens
+    ]
+    sent = send_push_messages(messages)
+    push_notifications(recipient_id, notifications)
+    logger.info(f"Delivered {len(notifications)} notifications to user {recipient_id} in {len(messages)} messages")
+    return sent
+
+
+
+@shared_task
+def prune_stale_devices():
+    """Deactivate tokens not re-registered for `DEVICE_STALE_DAYS` and delete long-inactive ones.
+
+    Apps re-register their token on start, which bumps `updated_at`; FCM treats tokens
+    idle for about 270 days as expired. Works in batches of primary keys so each UPDATE
+    or DELETE stays short, and drops the affected users' cached token sets.
+    """
+    now = timezone.now()
+    stale = Device.objects.filter(active=True, updated_at__lt=now - timedelta(days=DEVICE_STALE_DAYS))
+    expired = Device.objects.filter(active=False, updated_at__lt=now - timedelta(days=DEVICE_INACTIVE_RETENTION_DAYS))
+    deactivated = deleted = 0
+    while True:
+        batch = list(stale.order_by('pk').values_list('pk', 'user_id')[:DEVICE_PRUNE_BATCH_SIZE])
+        if not batch:
+            break
+        deactivated += Device.objects.filter(pk__in=[pk for pk, _ in batch]).update(active=False)
+        invalidate_user_devices([user_id for _, user_id in batch])
+    while True:
+        pks = list(expired.order_by('pk').values_list('pk', flat=True)[:DEVICE_PRUNE_BATCH_SIZE])
+        if not pks:
+            break
+        deleted += Device.objects.filter(pk__in=pks).delete()[0]
+    logger.info(f"Pruned devices: {deactivated} deactivated, {deleted} deleted")
+    return deactivated, deleted
+
+
+@shared_task
+def reconcile_unread_notification_counts():
+    """Repair drift in the Redis unread counters (see notifications_app.unread)."""
+    return reconcile_unread_counts()
+
+
+@shared_task
+def purge_old_notifications():
+    """Apply notification retention (see notifications_app.retention)."""
+    removed = purge_read_notifications()
+    purge_archived_notifications()
+    purge_old_broadcasts()
+    return removed
+
+
+@shared_task
+def sync_notification_mute_bitmaps():
+    """Rebuild the Redis mute bitmaps from `User.notification_mutes`."""
+    return sync_notification_mutes()
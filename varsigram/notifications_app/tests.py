@@ -1,3 +1,311 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from unittest.mock import patch
 
-# Create your tests here.
+from .broadcasts import broadcast_page, mark_all_broadcasts_read, mark_broadcast_read, unread_broadcast_count
+from .models import ArchivedNotification, BroadcastNotification, Device, Notification
+from .retention import purge_old_broadcasts, purge_read_notifications
+from .devices import DEVICES_LOADED, get_user_tokens
+from .dispatch import build_event, notify
+from .preferences import unmuted_user_ids
+from .tasks import deliver_notifications, notify_users_chunk
+
+User = get_user_model()
+
+
+class BroadcastChunkTest(TestCase):
+    def setUp(self):
+        self.with_devices = User.objects.create_user(email='a@example.com', password='pass')
+        self.without_devices = User.objects.create_user(email='b@example.com', password='pass')
+        Device.objects.create(user=self.with_devices, registration_id='tok-1')
+        Device.objects.create(user=self.with_devices, registration_id='tok-2')
+        Device.objects.create(user=self.with_devices, registration_id='tok-3', active=False)
+
+    @patch('notifications_app.tasks.send_push_messages', return_value=2)
+    def test_chunk_pushes_broadcast_to_active_devices_only(self, mock_send):
+        broadcast = BroadcastNotification.objects.create(title='New Post', body='hello', data={'type': 'new_post'})
+        sent = notify_users_chunk(
+            [self.with_devices.id, self.without_devices.id], 'New Post', 'hello',
+            {'type': 'new_post', 'post_id': 'p1', 'score': 1.5}, broadcast.id,
+        )
+
+        self.assertEqual(sent, 2)
+        self.assertFalse(Notification.objects.exists())
+
+        messages = mock_send.call_args.args[0]
+        self.assertEqual(sorted(m.token for m in messages), ['tok-1', 'tok-2'])
+        self.assertEqual(messages[0].data, {'type': 'new_post', 'post_id': 'p1', 'score': '1.5', 'broadcast_id': str(broadcast.id)})
+
+
+class BroadcastReadStateTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', password='pass')
+        self.reader = User.objects.create_user(email='reader@example.com', password='pass')
+        self.first = BroadcastNotification.objects.create(sender=self.author, title='New Post', body='one')
+        self.second = BroadcastNotification.objects.create(sender=self.author, title='New Post', body='two')
+
+    def test_cursor_and_receipts(self):
+        self.assertEqual(unread_broadcast_count(self.reader), 2)
+        self.assertEqual(unread_broadcast_count(self.author), 0)  # senders never see their own
+
+        self.assertTrue(mark_broadcast_read(self.reader, self.second))
+        self.assertFalse(mark_broadcast_read(self.reader, self.second))
+        self.assertEqual(unread_broadcast_count(self.reader), 1)
+        read_state = {b.id: b.is_read for b in broadcast_page(self.reader, 10)}
+        self.assertEqual(read_state, {self.first.id: False, self.second.id: True})
+
+        self.assertEqual(mark_all_broadcasts_read(self.reader), 1)
+        self.assertEqual(unread_broadcast_count(self.reader), 0)
+        self.assertFalse(self.reader.broadcast_receipts.exists())
+
+    @patch('notifications_app.broadcasts.get_redis')
+    def test_warm_count_is_one_redis_read(self, mock_get_redis):
+        pipe = mock_get_redis.return_value.pipeline.return_value
+        # latest broadcast id 12; the reader had 1 unread up to id 10
+        pipe.execute.return_value = [b'12', [b'10', b'1']]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_broadcast_count(self.reader), 3)
+
+
+class NotificationDispatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='c@example.com', password='pass')
+        Device.objects.create(user=self.user, registration_id='tok-c')
+
+    @patch('notifications_app.tasks.flush_user_notifications.apply_async')
+    @patch('notifications_app.dispatch.get_redis')
+    def test_notify_buffers_after_commit_and_schedules_one_flush(self, mock_get_redis, mock_apply_async):
+        pipe = mock_get_redis.return_value.pipeline.return_value
+        pipe.execute.side_effect = [[1, True, True], [2, True, None]]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user.id, 'like', 'Your post was liked!', 'Ada liked your post.', {'post_id': 'p1'})
+            notify(self.user.id, 'like', 'Your post was liked!', 'Bo liked your post.', {'post_id': 'p1'})
+            self.assertFalse(pipe.rpush.called)
+
+        self.assertEqual(pipe.rpush.call_count, 2)
+        mock_apply_async.assert_called_once()
+        self.assertEqual(mock_apply_async.call_args.kwargs['args'], [self.user.id])
+
+    @patch('notifications_app.tasks.send_push_messages', return_value=1)
+    def test_large_group_is_pushed_as_one_summary(self, mock_send):
+        events = [
+            {'type': 'like', 'title': 'Your post was liked!', 'body': f'User {i} liked your post.',
+             'data': {'type': 'like', 'post_id': 'p1'}}
+            for i in range(5)
+        ]
+        deliver_notifications(self.user.id, events)
+
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 5)
+        messages = mock_send.call_args.args[0]
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].data['type'], 'summary')
+        self.assertEqual(messages[0].data['count'], '5')
+
+    @patch('notifications_app.tasks.send_push_messages', return_value=1)
+    def test_coalesced_likes_update_the_unread_row(self, mock_send):
+        first = build_event('like', 'Your post was liked!', 'Ada liked your post.', {'post_id': 'p1'},
+                            actor_id=1, actor_name='Ada')
+        deliver_notifications(self.user.id, [first])
+        burst = {**build_event('like', 'Your post was liked!', 'Bo liked your post.', {'post_id': 'p1'},
+                               actor_id=2, actor_name='Bo'), 'count': 23, 'actor_ids': [str(i) for i in range(2, 25)]}
+        deliver_notifications(self.user.id, [burst])
+        # Ada liking again in a later window is not a new actor
+        repeat = build_event('like', 'Your post was liked!', 'Ada liked your post.', {'post_id': 'p1'},
+                             actor_id=1, actor_name='Ada')
+        deliver_notifications(self.user.id, [repeat])
+
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual(notification.body, 'Ada and 23 others liked your post.')
+        self.assertEqual(notification.data['actor_count'], 24)
+        self.assertNotIn('actor_ids', mock_send.call_args.args[0][0].data)
+        self.assertEqual(mock_send.call_args.args[0][0].data['notification_id'], str(notification.id))
+
+
+class DeviceRegistryTest(TestCase):
+    def setUp(self):
+        self.cached = User.objects.create_user(email='d@example.com', password='pass')
+        self.cold = User.objects.create_user(email='e@example.com', password='pass')
+        Device.objects.create(user=self.cold, registration_id='tok-e')
+
+    @patch('notifications_app.devices.get_redis')
+    def test_hits_skip_the_database_and_misses_load_in_one_query(self, mock_get_redis):
+        pipe = mock_get_redis.return_value.pipeline.return_value
+        pipe.execute.side_effect = [[{DEVICES_LOADED.encode(), b'tok-d'}, set()], []]
+
+        with self.assertNumQueries(1):
+            tokens = get_user_tokens([self.cached.id, self.cold.id])
+
+        self.assertEqual(tokens, {self.cached.id: ['tok-d'], self.cold.id: ['tok-e']})
+        pipe.sadd.assert_called_once_with(f"devices:{self.cold.id}", DEVICES_LOADED, 'tok-e')
+
+
+class NotificationPreferencesTest(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(email='m@example.com', password='pass')
+        self.other = User.objects.create_user(email='n@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @patch('notifications_app.preferences.get_redis')
+    def test_patch_mutes_and_filter_drops_the_user(self, mock_get_redis):
+        mock_get_redis.return_value.exists.return_value = 0
+        url = reverse('notifications_api:notification-preferences')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {'mute_likes': True}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['mute_likes'])
+        self.assertFalse(response.json()['mute_follows'])
+        mock_get_redis.return_value.pipeline.return_value.setbit.assert_any_call('notif:mute:like', self.user.id, 1)
+
+        # Bitmaps not synced yet: the filter reads the bitfield from Postgres
+        self.assertEqual(unmuted_user_ids([self.user.id, self.other.id], 'like'), [self.other.id])
+        self.assertEqual(unmuted_user_ids([self.user.id, self.other.id], 'follow'), [self.user.id, self.other.id])
+
+        # Synced: one BITFIELD call decides
+        mock_get_redis.return_value.exists.return_value = 1
+        mock_get_redis.return_value.bitfield.return_value.execute.return_value = [0, 1]
+        with self.assertNumQueries(0):
+            self.assertEqual(unmuted_user_ids([self.user.id, self.other.id], 'like'), [self.user.id])
+
+    @patch('notifications_app.preferences.get_redis')
+    def test_sync_replays_changes_made_while_it_ran(self, mock_get_redis):
+        from .preferences import MUTE_BITS, MUTES_SYNCING_KEY, sync_notification_mutes
+
+        User.objects.filter(pk=self.user.pk).update(notification_mutes=MUTE_BITS['follow'])
+        r = mock_get_redis.return_value
+        r.set.return_value = True
+        pipe = r.pipeline.return_value
+        # build, swap, then the change log holds a user who changed their mutes mid-sync
+        pipe.execute.side_effect = [[], [], [[str(self.other.id).encode()], 1], []]
+        User.objects.filter(pk=self.other.pk).update(notification_mutes=MUTE_BITS['like'])
+
+        sync_notification_mutes()
+
+        pipe.setbit.assert_any_call('notif:mute:like', self.other.id, 1)
+        r.delete.assert_called_with(MUTES_SYNCING_KEY)
+
+    def test_patch_rejects_non_boolean_values(self):
+        url = reverse('notifications_api:notification-preferences')
+        response = self.client.patch(url, {'mute_likes': 'yes'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class NotificationKeysetPaginationTest(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(email='f@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for i in range(3):
+            Notification.objects.create(user=self.user, title=f'N{i}', body='b')
+        # Same timestamp for every row: pages must still neither skip nor repeat
+        Notification.objects.filter(user=self.user).update(created_at=Notification.objects.first().created_at)
+
+    def test_pages_follow_created_at_then_id(self):
+        url = reverse('notifications_api:notification-list')
+        first = self.client.get(url, {'limit': 2})
+        next_url = first['Link'].split(';')[0].strip('<>')
+        second = self.client.get(next_url)
+        self.assertNotIn('Link', second)  # short page: nothing after it
+
+        ids = [item['id'] for item in first.json() + second.json()]
+        self.assertEqual(ids, sorted(Notification.objects.values_list('id', flat=True), reverse=True))
+
+
+class NotificationRetentionTest(TestCase):
+    def test_only_old_read_notifications_are_moved(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        user = User.objects.create_user(email='g@example.com', password='pass')
+        old = timezone.now() - timedelta(days=200)
+        expired = Notification.objects.create(user=user, title='old read', body='b', is_read=True, read_at=old)
+        Notification.objects.create(user=user, title='old unread', body='b')
+        Notification.objects.create(user=user, title='recent read', body='b', is_read=True, read_at=timezone.now())
+        Notification.objects.filter(user=user).update(created_at=old)
+
+        removed = purge_read_notifications(days=90, archive=True, batch_size=1)
+
+        self.assertEqual(removed, 1)
+        self.assertEqual(
+            sorted(Notification.objects.filter(user=user).values_list('title', flat=True)), ['old unread', 'recent read']
+        )
+        self.assertEqual(ArchivedNotification.objects.get().id, expired.id)
+
+    def test_old_broadcasts_are_deleted_with_their_receipts(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        reader = User.objects.create_user(email='h@example.com', password='pass')
+        old = BroadcastNotification.objects.create(title='New Post', body='old')
+        recent = BroadcastNotification.objects.create(title='New Post', body='recent')
+        BroadcastNotification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=200))
+        reader.broadcast_receipts.create(broadcast=old)
+
+        self.assertEqual(purge_old_broadcasts(days=90), 1)
+        self.assertEqual(list(BroadcastNotification.objects.values_list('id', flat=True)), [recent.id])
+        self.assertFalse(reader.broadcast_receipts.exists())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+@patch('notifications_app.consumers.set_online')
+@patch('notifications_app.realtime.online_user_ids', side_effect=lambda ids: list(ids))
+class NotificationConsumerTest(TestCase):
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        self.user = User.objects.create_user(email='h@example.com', password='pass')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def _communicator(self, query=''):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .middleware import JWTAuthMiddleware
+        from .routing import websocket_urlpatterns
+        return WebsocketCommunicator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns)), f'/ws/notifications/{query}')
+
+    @patch('notifications_app.consumers.total_unread_count', return_value=3)
+    async def test_authenticated_socket_receives_pushes(self, mock_count, mock_online, mock_set_online):
+        from asgiref.sync import sync_to_async
+        from .realtime import push_to_user
+
+        communicator = self._communicator(f'?token={self.token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'unread_count', 'unread_count': 3})
+
+        await sync_to_async(push_to_user)(self.user.id, 'feed_new_posts', {'post_id': 'p1'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'feed_new_posts', 'post_id': 'p1'})
+        await communicator.disconnect()
+
+    @patch('notifications_app.consumers.total_unread_count', return_value=0)
+    async def test_muted_broadcasts_are_not_delivered(self, mock_count, mock_online, mock_set_online):
+        from asgiref.sync import sync_to_async
+        from .preferences import MUTE_BITS
+        from .realtime import push_broadcast
+
+        await sync_to_async(User.objects.filter(pk=self.user.pk).update)(notification_mutes=MUTE_BITS['new_post'])
+        communicator = self._communicator(f'?token={self.token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # unread_count
+
+        await sync_to_async(push_broadcast)('broadcast', {'id': 1, 'title': 'New Post'}, 'new_post')
+        self.assertTrue(await communicator.receive_nothing())
+
+        # Unmuting re-joins the live socket
+        await communicator.send_input({'type': 'mutes.changed', 'mutes': 0})
+        await sync_to_async(push_broadcast)('broadcast', {'id': 2, 'title': 'New Post'}, 'new_post')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'broadcast', 'id': 2, 'title': 'New Post'})
+        await communicator.disconnect()
+
+    async def test_socket_without_token_is_rejected(self, mock_online, mock_set_online):
+        communicator = self._communicator()
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
@@ -0,0 +1,126 @@
+"""
+Unread counter for personal notifications, kept in Redis.
+
+`notif:unread:<user_id>` holds the number of unread `Notification` rows, so the badge
+poll is a single GET. Writers adjust it with `adjust_unread` (notification created,
+marked read) and `reset_unread` (mark all read). Adjustments only apply to counters
+that already exist; a missing counter is loaded with one indexed COUNT on the next
+read, so a counter never starts from a partial value. `reconcile_unread_counts`
+periodically rewrites live counters from Postgres to repair drift.
+
+Broadcast unread counts are computed separately (see notifications_app.broadcasts).
+"""
+import logging
+
+from django.conf import settings
+from django.db.models import Count
+
+from varsigram.redis_client import get_redis
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+UNREAD_TTL = getattr(settings, 'NOTIFICATION_UNREAD_TTL', 60 * 60 * 24 * 7)  # 7 days
+RECONCILE_BATCH_SIZE = 500
+
+# Adjust a counter only if it exists, never below zero
+ADJUST_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    return 0
+end
+return value
+"""
+
+_adjust_script = None
+
+
+def _get_script():
+    global _adjust_script
+    if _adjust_script is None:
+        _adjust_script = get_redis('broker').register_script(ADJUST_LUA)
+    return _adjust_script
+
+
+def unread_key(user_id):
+    return f"notif:unread:{user_id}"
+
+
+def _count_from_db(user_id):
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def get_unread_count(user_id):
+    """Return the user's personal unread count: one GET, or one COUNT on a cold counter."""
+    try:
+        r = get_redis('broker')
+        value = r.get(unread_key(user_id))
+        if value is not None:
+            return int(value)
+        count = _count_from_db(user_id)
+        r.set(unread_key(user_id), count, ex=UNREAD_TTL, nx=True)
+        return count
+    except Exception:
+        logger.warning(f"Unread counter unavailable for user {user_id}; counting in Postgres", exc_info=True)
+    return _count_from_db(user_id)
+
+
+def adjust_unread(deltas):
+    """Apply {user_id: delta} to existing counters in one pipeline (best-effort)."""
+    deltas = {uid: delta for uid, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    try:
+        script = _get_script()
+        pipe = get_redis('broker').pipeline(transaction=False)
+        for uid, delta in deltas.items():
+            script(keys=[unread_key(uid)], args=[int(delta)], client=pipe)
+        pipe.execute()
+    except Exception:
+        logger.warning("Failed to adjust unread notification counters", exc_info=True)
+
+
+def reset_unread(user_id):
+    try:
+        get_redis('broker').set(unread_key(user_id), 0, ex=UNREAD_TTL)
+    except Exception:
+        logger.warning(f"Failed to reset unread counter for user {user_id}", exc_info=True)
+
+
+def reconcile_unread_counts():
+    """Rewrite every live counter from Postgres, one grouped COUNT per batch. Returns counters checked."""
+    r = get_redis('broker')
+    checked = 0
+    batch = []
+
+    def flush():
+        user_ids = [int(key.rsplit(':', 1)[1]) for key in batch]
+        counts = dict(
+            Notification.objects.filter(user_id__in=user_ids, is_read=False)
+            .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+        )
+        pipe = r.pipeline(transaction=False)
+        for uid in user_ids:
+            # XX: leave counters that expired meanwhile to be reloaded on read
+            pipe.set(unread_key(uid), counts.get(uid, 0), xx=True, keepttl=True)
+        pipe.execute()
+
+    for key in r.scan_iter(match=unread_key('*'), count=1000):
+        key = key.decode() if isinstance(key, bytes) else key
+        if not key.rsplit(':', 1)[1].isdigit():
+            continue
+        batch.append(key)
+        if len(batch) >= RECONCILE_BATCH_SIZE:
+            flush()
+            checked += len(batch)
+            batch = []
+    if batch:
+        flush()
+        checked += len(batch)
+    logger.info(f"Reconciled {checked} unread notification counters")
+    return checked
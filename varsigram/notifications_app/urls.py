@@ -2,7 +2,8 @@ from django.urls import path
 from .views import (
     RegisterDeviceView, UnregisterDeviceView,
     NotificationListView, NotificationMarkReadView,
-    UnreadNotificationCountView, NotificationMarkAllReadView
+    UnreadNotificationCountView, NotificationMarkAllReadView,
+    BroadcastNotificationMarkReadView, NotificationPreferencesView,
 )
 
 app_name = 'notification'
@@ -15,6 +16,8 @@ urlpatterns = [
     # --- Notification Management ---
     path('', NotificationListView.as_view(), name='notification-list'), # List all notifications
     path('<int:pk>/mark-read/', NotificationMarkReadView.as_view(), name='notification-mark-read'),
+    path('broadcast/<int:pk>/mark-read/', BroadcastNotificationMarkReadView.as_view(), name='broadcast-notification-mark-read'),
     path('unread_count/', UnreadNotificationCountView.as_view(), name='unread-notification-count'),
     path('mark-all-read/', NotificationMarkAllReadView.as_view(), name='notification-mark-all-read'),
+    path('preferences/', NotificationPreferencesView.as_view(), name='notification-preferences'),
 ]
@@ -1,63 +1,63 @@
 import firebase_admin
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from firebase_admin import messaging
-from .models import Device, Notification
+from .devices import deactivate_tokens
 from django.conf import settings
-from django.utils import timezone
 
-def send_push_notification(user, title, body, data=None):
+logger = logging.getLogger(__name__)
+
+# FCM accepts at most 500 messages per send_each call
+FCM_BATCH_SIZE = 500
+FCM_MAX_CONCURRENCY = getattr(settings, 'FCM_MAX_CONCURRENCY', 4)
+
+def push_data(data):
+    """FCM data payloads only take string values; drop empty ones and stringify the rest."""
+    return {str(k): str(v) for k, v in (data or {}).items() if v is not None}
+
+
+def _is_unregistered(exc):
+    return isinstance(exc, messaging.UnregisteredError) or (exc is not None and "NotRegistered" in str(exc))
+
+
+def _send_batch(messages):
+    """Send up to FCM_BATCH_SIZE messages in one call; return (success_count, unregistered tokens)."""
+    response = messaging.send_each(messages)
+    unregistered = [
+        message.token
+        for message, resp in zip(messages, response.responses)
+        if not resp.success and _is_unregistered(resp.exception)
+    ]
+    return response.success_count, unregistered
+
+
+def send_push_messages(messages):
     """
-    Sends a push notification to all active devices of a given user.
+    Send many single-token `messaging.Message`s: packed FCM_BATCH_SIZE per `send_each` call,
+    at most FCM_MAX_CONCURRENCY calls in flight. Tokens FCM reports as unregistered are
+    collected across batches and deactivated with one UPDATE (see `deactivate_tokens`).
+    Returns the number of messages delivered.
     """
+    if not messages:
+        return 0
     if not firebase_admin._apps:
-        print("Firebase app not initialized. Cannot send notification.")
-        return
-
-    registration_ids = list(Device.objects.filter(user=user, active=True).values_list('registration_id', flat=True))
-
-    if not registration_ids:
-        print(f"No active devices found for user {user.email}.")
-        return
-    
-    # --- Create Notification record in the database ---
-    try:
-        notification_record = Notification.objects.create(
-            user=user,
-            title=title,
-            body=body,
-            data=data # This will store the custom data in the DB
-        )
-        # It's useful to include the notification_record.id in the FCM data payload
-        # so the frontend knows which specific notification to mark as read.
-        if data is None:
-            data = {}
-        data['notification_id'] = str(notification_record.id) # Convert UUID to string if using UUIDField for ID
-        print(f"Created notification record {notification_record.id} for user {user.email}")
-    except Exception as e:
-        print(f"Error creating notification record for user {user.email}: {e}")
-        # Decide if you want to abort push or continue without DB record
-        return # Abort if DB record fails, as frontend needs this ID
-
-    message = messaging.MulticastMessage(
-        notification=messaging.Notification(
-            title=title,
-            body=body,
-        ),
-        data=data,
-        tokens=registration_ids,
-    )
-
-    try:
-        response = messaging.send_each_for_multicast(message)
-        print(f"Successfully sent {response.success_count} messages to user {user.email}.")
-        if response.failure_count > 0:
-            failed_tokens = []
-            for idx, resp in enumerate(response.responses):
-                if not resp.success:
-                    print(f"Failed to send message: {resp.exception}")
-                    failed_token = registration_ids[idx]
-                    failed_tokens.append(failed_token)
-                    if resp.exception and "NotRegistered" in str(resp.exception):
-                        Device.objects.filter(registration_id=failed_token).update(active=False)
-            print(f'List of tokens that caused failures: {failed_tokens}')
-    except Exception as e:
-        print(f"Error sending push notification to user {user.email}: {e}")
+        logger.warning("Firebase app not initialized. Cannot send notifications.")
+        return 0
+
+    batches = [messages[i:i + FCM_BATCH_SIZE] for i in range(0, len(messages), FCM_BATCH_SIZE)]
+    sent = 0
+    unregistered = []
+    with ThreadPoolExecutor(max_workers=min(FCM_MAX_CONCURRENCY, len(batches))) as pool:
+        for future in [pool.submit(_send_batch, batch) for batch in batches]:
+            try:
+                success_count, failed = future.result()
+            except Exception:
+                logger.exception("FCM batch send failed")
+                continue
+            sent += success_count
+            unregistered.extend(failed)
+
+    if unregistered:
+        deactivated = deactivate_tokens(unregistered)
+        logger.info(f"Deactivated {deactivated} unregistered device tokens")
+    return sent
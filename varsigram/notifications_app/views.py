@@ -1,9 +1,19 @@
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from django.db.models import Q
+from django.db import transaction
+from .devices import invalidate_user_devices
+from .realtime import push_unread_count
 from .models import Device, Notification
+from .preferences import PREFERENCE_TYPES, preferences_from_bits, set_user_mutes
+from .unread import adjust_unread, get_unread_count, reset_unread
 from rest_framework.views import APIView
-from .serializers import DeviceSerializer, NotificationSerializer
+from .serializers import BroadcastNotificationSerializer, DeviceSerializer, NotificationSerializer
+from .broadcasts import (
+    broadcast_page, mark_all_broadcasts_read, mark_broadcast_read, unread_broadcast_count, visible_broadcasts,
+)
 from django.shortcuts import get_object_or_404
 
 class RegisterDeviceView(generics.CreateAPIView):
@@ -27,6 +37,7 @@ class RegisterDeviceView(generics.CreateAPIView):
                 'active': True,
             }
         )
+        invalidate_user_devices([self.request.user.id])
         serializer = self.get_serializer(device)
         if created:
             print(f"New device registered for {self.request.user.email}: {registration_id}")
@@ -52,6 +63,7 @@ class UnregisterDeviceView(APIView):
             )
             device.active = False # Mark as inactive instead of deleting
             device.save()
+            invalidate_user_devices([request.user.id])
             print(f"Device marked inactive: {registration_id} for user {request.user.email}")
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Device.DoesNotExist:
@@ -59,17 +71,84 @@ class UnregisterDeviceView(APIView):
 
 # --- NEW API Endpoints for Notification Management ---
 
+# Position of each kind among items with the same created_at (list order is newest first)
+KIND_RANK = {'personal': 1, 'broadcast': 0}
+KIND_SERIALIZERS = {'personal': NotificationSerializer, 'broadcast': BroadcastNotificationSerializer}
+
+
+def keyset_filter(kind, before, before_kind=None, before_id=None):
+    """Q for items of `kind` that come after the (created_at, kind, id) position of the last item seen."""
+    if before_id is None:
+        return Q(created_at__lt=before)
+    if KIND_RANK[kind] > KIND_RANK[before_kind]:
+        return Q(created_at__lt=before)
+    if KIND_RANK[kind] < KIND_RANK[before_kind]:
+        return Q(created_at__lte=before)
+    return Q(created_at__lt=before) | Q(created_at=before, id__lt=before_id)
+
+
 class NotificationListView(generics.ListAPIView):
     """
-    Lists all notifications for the authenticated user.
+    Lists the authenticated user's notifications, newest first: personal notifications
+    merged with broadcasts (`kind` tells them apart; ids are unique per kind).
+
+    Keyset pagination on (created_at, kind, id). Query params:
+    - `limit` (int, default 100, max 200)
+    - `before` (ISO timestamp): `created_at` of the last item already loaded
+    - `before_id` (`<kind>:<id>`, e.g. `personal:42`): that item's kind and id, so items
+      sharing its timestamp are neither skipped nor repeated
+
+    A full page carries a `Link: <...>; rel="next"` header with the next page's URL.
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    MAX_LIMIT = 200
 
     def get_queryset(self):
         # Filter notifications to only show those belonging to the current authenticated user
         return Notification.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 100)), self.MAX_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        before = before_kind = before_id = None
+        if request.query_params.get('before'):
+            before = parse_datetime(request.query_params['before'])
+            if before is None:
+                return Response({"detail": "before must be an ISO timestamp."}, status=status.HTTP_400_BAD_REQUEST)
+            if request.query_params.get('before_id'):
+                before_kind, _, raw_id = request.query_params['before_id'].partition(':')
+                if before_kind not in KIND_RANK or not raw_id.isdigit():
+                    return Response(
+                        {"detail": "before_id must look like personal:<id> or broadcast:<id>."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                before_id = int(raw_id)
+
+        personal = self.get_queryset()
+        broadcast_keyset = None
+        if before is not None:
+            personal = personal.filter(keyset_filter('personal', before, before_kind, before_id))
+            broadcast_keyset = keyset_filter('broadcast', before, before_kind, before_id)
+        # Each stream is already sorted; the newest `limit` of the merge come from the newest `limit` of each.
+        # Merge on the model datetimes: serialized timestamps drop zero microseconds and don't sort as strings.
+        rows = (
+            [('personal', n) for n in personal.order_by('-created_at', '-id')[:limit]]
+            + [('broadcast', b) for b in broadcast_page(request.user, limit, broadcast_keyset)]
+        )
+        rows.sort(key=lambda row: (row[1].created_at, KIND_RANK[row[0]], row[1].id), reverse=True)
+        rows = rows[:limit]
+        items = [KIND_SERIALIZERS[kind](obj).data for kind, obj in rows]
+        headers = {}
+        if len(rows) == limit:
+            last_kind, last = rows[-1]
+            query = request.query_params.copy()
+            query['limit'], query['before'], query['before_id'] = limit, last.created_at.isoformat(), f"{last_kind}:{last.id}"
+            headers['Link'] = f'<{request.build_absolute_uri(request.path)}?{query.urlencode()}>; rel="next"'
+        return Response(items, status=status.HTTP_200_OK, headers=headers)
+
 class NotificationMarkReadView(generics.UpdateAPIView):
     """
     Marks a specific notification as read for the authenticated user.
@@ -92,10 +171,13 @@ class NotificationMarkReadView(generics.UpdateAPIView):
 
     def patch(self, request, *args, **kwargs):
         notification = self.get_object()
-        if not notification.is_read:
+        # Conditional UPDATE so concurrent requests decrement the unread counter only once
+        read_at = timezone.now()
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True, read_at=read_at):
+            adjust_unread({request.user.id: -1})
+            transaction.on_commit(lambda: push_unread_count(request.user.id))
             notification.is_read = True
-            notification.read_at = timezone.now() # Set read timestamp
-            notification.save()
+            notification.read_at = read_at # Set read timestamp
             # Return serializer data if you want the updated notification object
             serializer = self.get_serializer(notification)
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -107,11 +189,13 @@ class NotificationMarkReadView(generics.UpdateAPIView):
 class UnreadNotificationCountView(APIView):
     """
     Returns the count of unread notifications for the authenticated user.
+    The personal part is a Redis counter (see notifications_app.unread).
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+        unread_count = get_unread_count(request.user.id)
+        unread_count += unread_broadcast_count(request.user)
         return Response({"unread_count": unread_count}, status=status.HTTP_200_OK)
 
 
@@ -124,4 +208,43 @@ class NotificationMarkAllReadView(APIView):
     def post(self, request, *args, **kwargs):
         unread_notifications = Notification.objects.filter(user=request.user, is_read=False)
         updated_count = unread_notifications.update(is_read=True, read_at=timezone.now())
+        reset_unread(request.user.id)
+        transaction.on_commit(lambda: push_unread_count(request.user.id))
+        updated_count += mark_all_broadcasts_read(request.user)
         return Response({"message": f"Successfully marked {updated_count} notifications as read."}, status=status.HTTP_200_OK)
+
+
+class BroadcastNotificationMarkReadView(APIView):
+    """
+    Marks a single broadcast notification as read for the authenticated user.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def patch(self, request, pk, *args, **kwargs):
+        broadcast = get_object_or_404(visible_broadcasts(request.user), pk=pk)
+        if not mark_broadcast_read(request.user, broadcast):
+            return Response({"detail": "Notification was already marked as read."}, status=status.HTTP_200_OK)
+        broadcast.is_read, broadcast.read_at = True, timezone.now()
+        transaction.on_commit(lambda: push_unread_count(request.user.id))
+        return Response(BroadcastNotificationSerializer(broadcast).data, status=status.HTTP_200_OK)
+
+
+class NotificationPreferencesView(APIView):
+    """
+    Reads or updates which notification types the authenticated user has muted.
+    PATCH takes any subset of the boolean preference fields.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(preferences_from_bits(request.user.notification_mutes), status=status.HTTP_200_OK)
+
+    def patch(self, request, *args, **kwargs):
+        changes = {name: value for name, value in request.data.items() if name in PREFERENCE_TYPES}
+        invalid = [name for name, value in changes.items() if not isinstance(value, bool)]
+        if not changes or invalid:
+            return Response(
+                {"detail": f"Send one or more of {', '.join(PREFERENCE_TYPES)} as true/false."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(set_user_mutes(request.user, changes), status=status.HTTP_200_OK)
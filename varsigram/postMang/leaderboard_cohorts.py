@@ -0,0 +1,121 @@
+"""
+Faculty- and department-scoped leaderboards.
+
+Every points board also exists per cohort, e.g.
+`leaderboard:points:faculty:<faculty-slug>:weekly:2025-W46`, maintained by the same
+ingest event and recompute passes as the global boards.
+
+The user -> cohort map is read through a small in-process TTL cache backed by the
+Redis hash `leaderboard:cohorts` (field: user id, value: `<faculty>|<department>`),
+so the reward write path does not query `Student`. The hash entry is dropped when a
+Student profile is saved; other processes pick the change up within
+`LEADERBOARD_COHORT_LOCAL_TTL` seconds. Scores already earned stay in the old
+cohort's boards until the next recompute.
+"""
+import logging
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils.text import slugify
+
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+COHORT_KINDS = ('faculty', 'department')
+COHORTS_HASH = 'leaderboard:cohorts'
+COHORT_LOCAL_TTL = getattr(settings, 'LEADERBOARD_COHORT_LOCAL_TTL', 60 * 5)
+
+_local = TTLCache(maxsize=10000, ttl=COHORT_LOCAL_TTL)
+_local_lock = threading.Lock()
+
+
+def cohort_metric(metric, kind, slug):
+    """Metric name for a cohort board; pass it to the `leaderboard_utils` key helpers."""
+    return f"{metric}:{kind}:{slug}"
+
+
+def _encode(faculty, department):
+    return f"{slugify(faculty or '')}|{slugify(department or '')}"
+
+
+def _decode(value):
+    value = value.decode() if isinstance(value, bytes) else value
+    faculty, _, department = value.partition('|')
+    return {'faculty': faculty, 'department': department}
+
+
+def _load_from_db(user_ids):
+    from users.models import Student
+    found = {
+        str(uid): _encode(faculty, department)
+        for uid, faculty, department in Student.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', 'faculty', 'department')
+    }
+    # Non-students are cached as empty so they never hit the DB again.
+    return {str(uid): found.get(str(uid), '|') for uid in user_ids}
+
+
+def get_user_cohorts(user_ids):
+    """Return {str(user_id): {'faculty': slug, 'department': slug}}; empty slugs mean no cohort."""
+    ids = [str(uid) for uid in user_ids]
+    result = {}
+    with _local_lock:
+        for uid in ids:
+            if uid in _local:
+                result[uid] = _local[uid]
+    missing = [uid for uid in ids if uid not in result]
+    if not missing:
+        return result
+
+    encoded = {}
+    try:
+        r = get_redis('cache')
+        for uid, value in zip(missing, r.hmget(COHORTS_HASH, missing)):
+            if value is not None:
+                encoded[uid] = value
+        db_ids = [uid for uid in missing if uid not in encoded]
+        if db_ids:
+            loaded = _load_from_db(db_ids)
+            r.hset(COHORTS_HASH, mapping=loaded)
+            encoded.update(loaded)
+    except Exception:
+        logger.warning("Cohort cache unavailable; loading cohorts from the database", exc_info=True)
+        encoded.update(_load_from_db([uid for uid in missing if uid not in encoded]))
+
+    with _local_lock:
+        for uid, value in encoded.items():
+            result[uid] = _local[uid] = _decode(value)
+    return result
+
+
+def user_cohort_metrics(user_id, metric='points'):
+    """Return the cohort metric names the user's scores should also be written to."""
+    try:
+        cohorts = get_user_cohorts([user_id]).get(str(user_id), {})
+    except Exception:
+        logger.warning(f"Failed to resolve cohorts for user {user_id}", exc_info=True)
+        return []
+    return [cohort_metric(metric, kind, cohorts[kind]) for kind in COHORT_KINDS if cohorts.get(kind)]
+
+
+def all_cohort_metrics(metric='points'):
+    """Return the metric names of every cohort that currently has students (for recomputes)."""
+    from users.models import Student
+    metrics = set()
+    for faculty, department in Student.objects.values_list('faculty', 'department').distinct():
+        if slugify(faculty or ''):
+            metrics.add(cohort_metric(metric, 'faculty', slugify(faculty)))
+        if slugify(department or ''):
+            metrics.add(cohort_metric(metric, 'department', slugify(department)))
+    return sorted(metrics)
+
+
+def invalidate_user_cohorts(user_id):
+    with _local_lock:
+        _local.pop(str(user_id), None)
+    try:
+        get_redis('cache').hdel(COHORTS_HASH, str(user_id))
+    except Exception:
+        logger.warning(f"Failed to invalidate cohort cache for user {user_id}", exc_info=True)
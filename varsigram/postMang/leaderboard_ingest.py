@@ -0,0 +1,106 @@
+"""
+Single ingestion path for reward-point leaderboard updates.
+
+Every change to a `RewardPointTransaction` (create, points edit, delete) becomes one
+event `(transaction id, version, delta)`. Events are applied with a Lua script that
+claims `leaderboard:event:<tx_id>:<version>` with SET NX EX and only then ZINCRBYs
+the period keys, so an event applied twice (signal + retry, duplicate delivery)
+changes scores exactly once within `LEADERBOARD_EVENT_DEDUPE_SECONDS`.
+
+Deltas are applied to the period keys of the day the transaction was created, so
+edits and deletes correct the same daily/weekly/monthly boards the create hit. The
+same script also updates the author's faculty and department boards
+(see `leaderboard_cohorts`) and the post's reward total in `post:rewards`
+(see `reward_cache`), so all of them move together or not at all.
+"""
+import logging
+
+from django.conf import settings
+
+from varsigram.redis_client import get_redis
+from .leaderboard_utils import period_keys
+from .leaderboard_snapshots import note_score_changes
+from .leaderboard_cohorts import user_cohort_metrics
+from .reward_cache import POST_REWARDS_HASH
+
+logger = logging.getLogger(__name__)
+
+EVENT_DEDUPE_SECONDS = getattr(settings, 'LEADERBOARD_EVENT_DEDUPE_SECONDS', 60 * 60 * 24)
+# TTL per entry of period_keys(): alltime, daily, weekly, monthly (0 = no expiry)
+PERIOD_TTLS = (0, 60 * 60 * 24 * 180, 60 * 60 * 24 * 180, 60 * 60 * 24 * 365)
+DELETED_VERSION = 'deleted'
+
+# KEYS[1] = dedupe key, KEYS[2] = post reward totals hash, KEYS[3..n] = leaderboard keys
+# ARGV[1] = dedupe ttl, ARGV[2] = delta (integer), ARGV[3] = member, ARGV[4] = post id ('' to skip),
+# ARGV[5..] = ttl per leaderboard key
+# Returns nil if the event was already applied, else the new score for each leaderboard key.
+APPLY_EVENT_LUA = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return nil
+end
+if ARGV[4] ~= '' then
+    if redis.call('HINCRBY', KEYS[2], ARGV[4], ARGV[2]) <= 0 then
+        redis.call('HDEL', KEYS[2], ARGV[4])
+    end
+end
+local scores = {}
+for i = 3, #KEYS do
+    local score = redis.call('ZINCRBY', KEYS[i], ARGV[2], ARGV[3])
+    if tonumber(score) <= 0 then
+        redis.call('ZREM', KEYS[i], ARGV[3])
+    end
+    local ttl = tonumber(ARGV[i + 2])
+    if ttl and ttl > 0 then
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+    scores[#scores + 1] = score
+end
+return scores
+"""
+
+_apply_event_script = None
+
+
+def _get_script():
+    global _apply_event_script
+    if _apply_event_script is None:
+        _apply_event_script = get_redis('broker').register_script(APPLY_EVENT_LUA)
+    return _apply_event_script
+
+
+def event_key(tx_id, version):
+    return f"leaderboard:event:{tx_id}:{version}"
+
+
+def apply_reward_event(tx_id, version, post_author_id, delta, created_date, post_id=None):
+    """Apply one leaderboard delta exactly once. Returns False if it was a duplicate.
+
+    Raises on Redis errors so callers can retry; the dedupe key makes retries safe.
+    """
+    if not delta:
+        return True
+    metrics = ['points', *user_cohort_metrics(post_author_id)]
+    keys = [key for metric in metrics for key in period_keys(metric, created_date)]
+    args = [EVENT_DEDUPE_SECONDS, int(delta), str(post_author_id), post_id or '', *(PERIOD_TTLS * len(metrics))]
+    scores = _get_script()(keys=[event_key(tx_id, version), POST_REWARDS_HASH, *keys], args=args)
+    if scores is None:
+        logger.info(f"Leaderboard event {tx_id}:{version} already applied; skipping")
+        return False
+    note_score_changes([(key, float(score), float(delta)) for key, score in zip(keys, scores)])
+    return True
+
+
+def submit_reward_event(tx_id, version, post_author_id, delta, created_date, post_id=None):
+    """Apply an event now, falling back to a Celery retry if Redis is unavailable."""
+    try:
+        apply_reward_event(tx_id, version, post_author_id, delta, created_date, post_id)
+    except Exception:
+        logger.warning(f"Deferring leaderboard event {tx_id}:{version}", exc_info=True)
+        try:
+            from .tasks import apply_leaderboard_event
+            apply_leaderboard_event.apply_async(
+                args=[tx_id, str(version), post_author_id, int(delta), created_date.isoformat(), post_id],
+                countdown=30,
+            )
+        except Exception:
+            logger.exception(f"Failed to enqueue leaderboard event {tx_id}:{version}")
@@ -0,0 +1,131 @@
+"""
+Arbitrary date-range reward leaderboards.
+
+A range such as "last 14 days" or "this semester" is covered with the fewest
+existing period boards: whole calendar months first, then whole ISO weeks, then
+single days. The covering boards are summed with ZUNIONSTORE into
+`leaderboard:points:range:<from>:<to>`, which lives for `LEADERBOARD_RANGE_TTL`
+seconds, so repeated reads of the same range cost one snapshot lookup.
+
+Covering boards that are missing from Redis (expired or never built) are rebuilt
+on demand from the daily reward rollup before the union: one query over just the
+missing periods, writing only those global boards. A period with no rewards gets an
+`<board>:empty` marker instead of a board, so it is not rebuilt on every request.
+
+Building a range that is not cached is limited to `LEADERBOARD_RANGE_BUILDS_PER_MINUTE`
+per user (`allow_range_build`); cached ranges are always served.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from varsigram.redis_client import get_redis
+from .leaderboard_recompute import KEY_FNS, TTLS, _period_bounds, _swap_in, month_bounds, week_bounds
+from .leaderboard_snapshots import build_snapshot
+from .models import RewardDailyRollup
+
+logger = logging.getLogger(__name__)
+
+RANGE_TTL = getattr(settings, 'LEADERBOARD_RANGE_TTL', 60 * 5)
+RANGE_MAX_DAYS = getattr(settings, 'LEADERBOARD_RANGE_MAX_DAYS', 400)
+RANGE_BUILDS_PER_MINUTE = getattr(settings, 'LEADERBOARD_RANGE_BUILDS_PER_MINUTE', 5)
+
+
+def key_range(metric, start, end):
+    return f"leaderboard:{metric}:range:{start.isoformat()}:{end.isoformat()}"
+
+
+def empty_marker(board_key):
+    return f"{board_key}:empty"
+
+
+def allow_range_build(user_id):
+    """Count one uncached range build for `user_id`; False once over the per-minute limit."""
+    key = f"leaderboard:range:builds:{user_id}"
+    pipe = get_redis('broker').pipeline(transaction=True)
+    pipe.set(key, 0, ex=60, nx=True)
+    pipe.incr(key)
+    _, builds = pipe.execute()
+    return builds <= RANGE_BUILDS_PER_MINUTE
+
+
+def cover_range(start, end):
+    """Return [(period, day)] boards that exactly cover [start, end], preferring the largest."""
+    cover = []
+    day = start
+    while day <= end:
+        m_start, m_end = month_bounds(day)
+        w_start, w_end = week_bounds(day)
+        if day == m_start and m_end <= end:
+            cover.append(('monthly', day))
+            day = m_end
+        elif day == w_start and w_end <= end:
+            cover.append(('weekly', day))
+            day = w_end
+        else:
+            cover.append(('daily', day))
+        day += timedelta(days=1)
+    return cover
+
+
+def _backfill_missing(r, cover):
+    """Build the covering boards that are absent from Redis. Returns boards written.
+
+    Only the missing periods are read from `RewardDailyRollup` (one query) and only
+    their global boards are written; periods without rewards get an empty marker.
+    """
+    pipe = r.pipeline(transaction=False)
+    for period, day in cover:
+        key = KEY_FNS[period]('points', day)
+        pipe.exists(key, empty_marker(key))
+    missing = {
+        KEY_FNS[period]('points', day): (period, *_period_bounds(period, day))
+        for (period, day), found in zip(cover, pipe.execute()) if not found
+    }
+    if not missing:
+        return 0
+
+    spans = Q()
+    for _, lo, hi in missing.values():
+        spans |= Q(day__gte=lo, day__lte=hi)
+    boards = {key: defaultdict(float) for key in missing}
+    rows = RewardDailyRollup.objects.filter(spans, points__gt=0).values_list('day', 'user', 'points')
+    for day, user_id, points in rows.iterator():
+        for key, (_, lo, hi) in missing.items():
+            if lo <= day <= hi:
+                boards[key][str(user_id)] += float(points)
+
+    filled = {key: mapping for key, mapping in boards.items() if mapping}
+    if filled:
+        _swap_in(r, filled, {key: TTLS[missing[key][0]] for key in filled})
+    pipe = r.pipeline(transaction=False)
+    for key in boards.keys() - filled.keys():
+        pipe.set(empty_marker(key), '1', ex=TTLS[missing[key][0]])
+    pipe.execute()
+    logger.info(f"Backfilled {len(filled)} range boards ({len(boards) - len(filled)} empty)")
+    return len(boards)
+
+
+def ensure_range_board(start, end, metric='points'):
+    """Return the key of the cached range board for [start, end], building it if needed."""
+    r = get_redis('broker')
+    key = key_range(metric, start, end)
+    if r.exists(key):
+        return key
+
+    cover = cover_range(start, end)
+    try:
+        _backfill_missing(r, cover)
+    except Exception:
+        logger.warning(f"Backfill for range {start}..{end} failed; using boards as they are", exc_info=True)
+
+    pipe = r.pipeline(transaction=True)
+    pipe.zunionstore(key, [KEY_FNS[period](metric, day) for period, day in cover])
+    pipe.expire(key, RANGE_TTL)
+    pipe.execute()
+    build_snapshot(key, ttl=RANGE_TTL)
+    logger.info(f"Built range leaderboard {key} from {len(cover)} boards")
+    return key
@@ -0,0 +1,218 @@
+"""
+Leaderboard recompute engine.
+
+Per-day, per-author totals are read from `RewardDailyRollup` (one indexed range
+scan) and rolled up in memory into every daily, weekly and monthly board the range
+covers. Each rebuilt board is written to a temporary key
+and swapped in with RENAME inside MULTI/EXEC, so readers never see a half-built or
+empty leaderboard. Boards with no transactions in the range are deleted.
+
+The range is widened to whole weeks/months for the period types requested, and only
+boards fully covered by the widened range are written, so a rebuild never replaces a
+board with partial data.
+
+Faculty and department boards (see `leaderboard_cohorts`) are rebuilt in the same
+pass from the same rows.
+"""
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay
+
+from varsigram.redis_client import get_redis
+from .leaderboard_cohorts import all_cohort_metrics, cohort_metric, get_user_cohorts
+from .leaderboard_ingest import PERIOD_TTLS
+from .leaderboard_snapshots import cutoff_key
+from .leaderboard_utils import key_alltime, key_daily, key_weekly, key_monthly
+from .models import RewardDailyRollup, RewardPointTransaction
+
+logger = logging.getLogger(__name__)
+
+ALL_PERIODS = ('daily', 'weekly', 'monthly')
+KEY_FNS = {'daily': key_daily, 'weekly': key_weekly, 'monthly': key_monthly}
+TTLS = {'alltime': PERIOD_TTLS[0], 'daily': PERIOD_TTLS[1], 'weekly': PERIOD_TTLS[2], 'monthly': PERIOD_TTLS[3]}
+TMP_KEY_TTL = 60 * 60  # safety net if a rebuild dies between write and swap
+ZADD_CHUNK = 1000
+
+
+def week_bounds(d):
+    start = d - timedelta(days=d.weekday())
+    return start, start + timedelta(days=6)
+
+
+def month_bounds(d):
+    start = d.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def _period_bounds(period, d):
+    if period == 'weekly':
+        return week_bounds(d)
+    if period == 'monthly':
+        return month_bounds(d)
+    return d, d
+
+
+def expand_range(start, end, periods):
+    """Widen [start, end] so every requested period touching it is fully covered."""
+    lo, hi = start, end
+    for period in periods:
+        lo = min(lo, _period_bounds(period, start)[0])
+        hi = max(hi, _period_bounds(period, end)[1])
+    return lo, hi
+
+
+def _covered_boards(lo, hi, periods, metrics=('points',)):
+    """Return {board_key: period} for every board lying entirely within [lo, hi]."""
+    boards = {}
+    day = lo
+    while day <= hi:
+        for period in periods:
+            p_start, p_end = _period_bounds(period, day)
+            if p_start >= lo and p_end <= hi:
+                for metric in metrics:
+                    boards[KEY_FNS[period](metric, day)] = period
+        day += timedelta(days=1)
+    return boards
+
+
+def _author_metrics(author_ids):
+    """Return {str(author_id): [metric, ...]}: the global board plus the author's cohorts."""
+    cohorts = get_user_cohorts(author_ids)
+    metrics = {}
+    for uid in author_ids:
+        user_cohorts = cohorts.get(str(uid), {})
+        metrics[str(uid)] = ['points'] + [
+            cohort_metric('points', kind, slug) for kind, slug in user_cohorts.items() if slug
+        ]
+    return metrics
+
+
+def _swap_in(r, boards, ttls):
+    """Write `boards` ({key: {member: score}}) to temp keys, then RENAME them over the live keys."""
+    token = uuid.uuid4().hex[:12]
+    tmp_keys = {key: f"{key}:tmp:{token}" for key, mapping in boards.items() if mapping}
+
+    pipe = r.pipeline(transaction=False)
+    for key, tmp in tmp_keys.items():
+        items = list(boards[key].items())
+        for i in range(0, len(items), ZADD_CHUNK):
+            pipe.zadd(tmp, dict(items[i:i + ZADD_CHUNK]))
+        pipe.expire(tmp, TMP_KEY_TTL)
+    pipe.execute()
+
+    pipe = r.pipeline(transaction=True)
+    for key in boards:
+        if key in tmp_keys:
+            pipe.rename(tmp_keys[key], key)
+            if ttls.get(key):
+                pipe.expire(key, ttls[key])
+            else:
+                pipe.persist(key)
+        else:
+            pipe.delete(key)
+    pipe.execute()
+
+    _refresh_snapshots(r, list(boards))
+
+
+def _refresh_snapshots(r, keys):
+    """Re-render snapshots for rebuilt boards that currently have one."""
+    if not keys:
+        return
+    try:
+        from .tasks import refresh_leaderboard_snapshot
+        for key, cutoff in zip(keys, r.mget([cutoff_key(k) for k in keys])):
+            if cutoff is not None:
+                refresh_leaderboard_snapshot.delay(key)
+    except Exception:
+        logger.warning("Failed to schedule snapshot refresh after recompute", exc_info=True)
+
+
+def recompute_points_range(start, end, periods=ALL_PERIODS):
+    """Rebuild the `periods` boards covering [start, end] (dates, inclusive). Returns boards written."""
+    lo, hi = expand_range(start, end, periods)
+    board_periods = _covered_boards(lo, hi, periods, ['points', *all_cohort_metrics()])
+    boards = {key: defaultdict(float) for key in board_periods}
+
+    rows = list(
+        RewardDailyRollup.objects
+        .filter(day__gte=lo, day__lte=hi, points__gt=0)
+        .values_list('day', 'user', 'points')
+    )
+    author_metrics = _author_metrics({user_id for _, user_id, _ in rows})
+    for day, user_id, points in rows:
+        member = str(user_id)
+        for metric in author_metrics[member]:
+            for period in periods:
+                key = KEY_FNS[period](metric, day)
+                if key in boards:
+                    boards[key][member] += float(points)
+
+    _swap_in(get_redis('broker'), boards, {key: TTLS[p] for key, p in board_periods.items()})
+    logger.info(f"Recomputed {len(boards)} {'/'.join(periods)} leaderboards for {lo}..{hi}")
+    return len(boards)
+
+
+def recompute_points_alltime():
+    """Rebuild the all-time points boards (global and cohort) with a single grouped query and atomic swap."""
+    rows = RewardDailyRollup.objects.values('user').annotate(score=Sum('points')).filter(score__gt=0).order_by()
+    scores = {str(row['user']): float(row['score']) for row in rows.iterator()}
+    boards = {key_alltime(metric): {} for metric in ['points', *all_cohort_metrics()]}
+    for member, metrics in _author_metrics(list(scores)).items():
+        for metric in metrics:
+            boards.setdefault(key_alltime(metric), {})[member] = scores[member]
+    _swap_in(get_redis('broker'), boards, {key: TTLS['alltime'] for key in boards})
+    logger.info(f"Recomputed all-time leaderboards: {len(scores)} users, {len(boards)} boards")
+    return len(scores)
+
+
+def month_partitions(start, end):
+    """Split [start, end] into calendar-month (start, end) pairs for parallel backfills."""
+    partitions = []
+    cursor = start
+    while cursor <= end:
+        _, m_end = month_bounds(cursor)
+        partitions.append((cursor, min(m_end, end)))
+        cursor = m_end + timedelta(days=1)
+    return partitions
+
+
+def rebuild_daily_rollups(start=None, end=None):
+    """Rebuild `RewardDailyRollup` from transactions for [start, end] (dates, inclusive; None = unbounded).
+
+    One grouped `TruncDay` query; the old rows in the range are replaced inside a
+    single DB transaction. Returns the number of rollup rows written.
+    """
+    transactions = RewardPointTransaction.objects.all()
+    rollups = RewardDailyRollup.objects.all()
+    if start:
+        transactions = transactions.filter(created_at__gte=datetime.combine(start, time.min, tzinfo=timezone.utc))
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        transactions = transactions.filter(created_at__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc))
+        rollups = rollups.filter(day__lte=end)
+
+    rows = (
+        transactions
+        .annotate(day=TruncDay('created_at', tzinfo=timezone.utc))
+        .values('day', 'post_author')
+        .annotate(points=Sum('points'), tx_count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = RewardDailyRollup.objects.bulk_create(
+            (
+                RewardDailyRollup(user_id=row['post_author'], day=row['day'].date(), points=row['points'], tx_count=row['tx_count'])
+                for row in rows.iterator()
+            ),
+            batch_size=ZADD_CHUNK,
+        )
+    logger.info(f"Rebuilt {len(created)} daily reward rollups for {start or '-inf'}..{end or 'today'}")
+    return len(created)
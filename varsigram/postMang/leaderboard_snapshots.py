@@ -0,0 +1,173 @@
+"""
+Pre-hydrated leaderboard snapshots.
+
+A snapshot is the top `LEADERBOARD_SNAPSHOT_SIZE` members of a leaderboard sorted
+set, rendered with names and avatars, stored as JSON under `<board_key>:snapshot`.
+Leaderboard views serve the snapshot as-is and only compute the caller's own rank
+live, so a request costs two Redis reads instead of a ZREVRANGE plus user hydration.
+
+Snapshots are refreshed:
+- periodically by `postMang.tasks.refresh_leaderboard_snapshots` for the current periods;
+- on demand when a view finds none (past weeks, fresh Redis);
+- after a score change that can move the top-N (`note_score_changes`), debounced
+  to one rebuild per `LEADERBOARD_SNAPSHOT_DEBOUNCE_SECONDS` per board.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+SNAPSHOT_SIZE = getattr(settings, 'LEADERBOARD_SNAPSHOT_SIZE', 100)
+SNAPSHOT_TTL = getattr(settings, 'LEADERBOARD_SNAPSHOT_TTL', 60 * 15)  # 15 minutes
+SNAPSHOT_DEBOUNCE_SECONDS = getattr(settings, 'LEADERBOARD_SNAPSHOT_DEBOUNCE_SECONDS', 30)
+
+
+def snapshot_key(board_key):
+    return f"{board_key}:snapshot"
+
+
+def cutoff_key(board_key):
+    return f"{board_key}:snapshot:cutoff"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def hydrate_leaderboard_users(user_ids):
+    """Return {str(user_id): {'name', 'profile_pic_url'}} with a single query."""
+    ids = [int(uid) for uid in user_ids if str(uid).isdigit()]
+    users = User.objects.filter(id__in=ids).select_related('student', 'organization')
+    hydrated = {}
+    for u in users:
+        student = getattr(u, 'student', None)
+        organization = getattr(u, 'organization', None)
+        name = (student and student.name) or (organization and organization.organization_name) or u.email
+        hydrated[str(u.id)] = {'name': name, 'profile_pic_url': u.profile_pic_url}
+    return hydrated
+
+
+def build_snapshot(board_key, size=SNAPSHOT_SIZE, ttl=SNAPSHOT_TTL):
+    """Render the top `size` members of `board_key` and store the snapshot for `ttl` seconds."""
+    r = get_redis('broker')
+    members = r.zrevrange(board_key, 0, size - 1, withscores=True)
+    user_ids = [_decode(m) for m, _ in members]
+    users = hydrate_leaderboard_users(user_ids)
+
+    results = []
+    for uid, (_, score) in zip(user_ids, members):
+        user = users.get(uid, {})
+        results.append({
+            'user_id': uid,
+            'score': score,
+            'name': user.get('name'),
+            'profile_pic_url': user.get('profile_pic_url'),
+        })
+    snapshot = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'results': results,
+    }
+
+    # Any score at or above the cutoff can change what the snapshot shows.
+    cutoff = members[-1][1] if len(members) >= size else '-inf'
+    pipe = r.pipeline()
+    pipe.set(snapshot_key(board_key), json.dumps(snapshot), ex=ttl)
+    pipe.set(cutoff_key(board_key), cutoff, ex=ttl)
+    pipe.execute()
+    return snapshot
+
+
+def get_snapshot(board_key):
+    """Return the stored snapshot for `board_key`, building it if missing."""
+    try:
+        raw = get_redis('broker').get(snapshot_key(board_key))
+        if raw:
+            return json.loads(raw)
+    except Exception:
+        logger.warning(f"Failed to read leaderboard snapshot {board_key}", exc_info=True)
+    return build_snapshot(board_key)
+
+
+def get_member_rank(board_key, user_id):
+    """Return {'user_id', 'rank', 'score'} for one member (rank is 1-based, None if unranked)."""
+    r = get_redis('broker')
+    pipe = r.pipeline()
+    pipe.zrevrank(board_key, str(user_id))
+    pipe.zscore(board_key, str(user_id))
+    rank, score = pipe.execute()
+    return {
+        'user_id': str(user_id),
+        'rank': rank + 1 if rank is not None else None,
+        'score': score or 0,
+    }
+
+
+def note_score_changes(changes):
+    """Schedule snapshot rebuilds for boards where a score change can affect the top-N.
+
+    `changes` is a list of (board_key, new_score, delta). Boards without a stored
+    snapshot are skipped; they are built on first read.
+    """
+    if not changes:
+        return
+    try:
+        r = get_redis('broker')
+        cutoffs = r.mget([cutoff_key(board_key) for board_key, _, _ in changes])
+        stale = []
+        for (board_key, new_score, delta), cutoff in zip(changes, cutoffs):
+            if cutoff is None:
+                continue
+            cutoff = float(cutoff)
+            old_score = float(new_score) - float(delta)
+            if float(new_score) >= cutoff or old_score >= cutoff:
+                stale.append(board_key)
+        if not stale:
+            return
+
+        pipe = r.pipeline()
+        for board_key in stale:
+            pipe.set(f"{snapshot_key(board_key)}:pending", '1', nx=True, ex=SNAPSHOT_DEBOUNCE_SECONDS)
+        acquired = pipe.execute()
+
+        from .tasks import refresh_leaderboard_snapshot
+        for board_key, ok in zip(stale, acquired):
+            if ok:
+                refresh_leaderboard_snapshot.apply_async(args=[board_key], countdown=SNAPSHOT_DEBOUNCE_SECONDS)
+    except Exception:
+        logger.warning("Failed to schedule leaderboard snapshot refresh", exc_info=True)
+
+
+def get_member_neighbourhood(board_key, user_id, k):
+    """Return the member's rank/score and the `k` members either side of them, hydrated.
+
+    Two Redis round-trips (ZREVRANK+ZSCORE, then a windowed ZREVRANGE) and one user query,
+    independent of the board size.
+    """
+    me = get_member_rank(board_key, user_id)
+    if me['rank'] is None:
+        return me, []
+
+    start = max(me['rank'] - 1 - k, 0)
+    members = get_redis('broker').zrevrange(board_key, start, me['rank'] - 1 + k, withscores=True)
+    user_ids = [_decode(m) for m, _ in members]
+    users = hydrate_leaderboard_users(user_ids)
+    neighbours = []
+    for offset, (uid, (_, score)) in enumerate(zip(user_ids, members)):
+        user = users.get(uid, {})
+        neighbours.append({
+            'rank': start + offset + 1,
+            'user_id': uid,
+            'score': score,
+            'name': user.get('name'),
+            'profile_pic_url': user.get('profile_pic_url'),
+            'is_me': uid == str(user_id),
+        })
+    return me, neighbours
@@ -1,24 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand, CommandError
-from datetime import datetime, timedelta
-from postMang.tasks import recompute_points_daily, recompute_points_weekly, recompute_points_alltime
+from datetime import datetime
+from postMang import leaderboard_recompute
+from postMang.tasks import recompute_points_range, recompute_points_alltime
 
 class Command(BaseCommand):
-    help = 'Backfill leaderboard snapshots (daily/weekly/alltime) from RewardPointTransaction records.'
+    help = 'Backfill leaderboard snapshots (daily/weekly/monthly/alltime) from RewardPointTransaction records.'
 
     def add_arguments(self, parser):
         parser.add_argument('--from-date', type=str, help='Start date (YYYY-MM-DD)')
         parser.add_argument('--to-date', type=str, help='End date (YYYY-MM-DD)')
         parser.add_argument('--weekly', action='store_true', help='Backfill weekly snapshots')
         parser.add_argument('--daily', action='store_true', help='Backfill daily snapshots')
+        parser.add_argument('--monthly', action='store_true', help='Backfill monthly snapshots')
         parser.add_argument('--alltime', action='store_true', help='Recompute all-time snapshot')
-        parser.add_argument('--run-sync', action='store_true', help='Run tasks synchronously (no Celery)')
+        parser.add_argument('--run-sync', action='store_true', help='Run in this process (no Celery)')
+        parser.add_argument('--workers', type=int, default=4, help='Parallel month partitions when using --run-sync')
 
     def handle(self, *args, **options):
         run_sync = options['run_sync']
 
-        # Default to daily if neither daily nor weekly nor alltime specified
-        if not (options['daily'] or options['weekly'] or options['alltime']):
-            options['daily'] = True
+        periods = tuple(p for p in ('daily', 'weekly', 'monthly') if options[p])
+        # Default to daily if no period specified
+        if not periods and not options['alltime']:
+            periods = ('daily',)
 
         from_date = None
         to_date = None
@@ -33,35 +38,23 @@ class Command(BaseCommand):
             except Exception:
                 raise CommandError('Invalid --to-date format. Use YYYY-MM-DD')
 
-        if options['daily']:
+        if periods:
             if not from_date or not to_date:
-                raise CommandError('For daily backfill please provide --from-date and --to-date')
-            day = from_date
-            while day <= to_date:
-                date_iso = day.isoformat()
-                self.stdout.write(f'Backfilling daily leaderboard for {date_iso}...')
-                if run_sync:
-                    recompute_points_daily(None, date_iso)
-                else:
-                    recompute_points_daily.delay(date_iso)
-                day = day + timedelta(days=1)
+                raise CommandError('For daily/weekly/monthly backfill please provide --from-date and --to-date')
 
-        if options['weekly']:
-            if not from_date or not to_date:
-                raise CommandError('For weekly backfill please provide --from-date and --to-date')
-            # Iterate weeks by stepping 7 days from the monday of from_date
-            # Normalize start to Monday
-            start = from_date - timedelta(days=from_date.weekday())
-            end = to_date - timedelta(days=to_date.weekday())
-            week_start = start
-            while week_start <= end:
-                date_iso = week_start.isoformat()
-                self.stdout.write(f'Backfilling weekly leaderboard for week starting {date_iso}...')
-                if run_sync:
-                    recompute_points_weekly(None, date_iso)
-                else:
-                    recompute_points_weekly.delay(date_iso)
-                week_start = week_start + timedelta(days=7)
+            # One grouped SQL pass per calendar month; partitions are independent and idempotent
+            partitions = leaderboard_recompute.month_partitions(from_date, to_date)
+            self.stdout.write(f"Backfilling {'/'.join(periods)} leaderboards for {from_date}..{to_date} in {len(partitions)} month partitions...")
+            if run_sync:
+                with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+                    written = sum(pool.map(
+                        lambda part: leaderboard_recompute.recompute_points_range(part[0], part[1], periods=periods),
+                        partitions,
+                    ))
+                self.stdout.write(f'Rebuilt {written} leaderboard keys.')
+            else:
+                for start, end in partitions:
+                    recompute_points_range.delay(start.isoformat(), end.isoformat(), list(periods))
 
         if options['alltime']:
             self.stdout.write('Recomputing all-time leaderboard...')
@@ -70,4 +63,4 @@ class Command(BaseCommand):
             else:
                 recompute_points_alltime.delay()
 
-        self.stdout.write(self.style.SUCCESS('Backfill scheduled.'))
+        self.stdout.write(self.style.SUCCESS('Backfill complete.' if run_sync else 'Backfill scheduled.'))
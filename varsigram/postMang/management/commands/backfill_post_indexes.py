@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from postMang.post_cache import index_post_slugs, remember_post_authors
+from postMang.scans import run_scan
+
+class Command(BaseCommand):
+    help = 'Backfill Redis post indexes (slug -> post_id, post_id -> author_id) from Firestore'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=4, help='Number of document-ID ranges to scan in parallel')
+        parser.add_argument('--page-size', type=int, default=500, help='Documents read per page')
+        parser.add_argument('--restart', action='store_true', help='Ignore saved checkpoints and scan from the beginning')
+
+    def handle(self, *args, **options):
+        def index_page(docs, writer):
+            data = {doc.id: doc.to_dict() or {} for doc in docs}
+            index_post_slugs({d.get('slug'): pid for pid, d in data.items()})
+            remember_post_authors({pid: d.get('author_id') for pid, d in data.items()})
+            return 0
+
+        stats = run_scan(
+            'backfill_post_indexes',
+            index_page,
+            fields=['slug', 'author_id'],
+            page_size=options['page_size'],
+            partitions=options['partitions'],
+            restart=options['restart'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['docs']} posts ({stats['docs_per_second']} docs/s)."
+        ))
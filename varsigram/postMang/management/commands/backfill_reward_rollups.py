@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from postMang.leaderboard_recompute import rebuild_daily_rollups, month_partitions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild RewardDailyRollup rows from RewardPointTransaction (whole table by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-date', type=str, help='Start date YYYY-MM-DD (inclusive)')
+        parser.add_argument('--to-date', type=str, help='End date YYYY-MM-DD (inclusive)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['from_date'], '%Y-%m-%d').date() if options.get('from_date') else None
+            end = datetime.strptime(options['to_date'], '%Y-%m-%d').date() if options.get('to_date') else None
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+
+        if start and end:
+            # One transaction per month keeps row locks short on large ranges
+            total = 0
+            for p_start, p_end in month_partitions(start, end):
+                written = rebuild_daily_rollups(p_start, p_end)
+                total += written
+                self.stdout.write(f'{p_start}..{p_end}: {written} user-days')
+        else:
+            total = rebuild_daily_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} daily reward rollups.'))
@@ -1,10 +1,9 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Sum
 from postMang.models import RewardPointTransaction
+from postMang import leaderboard_recompute
 from postMang.leaderboard_utils import key_alltime, key_daily, key_weekly, key_monthly
-import redis
-import os
-from datetime import datetime, timedelta
+from varsigram.redis_client import get_redis
+from datetime import datetime, timedelta, timezone
 
 
 class Command(BaseCommand):
@@ -19,8 +18,7 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        redis_url = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
-        r = redis.Redis.from_url(redis_url)
+        r = get_redis('broker')
         
         self.stdout.write(self.style.WARNING('=' * 70))
         self.stdout.write(self.style.WARNING('Initializing Leaderboards from PostgreSQL'))
@@ -30,83 +28,32 @@ class Command(BaseCommand):
         total_transactions = RewardPointTransaction.objects.count()
         self.stdout.write(f'\n Found {total_transactions} total reward transactions in PostgreSQL\n')
         
+        # 0. DAILY ROLLUP (every recompute reads from it)
+        self.stdout.write(self.style.HTTP_INFO(' Rebuilding daily reward rollups...'))
+        rollups = leaderboard_recompute.rebuild_daily_rollups()
+        self.stdout.write(self.style.SUCCESS(f'   ✓ {rollups} user-days'))
+
         # 1. ALL-TIME LEADERBOARD
         self.stdout.write(self.style.HTTP_INFO(' Computing all-time leaderboard...'))
-        qs = RewardPointTransaction.objects.values('post_author').annotate(score=Sum('points'))
-        key = key_alltime('points')
-        pipe = r.pipeline()
-        pipe.delete(key)
-        if qs:
-            mapping = {str(item['post_author']): float(item['score']) for item in qs}
-            pipe.zadd(key, mapping)
-        result = pipe.execute()
-        self.stdout.write(self.style.SUCCESS(f'   ✓ All-time leaderboard: {len(qs)} users'))
+        users = leaderboard_recompute.recompute_points_alltime()
+        self.stdout.write(self.style.SUCCESS(f'   ✓ All-time leaderboard: {users} users'))
         
         # Get top 3 for display
-        top_3 = r.zrevrange(key, 0, 2, withscores=True)
+        top_3 = r.zrevrange(key_alltime('points'), 0, 2, withscores=True)
         if top_3:
             self.stdout.write('   Top 3 users:')
             for i, (user_id, score) in enumerate(top_3, 1):
                 user_id_str = user_id.decode() if isinstance(user_id, bytes) else user_id
                 self.stdout.write(f'     {i}. User ID {user_id_str}: {int(score)} points')
         
-        # 2. CURRENT WEEK LEADERBOARD
-        self.stdout.write(f'\n{self.style.HTTP_INFO(" Computing current week leaderboard...")}')
-        today = datetime.now().date()
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=6)
-        
-        qs_week = RewardPointTransaction.objects.filter(
-            created_at__date__gte=week_start,
-            created_at__date__lte=week_end
-        ).values('post_author').annotate(score=Sum('points'))
-        
-        key = key_weekly('points', week_start)
-        pipe = r.pipeline()
-        pipe.delete(key)
-        if qs_week:
-            mapping = {str(item['post_author']): float(item['score']) for item in qs_week}
-            pipe.zadd(key, mapping)
-        pipe.expire(key, 60 * 60 * 24 * 180)
-        pipe.execute()
-        
-        iso_year, iso_week, _ = week_start.isocalendar()
-        self.stdout.write(self.style.SUCCESS(f'    Weekly leaderboard (Week {iso_year}-W{iso_week:02d}): {len(qs_week)} users'))
-        self.stdout.write(f'   Period: {week_start} to {week_end}')
-        
-        # 3. CURRENT MONTH LEADERBOARD
-        self.stdout.write(f'\n{self.style.HTTP_INFO(" Computing current month leaderboard...")}')
-        month_start = today.replace(day=1)
-        
-        qs_month = RewardPointTransaction.objects.filter(
-            created_at__date__gte=month_start
-        ).values('post_author').annotate(score=Sum('points'))
-        
-        key = key_monthly('points', today)
-        pipe = r.pipeline()
-        pipe.delete(key)
-        if qs_month:
-            mapping = {str(item['post_author']): float(item['score']) for item in qs_month}
-            pipe.zadd(key, mapping)
-        pipe.expire(key, 60 * 60 * 24 * 180)
-        pipe.execute()
-        self.stdout.write(self.style.SUCCESS(f'   Monthly leaderboard ({today.strftime("%B %Y")}): {len(qs_month)} users'))
-        
-        # 4. TODAY'S LEADERBOARD
-        self.stdout.write(f"\n{self.style.HTTP_INFO('Computing today leaderboard...')}")
-        qs_today = RewardPointTransaction.objects.filter(
-            created_at__date=today
-        ).values('post_author').annotate(score=Sum('points'))
-        
-        key = key_daily('points', today)
-        pipe = r.pipeline()
-        pipe.delete(key)
-        if qs_today:
-            mapping = {str(item['post_author']): float(item['score']) for item in qs_today}
-            pipe.zadd(key, mapping)
-        pipe.expire(key, 60 * 60 * 24 * 180)
-        pipe.execute()
-        self.stdout.write(self.style.SUCCESS(f'Daily leaderboard ({today}): {len(qs_today)} users'))
+        # 2. DAILY / WEEKLY / MONTHLY LEADERBOARDS (one grouped SQL pass)
+        today = datetime.now(timezone.utc).date()
+        since = today - timedelta(days=options['days'])
+        self.stdout.write(f'\n{self.style.HTTP_INFO(f" Computing daily/weekly/monthly leaderboards since {since}...")}')
+        boards = leaderboard_recompute.recompute_points_range(since, today)
+        self.stdout.write(self.style.SUCCESS(f'   ✓ Rebuilt {boards} period leaderboards'))
+        for label, key in (('Weekly', key_weekly('points', today)), ('Monthly', key_monthly('points', today)), ('Daily', key_daily('points', today))):
+            self.stdout.write(f'   {label} ({key}): {r.zcard(key)} users')
         
         # Summary
         self.stdout.write(f"\n{self.style.WARNING('=' * 70)}")
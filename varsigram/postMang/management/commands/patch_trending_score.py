@@ -1,15 +1,31 @@
 from django.core.management.base import BaseCommand
-from postMang.apps import get_firestore_db
+from postMang.scans import run_scan
 
 class Command(BaseCommand):
     help = 'Patch posts missing trending_score in Firestore'
 
-    def handle(self, *args, **kwargs):
-        db = get_firestore_db()
-        patched = 0
-        for doc in db.collection('posts').stream():
-            data = doc.to_dict()
-            if 'trending_score' not in data:
-                doc.reference.update({'trending_score': 0})
-                patched += 1
-        self.stdout.write(self.style.SUCCESS(f'Patched {patched} posts.'))
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=4, help='Number of document-ID ranges to scan in parallel')
+        parser.add_argument('--page-size', type=int, default=500, help='Documents read per page')
+        parser.add_argument('--restart', action='store_true', help='Ignore saved checkpoints and scan from the beginning')
+
+    def handle(self, *args, **options):
+        def patch_page(docs, writer):
+            patched = 0
+            for doc in docs:
+                if 'trending_score' not in (doc.to_dict() or {}):
+                    writer.update(doc.reference, {'trending_score': 0})
+                    patched += 1
+            return patched
+
+        stats = run_scan(
+            'patch_trending_score',
+            patch_page,
+            fields=['trending_score'],
+            page_size=options['page_size'],
+            partitions=options['partitions'],
+            restart=options['restart'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Patched {stats['writes']} posts ({stats['docs']} scanned, {stats['docs_per_second']} docs/s)."
+        ))
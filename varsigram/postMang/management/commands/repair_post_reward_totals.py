@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from postMang.reward_cache import repair_post_reward_totals
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis post:rewards hash (post ID -> total reward points) from Postgres'
+
+    def handle(self, *args, **options):
+        written = repair_post_reward_totals()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt reward totals for {written} posts.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postMang', '0002_rewardpointtransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rewardpointtransaction',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postMang', '0003_rewardpointtransaction_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rewardpointtransaction',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postMang', '0004_alter_rewardpointtransaction_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rewardpointtransaction',
+            name='previous_points',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postMang', '0005_rewardpointtransaction_previous_points'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RewardDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('points', models.IntegerField(default=0)),
+                ('tx_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reward_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reward Daily Rollup',
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_reward_rollup_per_day')],
+            },
+        ),
+    ]
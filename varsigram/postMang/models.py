@@ -1,5 +1,7 @@
-from django.db import models
+from datetime import timezone as dt_timezone
+from django.db import connection, models
 from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_datetime
 from django.utils.text import slugify
 from django.utils import timezone
 from users.models import Student, Organization
@@ -103,7 +105,11 @@ class RewardPointTransaction(models.Model):
         ],
         help_text="Points given (1 to 5)"
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Bumped whenever `points` changes; identifies leaderboard events for dedupe
+    version = models.PositiveIntegerField(default=1)
+    # Points before the last upsert (None if the row was inserted); see `upsert`
+    previous_points = models.PositiveSmallIntegerField(null=True, blank=True)
 
     class Meta:
         verbose_name = "Reward Point Transaction"
@@ -113,6 +119,66 @@ class RewardPointTransaction(models.Model):
         ]
 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored points so a save can emit the leaderboard delta
+        instance._loaded_points = instance.__dict__.get('points')
+        return instance
+
+    @classmethod
+    def upsert(cls, giver, post_author, firestore_post_id, points):
+        """
+        Insert or update the giver's reward on a post in one statement.
+
+        `INSERT ... ON CONFLICT (giver_id, firestore_post_id) DO UPDATE ... RETURNING`
+        never raises on a duplicate, so it is safe under concurrent double-taps and does
+        not abort the request transaction. The update copies the old points into
+        `previous_points` and bumps `version` only when the points change.
+
+        Bypasses model signals: callers must emit the leaderboard event themselves
+        (see postMang.signals.emit_reward_upsert). Returns (instance, previous_points),
+        with previous_points None when the row was inserted.
+        """
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        sql = f"""
+            INSERT INTO {table} (giver_id, firestore_post_id, post_author_id, points, created_at, version, previous_points)
+            VALUES (%s, %s, %s, %s, %s, 1, NULL)
+            ON CONFLICT (giver_id, firestore_post_id) DO UPDATE SET
+                previous_points = {table}.points,
+                points = excluded.points,
+                version = {table}.version + CASE WHEN {table}.points <> excluded.points THEN 1 ELSE 0 END
+            RETURNING id, points, previous_points, version, created_at
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [giver.pk, firestore_post_id, post_author.pk, points, timezone.now()])
+            pk, points, previous_points, version, created_at = cursor.fetchone()
+
+        if isinstance(created_at, str):
+            # SQLite hands back the raw column text
+            created_at = parse_datetime(created_at)
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at, dt_timezone.utc)
+
+        instance = cls(
+            pk=pk, giver=giver, post_author=post_author, firestore_post_id=firestore_post_id,
+            points=points, previous_points=previous_points, version=version, created_at=created_at,
+        )
+        instance._state.adding = False
+        instance._state.db = connection.alias
+        instance._loaded_points = points
+        return instance, previous_points
+
+    def save(self, *args, **kwargs):
+        loaded_points = getattr(self, '_loaded_points', None)
+        if self.pk and loaded_points is not None and loaded_points != self.points:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'version' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'version']
+        super().save(*args, **kwargs)
+
     def __str__(self):
 
         if hasattr(self.giver, 'student'):
@@ -122,4 +188,45 @@ class RewardPointTransaction(models.Model):
         else:
             username = self.giver.email
         return (f"{username} gave {self.points} pts "
-                f"to Post ID {self.firestore_post_id} (Author: {self.post_author.username})")
\ No newline at end of file
+                f"to Post ID {self.firestore_post_id} (Author: {self.post_author.username})")
+
+class RewardDailyRollup(models.Model):
+    """
+    Points received per user per UTC day, maintained incrementally alongside
+    `RewardPointTransaction` (see postMang.signals). Totals, leaderboard recomputes and
+    points history read from here, so their cost scales with users x days rather than
+    with the number of transactions.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='reward_rollups'
+    )
+    day = models.DateField(db_index=True)
+    points = models.IntegerField(default=0)
+    tx_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Reward Daily Rollup"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_reward_rollup_per_day')
+        ]
+
+    @classmethod
+    def apply(cls, user_id, day, points_delta, tx_delta):
+        """Add `points_delta` and `tx_delta` to the user's row for `day` in one upsert statement."""
+        if not points_delta and not tx_delta:
+            return
+        table = connection.ops.quote_name(cls._meta.db_table)
+        sql = f"""
+            INSERT INTO {table} (user_id, day, points, tx_count)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                points = {table}.points + excluded.points,
+                tx_count = {table}.tx_count + excluded.tx_count
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user_id, day, points_delta, tx_delta])
+
+    def __str__(self):
+        return f"{self.user_id} on {self.day}: {self.points} pts ({self.tx_count} rewards)"
@@ -0,0 +1,200 @@
+"""
+Redis caches for Firestore post documents.
+
+- `post:doc:<post_id>` holds a JSON copy of the post document with a short TTL.
+  Any write that changes the document (edit, delete, like, comment, view)
+  drops the entry so readers never serve stale counters for long.
+- `post:slug:<slug>` maps a post slug to its Firestore document ID so deep
+  links resolve without a `where('slug', '==', ...)` query.
+- `post:author` is a hash of post ID -> author user ID. Authorship never changes,
+  so entries have no TTL; they are filled when a post is created and on the first
+  miss. Deleting a post replaces its entry with an empty tombstone, so lookups for it
+  skip Firestore. Each process also keeps a small LRU whose entries live for
+  `POST_AUTHOR_LRU_TTL` seconds, which bounds how long another process can still
+  see a deleted post.
+"""
+import json
+import logging
+import threading
+
+from cachetools import TTLCache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_POST_TTL = getattr(settings, 'REDIS_POST_TTL', 60 * 5)  # 5 minutes
+
+
+def post_doc_key(post_id):
+    return f"post:doc:{post_id}"
+
+
+def post_slug_key(slug):
+    return f"post:slug:{slug}"
+
+
+def get_cached_post(post_id):
+    """Return the cached post dict for `post_id`, or None on a miss or Redis error."""
+    try:
+        raw = get_redis('cache').get(post_doc_key(post_id))
+    except Exception:
+        return None
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def cache_post(post_id, post_data):
+    """Store a post document in Redis (best-effort)."""
+    try:
+        payload = json.dumps(post_data, cls=DjangoJSONEncoder)
+        get_redis('cache').set(post_doc_key(post_id), payload, ex=REDIS_POST_TTL)
+    except Exception:
+        logger.warning(f"Failed to cache post {post_id}", exc_info=True)
+
+
+def invalidate_posts(post_ids):
+    """Drop cached documents for the given post IDs (best-effort)."""
+    keys = [post_doc_key(pid) for pid in post_ids if pid]
+    if not keys:
+        return
+    try:
+        get_redis('cache').delete(*keys)
+    except Exception:
+        logger.warning(f"Failed to invalidate cached posts {post_ids}", exc_info=True)
+
+
+def index_post_slug(slug, post_id):
+    """Point `slug` at `post_id`. Slugs never expire; they are removed on delete."""
+    if not slug:
+        return
+    try:
+        get_redis('cache').set(post_slug_key(slug), str(post_id))
+    except Exception:
+        logger.warning(f"Failed to index slug {slug} for post {post_id}", exc_info=True)
+
+
+def index_post_slugs(slug_to_post_id):
+    """Bulk variant of `index_post_slug` for backfills: a single MSET."""
+    mapping = {post_slug_key(slug): str(pid) for slug, pid in slug_to_post_id.items() if slug}
+    if not mapping:
+        return
+    try:
+        get_redis('cache').mset(mapping)
+    except Exception:
+        logger.warning("Failed to bulk-index post slugs", exc_info=True)
+
+
+def drop_post_slug(slug):
+    if not slug:
+        return
+    try:
+        get_redis('cache').delete(post_slug_key(slug))
+    except Exception:
+        logger.warning(f"Failed to drop slug index for {slug}", exc_info=True)
+
+
+def resolve_post_slug(slug):
+    """Return the post ID indexed for `slug`, or None when it is not indexed."""
+    if not slug:
+        return None
+    try:
+        post_id = get_redis('cache').get(post_slug_key(slug))
+    except Exception:
+        return None
+    if post_id is None:
+        return None
+    return post_id.decode() if isinstance(post_id, bytes) else str(post_id)
+
+
+POST_AUTHOR_HASH = 'post:author'
+POST_AUTHOR_LRU_SIZE = getattr(settings, 'POST_AUTHOR_LRU_SIZE', 50000)
+POST_AUTHOR_LRU_TTL = getattr(settings, 'POST_AUTHOR_LRU_TTL', 60)
+DELETED_POST = ''
+
+_post_authors = TTLCache(maxsize=POST_AUTHOR_LRU_SIZE, ttl=POST_AUTHOR_LRU_TTL)
+_post_authors_lock = threading.Lock()
+
+
+def remember_post_authors(post_to_author):
+    """Record {post_id: author_id} in the local LRU and the Redis hash (best-effort)."""
+    mapping = {str(pid): str(aid) for pid, aid in post_to_author.items() if pid and aid}
+    if not mapping:
+        return
+    with _post_authors_lock:
+        _post_authors.update(mapping)
+    try:
+        get_redis('cache').hset(POST_AUTHOR_HASH, mapping=mapping)
+    except Exception:
+        logger.warning(f"Failed to cache authors for posts {list(mapping)}", exc_info=True)
+
+
+def forget_post_author(post_id):
+    """Tombstone a deleted post; other processes drop it when their LRU entry expires."""
+    with _post_authors_lock:
+        _post_authors.pop(str(post_id), None)
+    try:
+        get_redis('cache').hset(POST_AUTHOR_HASH, str(post_id), DELETED_POST)
+    except Exception:
+        logger.warning(f"Failed to drop cached author for post {post_id}", exc_info=True)
+
+
+def _fetch_post_authors(post_ids):
+    """Read `author_id` for several posts from Firestore in one projected batch."""
+    from .apps import get_firestore_db
+    db = get_firestore_db()
+    refs = [db.collection('posts').document(pid) for pid in post_ids]
+    authors = {}
+    for doc in db.get_all(refs, field_paths=['author_id']):
+        if doc.exists and (doc.to_dict() or {}).get('author_id'):
+            authors[doc.id] = str(doc.to_dict()['author_id'])
+    return authors
+
+
+def get_post_author_ids(post_ids):
+    """Return {post_id: author_id (str)} for the posts that exist.
+
+    Checks the local LRU, then one HMGET, then one Firestore `get_all` for the rest,
+    writing what it finds back to both caches. Posts that do not exist (or are
+    tombstoned) are omitted.
+    """
+    ids = [str(pid) for pid in dict.fromkeys(post_ids) if pid]
+    authors = {}
+    with _post_authors_lock:
+        for pid in ids:
+            if pid in _post_authors:
+                authors[pid] = _post_authors[pid]
+    missing = [pid for pid in ids if pid not in authors]
+    if not missing:
+        return authors
+
+    deleted = set()
+    try:
+        for pid, aid in zip(missing, get_redis('cache').hmget(POST_AUTHOR_HASH, missing)):
+            if aid is None:
+                continue
+            aid = aid.decode() if isinstance(aid, bytes) else str(aid)
+            if aid == DELETED_POST:
+                deleted.add(pid)
+            else:
+                authors[pid] = aid
+    except Exception:
+        logger.warning("Post author cache unavailable; reading from Firestore", exc_info=True)
+    hits = {pid: authors[pid] for pid in missing if pid in authors}
+    if hits:
+        with _post_authors_lock:
+            _post_authors.update(hits)
+
+    missing = [pid for pid in missing if pid not in authors and pid not in deleted]
+    if missing:
+        fetched = _fetch_post_authors(missing)
+        remember_post_authors(fetched)
+        authors.update(fetched)
+    return authors
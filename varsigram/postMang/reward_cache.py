@@ -0,0 +1,176 @@
+"""
+Redis indexes for reward reads on post listings.
+
+- `post:rewards` is a hash of post ID -> total reward points. It is updated by the
+  leaderboard ingest script (HINCRBY inside the same deduplicated Lua call as the
+  board updates), so it changes exactly once per reward create, edit or delete.
+  Posts without rewards have no field. The hash lives on the broker Redis with the
+  leaderboards so the script can touch both atomically.
+- `post:rewards:complete` marks the hash as authoritative. It is set by
+  `repair_post_reward_totals` (management command `repair_post_reward_totals`);
+  until then, e.g. on a fresh Redis, totals are read from Postgres.
+- `user:rewarded:<user_id>` is a set of the post IDs a user has rewarded, mirroring
+  `user:likes:<user_id>`. It is filled lazily from Postgres the first time a cold user
+  is checked; the `__loaded__` member marks a complete set, so a set holding only
+  the adds made since it expired is never trusted. Reward creates and deletes add
+  and remove members after commit.
+"""
+import logging
+import uuid
+
+from django.conf import settings
+from django.db.models import Sum
+
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+POST_REWARDS_HASH = 'post:rewards'
+POST_REWARDS_COMPLETE_KEY = 'post:rewards:complete'
+HSET_CHUNK = 1000
+TMP_KEY_TTL = 60 * 60  # safety net if a repair dies before the swap
+REWARDED_LOADED = '__loaded__'
+REDIS_REWARDED_TTL = getattr(settings, 'REDIS_REWARDED_TTL', 60 * 60 * 24 * 7)  # 7 days
+
+
+def _reward_totals_from_db(post_ids):
+    from .models import RewardPointTransaction
+    totals = RewardPointTransaction.objects.filter(
+        firestore_post_id__in=post_ids
+    ).values('firestore_post_id').annotate(total=Sum('points'))
+    return {r['firestore_post_id']: r['total'] for r in totals if r['total']}
+
+
+def get_post_reward_totals(post_ids):
+    """Return {post_id: total reward points}; posts without rewards are omitted.
+
+    One pipelined HMGET when the hash is complete, else a single grouped query.
+    """
+    ids = [str(pid) for pid in post_ids if pid]
+    if not ids:
+        return {}
+    try:
+        pipe = get_redis('broker').pipeline(transaction=False)
+        pipe.exists(POST_REWARDS_COMPLETE_KEY)
+        pipe.hmget(POST_REWARDS_HASH, ids)
+        complete, values = pipe.execute()
+        if complete:
+            return {pid: int(value) for pid, value in zip(ids, values) if value is not None}
+    except Exception:
+        logger.warning("Post reward totals unavailable in Redis; using Postgres", exc_info=True)
+    try:
+        return _reward_totals_from_db(ids)
+    except Exception:
+        logger.exception("Failed to load post reward totals")
+        return {}
+
+
+def repair_post_reward_totals():
+    """Rebuild `post:rewards` from Postgres and swap it in atomically. Returns posts written.
+
+    Rewards applied between the aggregate and the swap are lost from the hash until
+    the next repair; run it at a quiet time.
+    """
+    from .models import RewardPointTransaction
+    rows = (
+        RewardPointTransaction.objects
+        .values('firestore_post_id')
+        .annotate(total=Sum('points'))
+        .filter(total__gt=0)
+        .order_by()
+    )
+    r = get_redis('broker')
+    tmp = f"{POST_REWARDS_HASH}:tmp:{uuid.uuid4().hex[:12]}"
+    written = 0
+    chunk = {}
+
+    def flush():
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(tmp, mapping=chunk)
+        pipe.expire(tmp, TMP_KEY_TTL)
+        pipe.execute()
+
+    for row in rows.iterator():
+        chunk[row['firestore_post_id']] = row['total']
+        if len(chunk) >= HSET_CHUNK:
+            flush()
+            written += len(chunk)
+            chunk = {}
+    if chunk:
+        flush()
+        written += len(chunk)
+
+    pipe = r.pipeline(transaction=True)
+    if written:
+        pipe.rename(tmp, POST_REWARDS_HASH)
+        pipe.persist(POST_REWARDS_HASH)
+    else:
+        pipe.delete(POST_REWARDS_HASH)
+    pipe.set(POST_REWARDS_COMPLETE_KEY, '1')
+    pipe.execute()
+    logger.info(f"Rebuilt post reward totals for {written} posts")
+    return written
+
+
+def rewarded_key(user_id):
+    return f"user:rewarded:{user_id}"
+
+
+def _load_rewarded(r, user_id):
+    """Fill the user's rewarded set from Postgres and mark it complete. Returns the post IDs."""
+    from .models import RewardPointTransaction
+    post_ids = set(
+        RewardPointTransaction.objects.filter(giver_id=user_id).values_list('firestore_post_id', flat=True)
+    )
+    key = rewarded_key(user_id)
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.sadd(key, REWARDED_LOADED, *post_ids)
+    pipe.expire(key, REDIS_REWARDED_TTL)
+    pipe.execute()
+    return post_ids
+
+
+def get_rewarded_post_ids(user_id, post_ids):
+    """Return the subset of `post_ids` that `user_id` has rewarded.
+
+    One SMISMEMBER against `user:rewarded:<user_id>`; a cold user costs one query to
+    load the whole set. Falls back to a single Postgres query if Redis is unavailable.
+    """
+    ids = [str(pid) for pid in post_ids if pid]
+    if not ids:
+        return set()
+    try:
+        r = get_redis('cache')
+        flags = r.smismember(rewarded_key(user_id), [REWARDED_LOADED, *ids])
+        if flags[0]:
+            return {pid for pid, flag in zip(ids, flags[1:]) if flag}
+        return _load_rewarded(r, user_id) & set(ids)
+    except Exception:
+        logger.warning(f"Rewarded set unavailable for user {user_id}; using Postgres", exc_info=True)
+    try:
+        from .models import RewardPointTransaction
+        return set(
+            RewardPointTransaction.objects.filter(
+                giver_id=user_id, firestore_post_id__in=ids
+            ).values_list('firestore_post_id', flat=True)
+        )
+    except Exception:
+        logger.exception(f"Failed to load rewarded posts for user {user_id}")
+        return set()
+
+
+def mark_rewarded(user_id, post_id, rewarded=True):
+    """Add or remove a post in the user's rewarded set (best-effort).
+
+    Writing to a cold key is harmless: without `__loaded__` the set is reloaded on read.
+    """
+    try:
+        r = get_redis('cache')
+        key = rewarded_key(user_id)
+        if rewarded:
+            r.sadd(key, str(post_id))
+        else:
+            r.srem(key, str(post_id))
+    except Exception:
+        logger.warning(f"Failed to update rewarded set for user {user_id}", exc_info=True)
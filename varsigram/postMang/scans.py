@@ -0,0 +1,151 @@
+"""
+Resumable streaming scans over a Firestore collection for maintenance jobs.
+
+A scan pages through the collection ordered by document ID, optionally
+projecting only the fields the job needs. Each page is handed to a handler
+together with a Firestore `BulkWriter`; the writer is flushed and the last
+document ID checkpointed in Redis after every page, so a failed run resumes
+where it stopped instead of starting from zero.
+
+The document-ID space can be split into `partitions` prefix ranges that are
+scanned in parallel threads. Checkpoints are kept per partition under
+`scan:<name>:<partitions>:<index>`. A finished partition is marked done, so a
+rerun after a failure skips it; once every partition has finished the checkpoints
+are deleted and the next run starts from the beginning.
+
+Example:
+
+    def handler(docs, writer):
+        for doc in docs:
+            writer.update(doc.reference, {...})
+        return len(docs)  # number of writes, reported in the stats
+
+    run_scan('patch-something', handler, fields=['trending_score'], partitions=4)
+"""
+import logging
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from postMang.apps import get_firestore_db
+from varsigram.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Firestore auto-IDs are drawn from this alphabet; listed in byte order.
+DOC_ID_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+DONE = '__done__'
+CHECKPOINT_TTL = 60 * 60 * 24 * 7  # 7 days
+
+
+def checkpoint_key(name, partitions, index):
+    return f"scan:{name}:{partitions}:{index}"
+
+
+def partition_bounds(partitions):
+    """Split the document-ID space into `partitions` [lo, hi) prefix ranges.
+
+    The first range is open below and the last is open above, so IDs outside the
+    auto-ID alphabet are still covered.
+    """
+    partitions = max(1, min(int(partitions), len(DOC_ID_ALPHABET)))
+    cuts = [DOC_ID_ALPHABET[len(DOC_ID_ALPHABET) * i // partitions] for i in range(1, partitions)]
+    lows = [None] + cuts
+    highs = cuts + [None]
+    return list(zip(lows, highs))
+
+
+def reset_scan(name, partitions):
+    """Forget all checkpoints for a scan so the next run starts from the beginning."""
+    r = get_redis('broker')
+    r.delete(*[checkpoint_key(name, partitions, i) for i in range(partitions)])
+
+
+def _scan_partition(name, handler, collection, fields, page_size, partitions, index, lo, hi):
+    db = get_firestore_db()
+    r = get_redis('broker')
+    coll = db.collection(collection)
+    key = checkpoint_key(name, partitions, index)
+
+    last_id = r.get(key)
+    if isinstance(last_id, bytes):
+        last_id = last_id.decode()
+    if last_id == DONE:
+        logger.info(f"Scan {name} partition {index}/{partitions} already complete; skipping")
+        return {'docs': 0, 'writes': 0}
+
+    query = coll.order_by(FieldPath.document_id())
+    if lo:
+        query = query.where(FieldPath.document_id(), '>=', coll.document(lo))
+    if hi:
+        query = query.where(FieldPath.document_id(), '<', coll.document(hi))
+    if fields is not None:
+        query = query.select(list(fields) or [FieldPath.document_id()])
+
+    writer = db.bulk_writer()
+    docs_seen = 0
+    writes = 0
+    started = time.monotonic()
+    try:
+        while True:
+            page_query = query.limit(page_size)
+            if last_id:
+                page_query = page_query.start_after({FieldPath.document_id(): coll.document(last_id)})
+            docs = list(page_query.stream())
+            if not docs:
+                break
+
+            writes += handler(docs, writer) or 0
+            writer.flush()
+
+            docs_seen += len(docs)
+            last_id = docs[-1].id
+            r.set(key, last_id, ex=CHECKPOINT_TTL)
+
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Scan {name} partition {index}/{partitions}: {docs_seen} docs, {writes} writes, "
+                f"{docs_seen / elapsed if elapsed else 0:.0f} docs/s (at {last_id})"
+            )
+            if len(docs) < page_size:
+                break
+    finally:
+        writer.close()
+
+    r.set(key, DONE, ex=CHECKPOINT_TTL)
+    return {'docs': docs_seen, 'writes': writes}
+
+
+def run_scan(name, handler, collection='posts', fields=None, page_size=500, partitions=1, restart=False):
+    """Run (or resume) a scan of `collection` and return throughput stats.
+
+    `handler(docs, writer)` receives each page of snapshots and the partition's
+    BulkWriter, and returns the number of writes it scheduled. `fields` limits the
+    snapshot data to those field paths (`[]` returns IDs only); None reads full documents.
+    """
+    bounds = partition_bounds(partitions)
+    partitions = len(bounds)
+    if restart:
+        reset_scan(name, partitions)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=partitions) as pool:
+        futures = [
+            pool.submit(_scan_partition, name, handler, collection, fields, page_size, partitions, i, lo, hi)
+            for i, (lo, hi) in enumerate(bounds)
+        ]
+        results = [f.result() for f in futures]
+    # Every partition finished: drop the checkpoints so the next run is a full scan
+    reset_scan(name, partitions)
+
+    elapsed = time.monotonic() - started
+    stats = {
+        'docs': sum(res['docs'] for res in results),
+        'writes': sum(res['writes'] for res in results),
+        'seconds': round(elapsed, 2),
+    }
+    stats['docs_per_second'] = round(stats['docs'] / elapsed, 1) if elapsed else 0.0
+    logger.info(f"Scan {name} finished: {stats}")
+    return stats
@@ -2,16 +2,14 @@ from datetime import datetime, timezone
 from users.serializer import UserSerializer, OrganizationProfileSerializer, StudentProfileSerializer
 from .models import Follow, RewardPointTransaction
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
 from users.models import Student, Organization
 from rest_framework import serializers
 import logging
-import redis
-import os
-from .leaderboard_utils import period_keys
 from .utils import get_post_author_id_from_firestore
+from .signals import emit_reward_upsert
+from .reward_cache import get_rewarded_post_ids
 from django.contrib.contenttypes.models import ContentType
-from notifications_app.utils import send_push_notification
+from notifications_app.dispatch import notify
 
 
 User = get_user_model()
@@ -195,7 +193,7 @@ class FirestorePostOutputSerializer(serializers.Serializer):
     
     def get_has_rewarded(self, post_data):
         """
-        Checks the Postgres database to see if the requesting user has rewarded this post.
+        Checks whether the requesting user has rewarded this post.
         """
         request = self.context.get('request')
         
@@ -212,11 +210,8 @@ class FirestorePostOutputSerializer(serializers.Serializer):
         if not firestore_id:
             return False
 
-        # 3. Fallback: perform a lookup in the local Postgres DB
-        return RewardPointTransaction.objects.filter(
-            giver=request.user,
-            firestore_post_id=firestore_id
-        ).exists()
+        # 3. Fallback: the user's rewarded-post set in Redis (no per-post query)
+        return str(firestore_id) in get_rewarded_post_ids(request.user.id, [firestore_id])
 
 
 
@@ -338,12 +333,12 @@ class GenericFollowSerializer(serializers.ModelSerializer):
                 follower_name = self.context['request'].user.email
                 follower_display_name_slug = None
 
-            send_push_notification(
-                user=followee_user, # The user who is being followed
+            notify(
+                followee_user.id, # The user who is being followed
+                "follow",
                 title="You have a new follower!",
                 body=f"{follower_name} just followed you.",
                 data={
-                    "type": "follow",
                     "follower_id": follower_user_id,
                     "follower_name": follower_name,
                     "follower_display_name_slug": follower_display_name_slug,
@@ -355,16 +350,6 @@ class GenericFollowSerializer(serializers.ModelSerializer):
 
 logger = logging.getLogger(__name__)
 
-# Get Redis connection
-_r = None
-def _get_redis():
-    global _r
-    if _r is None:
-        redis_url = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
-        _r = redis.Redis.from_url(redis_url)
-    return _r
-
-
 class RewardPointSerializer(serializers.ModelSerializer):
     """
     Serializer for creating a new RewardPointTransaction, integrating Firestore lookup.
@@ -415,169 +400,41 @@ class RewardPointSerializer(serializers.ModelSerializer):
             
         return data
     
-    def _update_redis_leaderboards(self, post_author_id, points, created_at):
-        """
-        Update all Redis leaderboards (daily, weekly, monthly, all-time) 
-        with the new points.
-        
-        Args:
-            post_author_id: The user ID who is receiving the points
-            points: The number of points to add
-            created_at: The datetime when the transaction was created
-        """
-        try:
-            r = _get_redis()
-            post_author_id_str = str(post_author_id)
-            
-            # Get all the leaderboard keys for this date
-            keys = period_keys('points', created_at.date())
-            
-            # Use a pipeline for atomic updates
-            pipe = r.pipeline()
-            
-            # Increment scores in all leaderboards
-            for key in keys:
-                pipe.zincrby(key, float(points), post_author_id_str)
-            
-            # Set expiry for time-based keys (not all-time)
-            # keys[0] = all-time (no expiry)
-            # keys[1] = daily
-            # keys[2] = weekly  
-            # keys[3] = monthly
-            pipe.expire(keys[1], 60 * 60 * 24 * 180)  # daily - 180 days
-            pipe.expire(keys[2], 60 * 60 * 24 * 180)  # weekly - 180 days
-            pipe.expire(keys[3], 60 * 60 * 24 * 180)  # monthly - 180 days
-            
-            pipe.execute()
-            
-            logger.info(f"Updated Redis leaderboards for user {post_author_id_str} with {points} points")
-            
-        except Exception as e:
-            # Log the error but don't fail the transaction
-            # The data is still in PostgreSQL and can be synced later
-            logger.error(f"Failed to update Redis leaderboards: {str(e)}", exc_info=True)
-
-    def _decrement_redis_leaderboards(self, post_author_id, old_points, created_at):
-        """
-        Decrement the old points from Redis leaderboards when updating.
-        
-        Args:
-            post_author_id: The user ID who received the points
-            old_points: The number of points to remove
-            created_at: The datetime when the transaction was created
-        """
-        try:
-            r = _get_redis()
-            post_author_id_str = str(post_author_id)
-            
-            # Get all the leaderboard keys for this date
-            keys = period_keys('points', created_at.date())
-            
-            # Use a pipeline for atomic updates
-            pipe = r.pipeline()
-            
-            # Decrement scores in all leaderboards
-            for key in keys:
-                pipe.zincrby(key, float(-old_points), post_author_id_str)
-            
-            pipe.execute()
-            
-            logger.info(f"Decremented {old_points} points from user {post_author_id_str} in Redis leaderboards")
-            
-        except Exception as e:
-            logger.error(f"Failed to decrement Redis leaderboards: {str(e)}", exc_info=True)
-
-
     def create(self, validated_data):
         # Set the giver from the request context
         validated_data['giver'] = self.context['request'].user
         giver_name = validated_data['giver'].student.name if hasattr(validated_data['giver'], 'student') else validated_data['giver'].organization.organization_name if hasattr(validated_data['giver'], 'organization') else validated_data['giver'].email
         
-        # Define the unique fields used for the lookup
-        unique_fields = {
-            'giver': validated_data['giver'],
-            'firestore_post_id': validated_data['firestore_post_id']
-        }
-        
-        try:
-            # Attempt to create a new transaction (INSERT)
-            instance = RewardPointTransaction.objects.create(**validated_data)
-
-            # ✨ NEW: Update Redis leaderboards
-            self._update_redis_leaderboards(
-                post_author_id=validated_data['post_author'].id,
-                points=validated_data['points'],
-                created_at=instance.created_at
-            )
-
-            # Don't Notify if the giver is rewarding their own post
-            if validated_data['post_author'] == validated_data['giver']:
-                return instance
+        # Single-statement UPSERT; leaderboards get the points delta from the returned previous points
+        instance, previous_points = RewardPointTransaction.upsert(
+            giver=validated_data['giver'],
+            post_author=validated_data['post_author'],
+            firestore_post_id=validated_data['firestore_post_id'],
+            points=validated_data['points'],
+        )
+        emit_reward_upsert(instance, previous_points)
 
-            send_push_notification(
-                user=validated_data['post_author'], # The author of the post receiving points
-                title="Your post received reward points!",
-                body=f"{giver_name} rewarded your post with {validated_data['points']} points.",
-                data={
-                    "type": "reward_point",
-                    "giver_id": validated_data['giver'].id,
-                    "giver_email": validated_data['giver'].email,
-                    "giver_name": giver_name,
-                    "giver_profile_pic_url": validated_data['giver'].profile_pic_url,
-                    "points": str(validated_data['points']),
-                    "post_id": validated_data['firestore_post_id'],
-                }
-            )
+        # Only notify on a new reward, and not if the giver is rewarding their own post
+        if previous_points is not None or validated_data['post_author'] == validated_data['giver']:
             return instance
-            
-        except IntegrityError:
-            # If IntegrityError (due to UniqueConstraint) is raised, UPDATE the existing record instead (UPSERT)
-            try:
-                instance = RewardPointTransaction.objects.get(**unique_fields)
-                
-                # Store old points before update
-                old_points = instance.points
-                
-                # ✨ NEW: If points changed, update Redis
-                if old_points != validated_data['points']:
-                    # Remove old points
-                    self._decrement_redis_leaderboards(
-                        post_author_id=instance.post_author.id,
-                        old_points=old_points,
-                        created_at=instance.created_at
-                    )
-                    
-                    # Add new points
-                    self._update_redis_leaderboards(
-                        post_author_id=instance.post_author.id,
-                        points=validated_data['points'],
-                        created_at=instance.created_at
-                    )
-                
-                # Perform the update
-                instance.points = validated_data['points']
-                # The post_author, giver, and firestore_post_id fields should not change, but setting the point value is the goal.
-                instance.save()
-
-                # send_push_notification(
-                #     user=validated_data['post_author'], # The author of the post receiving points
-                #     title="Your post reward points were updated!",
-                #     body=f"{giver_name} updated the reward points on your post to {validated_data['points']} points.",
-                #     data={
-                #         "type": "reward_point_update",
-                #         "giver_id": validated_data['giver'].id,
-                #         "giver_email": validated_data['giver'].email,
-                #         "giver_name": giver_name,
-                #         "points": str(validated_data['points']),
-                #         "firestore_post_id": validated_data['firestore_post_id'],
-                #     }
-                # )
-                
-                return instance
-            
-            except RewardPointTransaction.DoesNotExist:
-                # Should not happen if IntegrityError was raised, but good practice
-                raise serializers.ValidationError({"detail": "Failed to update existing reward record."})
+
+        notify(
+            validated_data['post_author'].id, # The author of the post receiving points
+            "reward_point",
+            title="Your post received reward points!",
+            body=f"{giver_name} rewarded your post with {validated_data['points']} points.",
+            data={
+                "giver_id": validated_data['giver'].id,
+                "giver_email": validated_data['giver'].email,
+                "giver_name": giver_name,
+                "giver_profile_pic_url": validated_data['giver'].profile_pic_url,
+                "points": str(validated_data['points']),
+                "post_id": validated_data['firestore_post_id'],
+            },
+            actor_id=validated_data['giver'].id,
+            actor_name=giver_name,
+        )
+        return instance
 
 
 class PrivatePointsProfileSerializer(serializers.ModelSerializer):
@@ -1,50 +1,109 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-import redis
-from .models import RewardPointTransaction
+from varsigram.redis_client import get_redis
+from .models import RewardDailyRollup, RewardPointTransaction
 from .leaderboard_utils import period_keys
-from datetime import datetime
-import os
+from .leaderboard_snapshots import note_score_changes
+from .leaderboard_ingest import DELETED_VERSION, submit_reward_event
+from .reward_cache import mark_rewarded
+from datetime import datetime, timezone
+import logging
 
-# Create Redis client lazily
-_redis = None
+logger = logging.getLogger(__name__)
 
-def get_redis_client():
-    global _redis
-    if _redis is None:
-        redis_url = os.environ.get('CELERY_BROKER_URL', None)
-        if not redis_url:
-            # Fall back to local redis
-            redis_url = 'redis://localhost:6379/0'
-        _redis = redis.Redis.from_url(redis_url)
-    return _redis
+def _created_date(instance):
+    created_at = instance.created_at or datetime.now(timezone.utc)
+    return created_at.astimezone(timezone.utc).date()
 
 
 @receiver(post_save, sender=RewardPointTransaction)
-def on_rewardpoint_created(sender, instance, created, **kwargs):
-    """When a RewardPointTransaction is created, increment Redis leaderboard scores.
+def on_rewardpoint_saved(sender, instance, created, **kwargs):
+    """Turn a reward create or points edit into a rollup update and one leaderboard event.
 
-    Uses `post_author` as the beneficiary of points.
+    Uses `post_author` as the beneficiary of points. The daily rollup is updated in the
+    same DB transaction; the event is submitted after it commits, so rolled-back saves
+    never reach Redis.
     """
-    if not created:
+    if created:
+        delta = instance.points
+    else:
+        loaded_points = getattr(instance, '_loaded_points', None)
+        if loaded_points is None or loaded_points == instance.points:
+            return
+        delta = instance.points - loaded_points
+    instance._loaded_points = instance.points
+
+    created_date = _created_date(instance)
+    RewardDailyRollup.apply(instance.post_author_id, created_date, delta, 1 if created else 0)
+    event = (instance.pk, instance.version, instance.post_author_id, delta, created_date, instance.firestore_post_id)
+    transaction.on_commit(lambda: submit_reward_event(*event))
+    if created:
+        giver_id, post_id = instance.giver_id, instance.firestore_post_id
+        transaction.on_commit(lambda: mark_rewarded(giver_id, post_id))
+
+
+@receiver(post_delete, sender=RewardPointTransaction)
+def on_rewardpoint_deleted(sender, instance, **kwargs):
+    """Remove a deleted reward's points from the rollup and the leaderboards."""
+    created_date = _created_date(instance)
+    # UPDATE rather than upsert: if the author is being deleted, their rollup rows may already be gone
+    RewardDailyRollup.objects.filter(user_id=instance.post_author_id, day=created_date).update(
+        points=F('points') - instance.points, tx_count=F('tx_count') - 1,
+    )
+    event = (instance.pk, DELETED_VERSION, instance.post_author_id, -instance.points, created_date, instance.firestore_post_id)
+    transaction.on_commit(lambda: submit_reward_event(*event))
+    giver_id, post_id = instance.giver_id, instance.firestore_post_id
+    transaction.on_commit(lambda: mark_rewarded(giver_id, post_id, rewarded=False))
+
+
+def emit_reward_upsert(instance, previous_points):
+    """Update the rollup and submit the leaderboard event for a `RewardPointTransaction.upsert` (which skips post_save)."""
+    delta = instance.points - (previous_points or 0)
+    if not delta:
         return
+    created_date = _created_date(instance)
+    RewardDailyRollup.apply(instance.post_author_id, created_date, delta, 1 if previous_points is None else 0)
+    event = (instance.pk, instance.version, instance.post_author_id, delta, created_date, instance.firestore_post_id)
+    transaction.on_commit(lambda: submit_reward_event(*event))
+    if previous_points is None:
+        giver_id, post_id = instance.giver_id, instance.firestore_post_id
+        transaction.on_commit(lambda: mark_rewarded(giver_id, post_id))
+
 
+def adjust_post_count(author_id, delta, dt=None):
+    """Move an author's score on the `leaderboard:posts:*` keys by `delta` (+1 on create, -1 on delete).
+
+    `dt` is the date the post was created; defaults to today (UTC). Decrements only touch
+    period keys that still hold the author, so an expired daily/weekly key is not
+    resurrected with a negative score.
+    """
+    if not author_id:
+        return
+    user_id = str(author_id)
+    keys = period_keys('posts', dt)
     try:
-        user_id = str(instance.post_author_id)
-        points = float(getattr(instance, 'points', 1))
+        r = get_redis('broker')
+        if delta < 0:
+            pipe = r.pipeline()
+            for key in keys:
+                pipe.zscore(key, user_id)
+            keys = [key for key, score in zip(keys, pipe.execute()) if score is not None]
+            if not keys:
+                return
+        pipe = r.pipeline()
+        for key in keys:
+            pipe.zincrby(key, delta, user_id)
+        for key in keys:
+            if delta < 0:
+                pipe.zremrangebyscore(key, '-inf', 0)
+        if delta > 0:
+            pipe.expire(keys[1], 60 * 60 * 24 * 180)
+            pipe.expire(keys[2], 60 * 60 * 24 * 180)
+            pipe.expire(keys[3], 60 * 60 * 24 * 365)
+        new_scores = pipe.execute()[:len(keys)]
+        note_score_changes([(key, score, delta) for key, score in zip(keys, new_scores)])
     except Exception:
-        return
-
-    r = get_redis_client()
-    keys = period_keys('points')
-    pipe = r.pipeline()
-    for key in keys:
-        pipe.zincrby(key, points, user_id)
-        # Optionally trim to keep only top N members (uncomment if desired)
-        # pipe.zremrangebyrank(key, 0, -100001)  # keep top 100k
-    # set TTL for period keys (daily/weekly/monthly) - keep 180 days
-    pipe.expire(keys[1], 60 * 60 * 24 * 180)
-    pipe.expire(keys[2], 60 * 60 * 24 * 180)
-    pipe.expire(keys[3], 60 * 60 * 24 * 365)
-    pipe.execute()
+        logger.exception(f"Failed to update posts leaderboard for author {user_id}")
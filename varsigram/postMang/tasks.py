@@ -1,23 +1,21 @@
 from celery import shared_task
-from django.db.models import Sum
 from django.conf import settings
-import redis
-from .models import RewardPointTransaction
-from .leaderboard_utils import key_daily, key_weekly, key_monthly, key_alltime
-from datetime import datetime, timedelta, timezone as dt_timezone
-import os
+from varsigram.redis_client import get_redis
+from .leaderboard_utils import key_weekly, key_monthly, key_alltime
+from . import leaderboard_recompute
+from datetime import datetime, timezone as dt_timezone
 import logging
 from postMang.apps import get_firestore_db
+from notifications_app.realtime import push_to_users
 
 logger = logging.getLogger(__name__)
 
-_r = None
-def _get_redis():
-    global _r
-    if _r is None:
-        redis_url = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
-        _r = redis.Redis.from_url(redis_url)
-    return _r
+def push_new_post_signal(user_ids, post_id, score, author_user_id=None):
+    """Tell connected followers a post landed in their feed (websocket `feed_new_posts`)."""
+    recipients = {int(uid) for uid in user_ids if str(uid).isdigit()}
+    if author_user_id is not None and str(author_user_id).isdigit():
+        recipients.discard(int(author_user_id))
+    push_to_users(recipients, 'feed_new_posts', {'post_id': str(post_id), 'score': score})
 
 
 @shared_task(bind=True)
@@ -27,7 +25,7 @@ def fanout_post_to_followers(self, author_user_id: int, post_id: str, score_ts:
     This task is safe to retry and will not raise on errors (logs instead).
     """
     try:
-        r = _get_redis()
+        r = get_redis('feeds')
     except Exception:
         logger.exception('Failed to get redis client for fanout')
         return
@@ -92,6 +90,7 @@ def fanout_post_to_followers(self, author_user_id: int, post_id: str, score_ts:
                     pipe.zadd(key, {str(post_id): score})
                     pipe.zremrangebyrank(key, 0, -MAX_FEED_ITEMS-1)
                 pipe.execute()
+                push_new_post_signal(all_uids, post_id, score, author_user_id)
             else:
                 # Dispatch chunked subtasks to handle fanout in parallel
                 chunks = [all_uids[i:i+CHUNK_SIZE] for i in range(0, len(all_uids), CHUNK_SIZE)]
@@ -118,7 +117,7 @@ def fanout_post_to_followers(self, author_user_id: int, post_id: str, score_ts:
 def fanout_post_chunk(self, follower_user_ids, post_id: str, score_ts: float = None):
     """Subtask to write a post id into a chunk of follower feeds."""
     try:
-        r = _get_redis()
+        r = get_redis('feeds')
     except Exception:
         logger.exception('Failed to get redis client for fanout chunk')
         return
@@ -135,6 +134,7 @@ def fanout_post_chunk(self, follower_user_ids, post_id: str, score_ts: float = N
             pipe.zadd(key, {str(post_id): score})
             pipe.zremrangebyrank(key, 0, -MAX_FEED_ITEMS-1)
         pipe.execute()
+        push_new_post_signal(follower_user_ids, post_id, score)
         try:
             r.incr('metrics:fanout:chunks')
         except Exception:
@@ -143,46 +143,26 @@ def fanout_post_chunk(self, follower_user_ids, post_id: str, score_ts: float = N
         logger.exception('fanout_post_chunk failed')
 
 
-@shared_task(bind=True)
-def recompute_points_daily(self, date_iso: str):
-    """Recompute the daily leaderboard for a specific date (YYYY-MM-DD)."""
+def _parse_date_iso(date_iso):
     try:
-        target = datetime.fromisoformat(date_iso).date()
-    except Exception as e:
+        if date_iso:
+            return datetime.fromisoformat(date_iso).date()
+        return datetime.now(dt_timezone.utc).date()
+    except Exception:
         raise ValueError(f"Invalid date_iso: {date_iso}")
 
-    qs = RewardPointTransaction.objects.filter(
-        created_at__date=target
-    ).values('post_author').annotate(score=Sum('points'))
-    
-    r = _get_redis()
-    key = key_daily('points', target)
-    pipe = r.pipeline()
-    pipe.delete(key)
-    if qs:
-        mapping = {str(item['post_author']): float(item['score']) for item in qs}
-        pipe.zadd(key, mapping)
-    # Keep for 180 days
-    pipe.expire(key, 60 * 60 * 24 * 180)
-    pipe.execute()
-    
-    logger.info(f"Recomputed daily leaderboard for {target}: {len(qs)} users")
+
+@shared_task(bind=True)
+def recompute_points_daily(self, date_iso: str = None):
+    """Recompute the daily leaderboard for a specific date (YYYY-MM-DD)."""
+    target = _parse_date_iso(date_iso)
+    leaderboard_recompute.recompute_points_range(target, target, periods=('daily',))
 
 
 @shared_task
 def recompute_points_alltime():
     """Recompute the all-time leaderboard."""
-    qs = RewardPointTransaction.objects.values('post_author').annotate(score=Sum('points'))
-    r = _get_redis()
-    key = key_alltime('points')
-    pipe = r.pipeline()
-    pipe.delete(key)
-    if qs:
-        mapping = {str(item['post_author']): float(item['score']) for item in qs}
-        pipe.zadd(key, mapping)
-    pipe.execute()
-    
-    logger.info(f"Recomputed all-time leaderboard: {len(qs)} users")
+    leaderboard_recompute.recompute_points_alltime()
 
 
 @shared_task(bind=True)
@@ -193,121 +173,103 @@ def recompute_points_weekly(self, date_iso: str = None):
     
     Example: date_iso='2025-11-11' will recompute leaderboard for the ISO week containing 2025-11-11.
     """
-    try:
-        if date_iso:
-            target = datetime.fromisoformat(date_iso).date()
-        else:
-            # Use current date if none provided
-            target = datetime.now(dt_timezone.utc).date()
-    except Exception as e:
-        raise ValueError(f"Invalid date_iso: {date_iso}")
-
-    # Determine ISO week start (Monday) and end (Sunday)
-    iso_year, iso_week, _ = target.isocalendar()
-    
-    # Python 3.8+ supports fromisocalendar
-    try:
-        week_start = datetime.fromisocalendar(iso_year, iso_week, 1).date()
-    except Exception:
-        # Fallback: compute approximate start
-        week_start = target - timedelta(days=target.weekday())
-
-    week_end = week_start + timedelta(days=6)
-
-    # Query transactions for this week
-    qs = RewardPointTransaction.objects.filter(
-        created_at__date__gte=week_start,
-        created_at__date__lte=week_end,
-    ).values('post_author').annotate(score=Sum('points'))
-
-    r = _get_redis()
-    key = key_weekly('points', week_start)
-    pipe = r.pipeline()
-    pipe.delete(key)  # Clear the old week's data
-    if qs:
-        mapping = {str(item['post_author']): float(item['score']) for item in qs}
-        pipe.zadd(key, mapping)
-    # Keep weekly snapshots for 180 days
-    pipe.expire(key, 60 * 60 * 24 * 180)
-    pipe.execute()
-    
-    logger.info(f"Recomputed weekly leaderboard for week {iso_year}-W{iso_week:02d} ({week_start} to {week_end}): {len(qs)} users")
+    target = _parse_date_iso(date_iso)
+    leaderboard_recompute.recompute_points_range(target, target, periods=('weekly',))
 
 
 @shared_task(bind=True)
 def recompute_points_monthly(self, date_iso: str = None):
     """Recompute the monthly leaderboard for the month containing date_iso."""
-    try:
-        if date_iso:
-            target = datetime.fromisoformat(date_iso).date()
-        else:
-            target = datetime.now(dt_timezone.utc).date()
-    except Exception as e:
-        raise ValueError(f"Invalid date_iso: {date_iso}")
+    target = _parse_date_iso(date_iso)
+    leaderboard_recompute.recompute_points_range(target, target, periods=('monthly',))
 
-    # Get first and last day of the month
-    month_start = target.replace(day=1)
-    if target.month == 12:
-        month_end = target.replace(year=target.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        month_end = target.replace(month=target.month + 1, day=1) - timedelta(days=1)
-
-    qs = RewardPointTransaction.objects.filter(
-        created_at__date__gte=month_start,
-        created_at__date__lte=month_end,
-    ).values('post_author').annotate(score=Sum('points'))
-
-    r = _get_redis()
-    key = key_monthly('points', target)
-    pipe = r.pipeline()
-    pipe.delete(key)
-    if qs:
-        mapping = {str(item['post_author']): float(item['score']) for item in qs}
-        pipe.zadd(key, mapping)
-    pipe.expire(key, 60 * 60 * 24 * 180)
-    pipe.execute()
-    
-    logger.info(f"Recomputed monthly leaderboard for {target.year}-{target.month:02d}: {len(qs)} users")
+
+@shared_task(bind=True)
+def recompute_points_range(self, from_iso: str, to_iso: str, periods=None):
+    """Recompute every daily/weekly/monthly leaderboard touching [from_iso, to_iso] in one SQL pass."""
+    leaderboard_recompute.recompute_points_range(
+        _parse_date_iso(from_iso),
+        _parse_date_iso(to_iso),
+        periods=tuple(periods or leaderboard_recompute.ALL_PERIODS),
+    )
+
+
+def _candidate_post_authors(r):
+    """Authors to count: members of the all-time posts board plus every author in the `post:author` map."""
+    from .post_cache import DELETED_POST, POST_AUTHOR_HASH
+    authors = {m.decode() if isinstance(m, bytes) else str(m) for m in r.zrange(key_alltime('posts'), 0, -1)}
+    for _, author_id in get_redis('cache').hscan_iter(POST_AUTHOR_HASH, count=1000):
+        author_id = author_id.decode() if isinstance(author_id, bytes) else str(author_id)
+        if author_id != DELETED_POST:
+            authors.add(author_id)
+    return authors
 
 
 @shared_task
 def recompute_posts_alltime(populate_redis: bool = True):
-    """Recompute the all-time leaderboard for post counts from Firestore.
-
-    If `populate_redis` is True, writes the sorted set to Redis key `leaderboard:posts:alltime`.
+    """Rebuild the all-time post-count leaderboard from Firestore.
+
+    Day to day the key is maintained incrementally on post create/delete; this is the
+    backfill. Counts come from one Firestore count aggregation per candidate author
+    (see `_candidate_post_authors`) rather than streaming post documents. If
+    `populate_redis` is True, the result is built in a temp key and RENAMEd over
+    `leaderboard:posts:alltime`; posts created or deleted while it runs are picked up
+    by the next rebuild.
     """
     try:
         db = get_firestore_db()
-    except Exception as e:
-        logger.exception('Failed to get Firestore client')
+        r = get_redis('broker')
+        candidates = _candidate_post_authors(r)
+    except Exception:
+        logger.exception('Failed to load candidate post authors')
         return
 
     counts = {}
     try:
         posts_ref = db.collection('posts')
-        for doc in posts_ref.stream():
-            data = doc.to_dict()
-            author_id = data.get('author_id')
-            if not author_id:
-                continue
-            counts[str(author_id)] = counts.get(str(author_id), 0) + 1
+        for user_id in candidates:
+            result = posts_ref.where('author_id', '==', user_id).count(alias='posts').get()
+            cnt = int(result[0][0].value) if result and result[0] else 0
+            if cnt:
+                counts[user_id] = cnt
     except Exception:
-        logger.exception('Failed scanning Firestore posts for post counts')
+        logger.exception('Failed counting Firestore posts per author')
         return
 
     # Optionally populate Redis
     if populate_redis:
         try:
-            r = _get_redis()
-            key = 'leaderboard:posts:alltime'
-            pipe = r.pipeline()
-            pipe.delete(key)
-            if counts:
-                # zadd expects mapping of member:score
-                mapping = {uid: int(cnt) for uid, cnt in counts.items()}
-                pipe.zadd(key, mapping)
-            pipe.execute()
+            leaderboard_recompute._swap_in(r, {key_alltime('posts'): counts}, {})
         except Exception:
             logger.exception('Failed to write posts leaderboard to Redis')
 
-    logger.info(f"Recomputed posts all-time leaderboard: {len(counts)} authors")
\ No newline at end of file
+    logger.info(f"Recomputed posts all-time leaderboard: {len(counts)} of {len(candidates)} candidate authors")
+
+
+@shared_task
+def refresh_leaderboard_snapshot(board_key: str):
+    """Rebuild the pre-hydrated snapshot for one leaderboard key."""
+    from .leaderboard_snapshots import build_snapshot
+    try:
+        snapshot = build_snapshot(board_key)
+        logger.info(f"Refreshed leaderboard snapshot {board_key}: {len(snapshot['results'])} rows")
+    except Exception:
+        logger.exception(f"Failed to refresh leaderboard snapshot {board_key}")
+
+
+@shared_task
+def refresh_leaderboard_snapshots():
+    """Periodic rebuild of the snapshots served by the leaderboard endpoints (current periods)."""
+    for board_key in (key_alltime('points'), key_weekly('points'), key_monthly('points'), key_alltime('posts')):
+        refresh_leaderboard_snapshot(board_key)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def apply_leaderboard_event(self, tx_id, version, post_author_id, delta, created_date_iso, post_id=None):
+    """Retry path for leaderboard events that could not be applied inline (Redis unavailable)."""
+    from .leaderboard_ingest import apply_reward_event
+    try:
+        apply_reward_event(tx_id, version, post_author_id, delta, datetime.fromisoformat(created_date_iso).date(), post_id)
+    except Exception as exc:
+        logger.warning(f"Retrying leaderboard event {tx_id}:{version}: {exc}")
+        raise self.retry(exc=exc)
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from unittest.mock import patch
+
+
+User = get_user_model()
+
+
+class FeedNewPostsViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@example.com', password='pass')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    @patch('postMang.views.get_redis')
+    def test_counts_newer_posts_from_redis_only(self, mock_get_redis):
+        pipe = mock_get_redis.return_value.pipeline.return_value
+        pipe.execute.return_value = [[(b'p3', 300.0)], 2, [b'p3', b'p2']]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts_api:feed-new-posts'), {'since': '100.0:p1', 'ids': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'count': 2, 'top_score': 300.0, 'post_ids': ['p3', 'p2']})
+        pipe.zcount.assert_called_once_with(f'feed:{self.user.id}', '(100.0', '+inf')
+
+    @patch('postMang.views.get_redis')
+    def test_blank_or_non_numeric_since_is_rejected(self, mock_get_redis):
+        for since in ('', 'abc', 'nan:p1'):
+            response = self.client.get(reverse('posts_api:feed-new-posts'), {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+        mock_get_redis.assert_not_called()
+
+
+class PostLikeStateTest(TestCase):
+    @patch('postMang.views.db')
+    @patch('postMang.views.get_redis')
+    def test_unknown_like_is_read_from_firestore_once_and_cached(self, mock_get_redis, mock_db):
+        from postMang.views import has_liked_post
+        pipe = mock_get_redis.return_value.pipeline.return_value
+        pipe.execute.side_effect = [[False, False], [1, True], [True, False]]
+        like_doc = mock_db.collection.return_value.document.return_value.collection.return_value.document
+        like_doc.return_value.get.return_value.exists = True
+
+        self.assertTrue(has_liked_post(7, 'p1'))
+        pipe.sadd.assert_called_once_with('user:likes:7', 'p1')
+
+        # Cached now: no Firestore read
+        self.assertTrue(has_liked_post(7, 'p1'))
+        like_doc.assert_called_once_with('7')
@@ -1,10 +1,10 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from postMang.models import RewardPointTransaction
-from postMang import tasks
+from postMang.models import RewardDailyRollup, RewardPointTransaction
+from postMang import leaderboard_recompute, tasks
 from postMang.leaderboard_utils import key_weekly
-from datetime import datetime, date
-from unittest.mock import MagicMock, patch
+from datetime import datetime, date, timezone
+from unittest.mock import ANY, MagicMock, patch
 
 
 User = get_user_model()
@@ -17,12 +17,14 @@ class LeaderboardTasksTest(TestCase):
         self.giver1 = User.objects.create_user(email='giver1@example.com', password='pass')
         self.giver2 = User.objects.create_user(email='giver2@example.com', password='pass')
 
-    @patch('postMang.tasks._get_redis')
-    def test_recompute_points_weekly_creates_redis_mapping(self, mock_get_redis):
+    @patch('postMang.leaderboard_recompute.get_user_cohorts', return_value={})
+    @patch('postMang.leaderboard_recompute.get_redis')
+    def test_recompute_points_weekly_creates_redis_mapping(self, mock_get_redis, mock_cohorts):
         # Prepare fake redis pipeline
         fake_pipe = MagicMock()
         fake_redis = MagicMock()
         fake_redis.pipeline.return_value = fake_pipe
+        fake_redis.mget.return_value = [None]
         mock_get_redis.return_value = fake_redis
 
         # Create transactions within the ISO week of 2025-11-11 (week starting Monday 2025-11-10)
@@ -35,7 +37,7 @@ class LeaderboardTasksTest(TestCase):
             post_author=self.author,
             points=3,
         )
-        t1.created_at = datetime(2025, 11, 11)
+        t1.created_at = datetime(2025, 11, 11, tzinfo=timezone.utc)
         t1.save(update_fields=['created_at'])
 
         t2 = RewardPointTransaction.objects.create(
@@ -44,27 +46,131 @@ class LeaderboardTasksTest(TestCase):
             post_author=self.author,
             points=2,
         )
-        t2.created_at = datetime(2025, 11, 12)
+        t2.created_at = datetime(2025, 11, 12, tzinfo=timezone.utc)
         t2.save(update_fields=['created_at'])
 
-        # Run the weekly recompute synchronously by calling the wrapped function
-        # (the shared_task decorator wraps the original function)
-        tasks.recompute_points_weekly.__wrapped__(tasks.recompute_points_weekly, '2025-11-11')
+        # Recomputes read the daily rollup, which has to follow the backdated rows
+        leaderboard_recompute.rebuild_daily_rollups()
 
-        # Ensure pipeline.delete was called for the weekly key
+        # Run the weekly recompute synchronously in-process
+        tasks.recompute_points_weekly.run('2025-11-11')
+
+        # The weekly board is built in a temp key and swapped over the live key; never deleted
         expected_key = key_weekly('points', monday)
-        fake_pipe.delete.assert_any_call(expected_key)
-
-        # Ensure zadd was called with mapping that sums points for the author
-        # mapping is passed as a dict to zadd
-        # We expect the pipeline.zadd to be called with the mapping containing the author's id
-        called = False
-        for call in fake_pipe.zadd.call_args_list:
-            args, kwargs = call
-            if args:
-                mapping = args[0]
-                # mapping keys are strings of post_author id
-                if str(self.author.id) in mapping:
-                    self.assertEqual(mapping[str(self.author.id)], float(5.0))
-                    called = True
-        self.assertTrue(called, 'zadd was not called with expected mapping for author')
+        rename_calls = [call.args for call in fake_pipe.rename.call_args_list]
+        self.assertEqual(len(rename_calls), 1)
+        tmp_key, live_key = rename_calls[0]
+        self.assertEqual(live_key, expected_key)
+        self.assertTrue(tmp_key.startswith(f'{expected_key}:tmp:'))
+        self.assertNotIn(expected_key, [call.args[0] for call in fake_pipe.delete.call_args_list])
+
+        # Ensure zadd wrote the summed points for the author into the temp key
+        zadd_calls = [call.args for call in fake_pipe.zadd.call_args_list if call.args[0] == tmp_key]
+        self.assertEqual(len(zadd_calls), 1)
+        self.assertEqual(zadd_calls[0][1], {str(self.author.id): 5.0})
+
+
+class LeaderboardIngestSignalsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', password='pass')
+        self.giver = User.objects.create_user(email='giver@example.com', password='pass')
+
+    @patch('postMang.signals.mark_rewarded')
+    @patch('postMang.signals.submit_reward_event')
+    def test_create_edit_delete_emit_one_versioned_event_each(self, mock_submit, mock_mark_rewarded):
+        with self.captureOnCommitCallbacks(execute=True):
+            tx = RewardPointTransaction.objects.create(
+                giver=self.giver,
+                firestore_post_id='p1',
+                post_author=self.author,
+                points=3,
+            )
+        created_date = mock_submit.call_args_list[0].args[4]
+        mock_submit.assert_called_once_with(tx.pk, 1, self.author.id, 3, created_date, 'p1')
+
+        # Editing points emits only the difference, under a new version
+        tx = RewardPointTransaction.objects.get(pk=tx.pk)
+        tx.points = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            tx.save()
+        mock_submit.assert_called_with(tx.pk, 2, self.author.id, 2, created_date, 'p1')
+
+        # Saving without a points change emits nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            tx.save()
+        self.assertEqual(mock_submit.call_count, 2)
+
+        rollup = RewardDailyRollup.objects.get(user=self.author, day=created_date)
+        self.assertEqual((rollup.points, rollup.tx_count), (5, 1))
+
+        tx_id = tx.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            tx.delete()
+        mock_submit.assert_called_with(tx_id, 'deleted', self.author.id, -5, created_date, 'p1')
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.points, rollup.tx_count), (0, 0))
+
+
+    @patch('postMang.signals.mark_rewarded')
+    @patch('postMang.signals.submit_reward_event')
+    def test_upsert_returns_previous_points_and_emits_delta(self, mock_submit, mock_mark_rewarded):
+        from postMang.signals import emit_reward_upsert
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tx, previous = RewardPointTransaction.upsert(self.giver, self.author, 'p2', 2)
+            emit_reward_upsert(tx, previous)
+        self.assertIsNone(previous)
+        created_date = mock_submit.call_args.args[4]
+        mock_submit.assert_called_once_with(tx.pk, 1, self.author.id, 2, created_date, 'p2')
+
+        # A second tap on the same post updates in place and only emits the difference
+        with self.captureOnCommitCallbacks(execute=True):
+            tx2, previous = RewardPointTransaction.upsert(self.giver, self.author, 'p2', 5)
+            emit_reward_upsert(tx2, previous)
+        self.assertEqual((tx2.pk, previous, tx2.version), (tx.pk, 2, 2))
+        mock_submit.assert_called_with(tx.pk, 2, self.author.id, 3, created_date, 'p2')
+
+        # Same points again: no version bump, no event
+        with self.captureOnCommitCallbacks(execute=True):
+            tx3, previous = RewardPointTransaction.upsert(self.giver, self.author, 'p2', 5)
+            emit_reward_upsert(tx3, previous)
+        self.assertEqual((previous, tx3.version), (5, 2))
+        self.assertEqual(mock_submit.call_count, 2)
+        self.assertEqual(RewardPointTransaction.objects.filter(giver=self.giver, firestore_post_id='p2').count(), 1)
+        # Only the insert adds the post to the giver's rewarded set
+        mock_mark_rewarded.assert_called_once_with(self.giver.id, 'p2')
+
+
+class LeaderboardRangeCoverTest(TestCase):
+    def test_cover_range_prefers_months_then_weeks_then_days(self):
+        from postMang.leaderboard_ranges import cover_range
+
+        # 2025-10-30 (Thu) .. 2025-12-10 (Wed)
+        cover = cover_range(date(2025, 10, 30), date(2025, 12, 10))
+        self.assertEqual(cover, [
+            ('daily', date(2025, 10, 30)),
+            ('daily', date(2025, 10, 31)),
+            ('monthly', date(2025, 11, 1)),
+            ('weekly', date(2025, 12, 1)),
+            ('daily', date(2025, 12, 8)),
+            ('daily', date(2025, 12, 9)),
+            ('daily', date(2025, 12, 10)),
+        ])
+
+    @patch('postMang.leaderboard_ranges._swap_in')
+    def test_backfill_builds_only_missing_boards_and_marks_empty_ones(self, mock_swap_in):
+        from postMang.leaderboard_ranges import _backfill_missing
+        from postMang.leaderboard_utils import key_daily
+
+        author = User.objects.create_user(email='ranged@example.com', password='pass')
+        RewardDailyRollup.objects.create(user=author, day=date(2025, 10, 30), points=7, tx_count=1)
+        r = MagicMock()
+        pipe = r.pipeline.return_value
+        pipe.execute.side_effect = [[0, 0, 1], []]
+
+        cover = [('daily', date(2025, 10, 30)), ('daily', date(2025, 10, 31)), ('daily', date(2025, 11, 1))]
+        self.assertEqual(_backfill_missing(r, cover), 2)
+
+        boards = mock_swap_in.call_args.args[1]
+        self.assertEqual(dict(boards[key_daily('points', date(2025, 10, 30))]), {str(author.id): 7.0})
+        pipe.set.assert_called_once_with(f"{key_daily('points', date(2025, 10, 31))}:empty", '1', ex=ANY)
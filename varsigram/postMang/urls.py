@@ -3,16 +3,19 @@ from .views import (
     CommentDetailFirestoreView, GenericFollowView, GenericUnfollowView, ListFollowersView, ListFollowingView, PostListCreateFirestoreView, PostDetailFirestoreView,
     CommentCreateFirestoreView, CommentListFirestoreView,
     LikeToggleFirestoreView, LikeListFirestoreView,
-    UserPostsFirestoreView, FeedView,
+    UserPostsFirestoreView, FeedView, FeedNewPostsView,
     WhoToFollowView, ExclusiveOrgsRecentPostsView,
     VerifiedOrgBadge, BatchPostViewIncrementAPIView,
-    RewardPointSubmitView, UserPointsDetailView,
+    RewardPointSubmitView, UserPointsDetailView, UserPointsHistoryView,
     QuestionPostView, MilestonePostView, UpdatesPostView,
     RelatablePostView,
     FollowDepartmentView,
     RewardMonthlyLeaderboardView,
     RewardWeeklyLeaderboardView,
     RewardAlltimeLeaderboardView,
+    RewardMyRankView,
+    RewardRangeLeaderboardView,
+    CohortLeaderboardView,
     TopPostersView,
 )
 
@@ -25,6 +28,7 @@ urlpatterns = [
     path('posts/milestones/', MilestonePostView.as_view(), name='milestone-posts'),
     path('reward-points/', RewardPointSubmitView.as_view(), name='reward-points'),
     path('profile/points/<int:pk>/', UserPointsDetailView.as_view(), name='profile-points-public'),
+    path('profile/points/<int:pk>/history/', UserPointsHistoryView.as_view(), name='profile-points-history'),
     path('posts/batch-view/', BatchPostViewIncrementAPIView.as_view(), name='batch-view'),
     path('posts/', PostListCreateFirestoreView.as_view(), name='post-list-create'),
     path('posts/<str:post_id>/', PostDetailFirestoreView.as_view(), name='post-detail'),
@@ -37,6 +41,7 @@ urlpatterns = [
     path('users/<str:user_id>/posts/', UserPostsFirestoreView.as_view(), name='user-posts'),
     # path('posts/search/', PostSearchView.as_view(), name='post-search'),
     path('feed/', FeedView.as_view(), name='feed'),
+    path('feed/new/', FeedNewPostsView.as_view(), name='feed-new-posts'),
     path('official/', ExclusiveOrgsRecentPostsView.as_view(), name='official-orgs-recent-posts'),
     # Followers Route
     path('users/follow/', GenericFollowView.as_view(), name='follow-user'),
@@ -49,6 +54,10 @@ urlpatterns = [
     path('leaderboard/rewards/monthly/', RewardMonthlyLeaderboardView.as_view(), name='reward-monthly-leaderboard'),
     path('leaderboard/rewards/weekly/', RewardWeeklyLeaderboardView.as_view(), name='reward-weekly-leaderboard'),
     path('leaderboard/rewards/alltime/', RewardAlltimeLeaderboardView.as_view(), name='reward-alltime-leaderboard'),
+    path('leaderboard/rewards/me/', RewardMyRankView.as_view(), name='reward-my-rank'),
+    path('leaderboard/rewards/range/', RewardRangeLeaderboardView.as_view(), name='reward-range-leaderboard'),
+    path('leaderboard/rewards/cohort/<str:kind>/', CohortLeaderboardView.as_view(), name='reward-my-cohort-leaderboard'),
+    path('leaderboard/rewards/cohort/<str:kind>/<slug:cohort>/', CohortLeaderboardView.as_view(), name='reward-cohort-leaderboard'),
     # Top Posters
     path('users/top-posters/', TopPostersView.as_view(), name='users-top-posters'),
 
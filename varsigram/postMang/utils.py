@@ -1,6 +1,6 @@
 from rest_framework import permissions, serializers
 from .models import Organization, User
-from postMang.apps import get_firestore_db
+from postMang.post_cache import get_post_author_ids
 
 # class IsOwnerOrReadOnly(permissions.BasePermission):
 #     """
@@ -41,7 +41,10 @@ def get_student_user_ids():
 
 def get_post_author_id_from_firestore(post_id: str) -> int:
     """
-    Fetches the post's author's local Postgres User ID from the Firestore database.
+    Fetches the post's author's local Postgres User ID.
+
+    Served from the post -> author cache (see post_cache.get_post_author_ids); Firestore
+    is only read the first time a post is looked up.
 
     :param post_id: The unique Firestore document ID of the post.
     :returns: The local Postgres User ID (int) of the post's author.
@@ -50,25 +53,14 @@ def get_post_author_id_from_firestore(post_id: str) -> int:
     if not post_id:
         raise serializers.ValidationError("Post ID cannot be empty.")
 
-    db = get_firestore_db()
-    
     # ASSUMPTION: Your posts are in a collection named 'posts'
     # and the author's local Django User ID is stored in a field named 'author_id'.
     try:
-        post_ref = db.collection('posts').document(post_id)
-        post_doc = post_ref.get()
+        author_id = get_post_author_ids([post_id]).get(str(post_id))
 
-        if not post_doc.exists:
-            raise serializers.ValidationError(
-                f"Post with ID '{post_id}' not found in Firestore."
-            )
-        
-        post_data = post_doc.to_dict()
-        author_id = post_data.get('author_id')
-        
         if not author_id:
             raise serializers.ValidationError(
-                "Post data is missing the required 'author_id' field."
+                f"Post with ID '{post_id}' not found in Firestore."
             )
 
         # Ensure the author_id is an integer (as it is a local PK)
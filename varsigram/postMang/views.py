@@ -1,29 +1,39 @@
-import redis
+from varsigram.redis_client import get_redis
 from rest_framework import generics, permissions, filters
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from firebase_admin import firestore
 from postMang.apps import get_firestore_db  # Import the Firestore client from the app config
-from .models import (User, Follow, Student, Organization, RewardPointTransaction)
+from .models import (User, Follow, Student, Organization, RewardDailyRollup)
 from .serializer import FirestoreCommentSerializer, FirestoreLikeOutputSerializer, FirestorePostCreateSerializer, FirestorePostUpdateSerializer, FirestorePostOutputSerializer, GenericFollowSerializer, RewardPointSerializer, PrivatePointsProfileSerializer
 from .utils import get_exclusive_org_user_ids, get_student_user_ids
 import logging
+import math
 import random
 import hashlib
-import os
 import uuid
 from datetime import datetime, timezone, timedelta
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q, Sum
+from django.db.models import Q
 from django.conf import settings
 from .leaderboard_utils import key_weekly, key_monthly, key_alltime
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
 from notifications_app.tasks import notify_all_users_new_post
 from rest_framework.mixins import CreateModelMixin
-from notifications_app.utils import send_push_notification
-from .signals import get_redis_client
+from notifications_app.dispatch import notify
+from .signals import adjust_post_count
 from .tasks import recompute_posts_alltime
+from .leaderboard_cohorts import COHORT_KINDS, cohort_metric, get_user_cohorts
+from .reward_cache import get_post_reward_totals, get_rewarded_post_ids
+from .leaderboard_ranges import RANGE_MAX_DAYS, allow_range_build, ensure_range_board, key_range
+from .leaderboard_snapshots import (
+    SNAPSHOT_SIZE, get_member_neighbourhood, get_member_rank, get_snapshot, hydrate_leaderboard_users,
+)
+from .post_cache import (
+    cache_post, drop_post_slug, forget_post_author, get_cached_post, index_post_slug, invalidate_posts,
+    remember_post_authors, resolve_post_slug,
+)
 
 # TTLs and keys
 REDIS_AUTHOR_TTL = getattr(settings, 'REDIS_AUTHOR_TTL', 60 * 60 * 24)  # 24 hours
@@ -36,7 +46,7 @@ def batch_has_liked(user_id, post_ids):
     Falls back to empty set if Redis unavailable.
     """
     try:
-        r = get_redis_client()
+        r = get_redis('cache')
         key = f"user:likes:{user_id}"
         pipe = r.pipeline()
         for pid in post_ids:
@@ -48,13 +58,67 @@ def batch_has_liked(user_id, post_ids):
         return set()
 
 
+def has_liked_post(user_id, post_id):
+    """Return whether `user_id` has liked `post_id`.
+
+    `user:likes:<user_id>` only holds likes toggled while it was live, so a post that
+    is not a member is checked against its Firestore like document once; the answer is
+    remembered in `user:likes:<user_id>` or `user:unliked:<user_id>` until the TTL.
+    """
+    user_id, post_id = str(user_id), str(post_id)
+    liked_key, unliked_key = f"user:likes:{user_id}", f"user:unliked:{user_id}"
+    try:
+        r = get_redis('cache')
+        pipe = r.pipeline(transaction=False)
+        pipe.sismember(liked_key, post_id)
+        pipe.sismember(unliked_key, post_id)
+        liked, unliked = pipe.execute()
+        if liked or unliked:
+            return bool(liked)
+    except Exception:
+        r = None
+        logger.warning(f"Like cache unavailable for user {user_id}; reading Firestore", exc_info=True)
+
+    try:
+        liked = db.collection('posts').document(post_id).collection('likes').document(user_id).get().exists
+    except Exception:
+        logger.exception(f"Failed to read like state for post {post_id}")
+        return False
+    if r is not None:
+        try:
+            key = liked_key if liked else unliked_key
+            pipe = r.pipeline(transaction=False)
+            pipe.sadd(key, post_id)
+            pipe.expire(key, REDIS_LIKES_TTL)
+            pipe.execute()
+        except Exception:
+            logger.warning(f"Failed to cache like state for user {user_id}", exc_info=True)
+    return liked
+
+
+def batch_has_rewarded(user, post_ids):
+    """Return the set of post_ids that `user` has rewarded, with one SMISMEMBER (see reward_cache)."""
+    if not post_ids or not getattr(user, 'is_authenticated', False):
+        return set()
+    return get_rewarded_post_ids(user.id, post_ids)
+
+
+def batch_reward_totals(post_ids):
+    """Return {post_id: total reward points} for `post_ids`; posts without rewards are omitted.
+
+    A single HMGET on the `post:rewards` hash (see reward_cache), falling back to one
+    grouped Postgres query when the hash is not yet complete.
+    """
+    return get_post_reward_totals(post_ids)
+
+
 def hydrate_authors_map(author_ids):
     """Fetch author metadata from Redis hash cache, fall back to DB for misses, and populate cache."""
     authors_map = {}
     if not author_ids:
         return authors_map
     try:
-        r = get_redis_client()
+        r = get_redis('cache')
         pipe = r.pipeline()
         keys = [f"user:meta:{aid}" for aid in author_ids]
         for k in keys:
@@ -415,7 +479,7 @@ class FeedView(APIView):
             current_user = request.user
             # Try to serve from precomputed Redis feed first (push-on-write)
             try:
-                r = get_redis_client()
+                r = get_redis('feeds')
                 feed_key = f"feed:{current_user.id}"
 
                 # Support score-based cursor pagination: client may send `cursor=score:post_id`
@@ -782,18 +846,9 @@ class FeedView(APIView):
             # NEW REWARD LOGIC
             rewarded_post_ids_set = set()
             if current_user.is_authenticated:
-                rewarded_post_ids_qs = RewardPointTransaction.objects.filter(
-                    giver=current_user,
-                    firestore_post_id__in=final_post_ids).values_list('firestore_post_id', flat=True)
-                rewarded_post_ids_set = set(rewarded_post_ids_qs)
+                rewarded_post_ids_set = batch_has_rewarded(current_user, final_post_ids)
                 # Also compute total reward points per post for the final page
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=final_post_ids
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(final_post_ids)
             
 
             # Batch check which posts the current user has liked (use Redis cached sets)
@@ -866,6 +921,61 @@ class FeedView(APIView):
             return Response({"error": f"Failed to retrieve feed posts: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class FeedNewPostsView(APIView):
+    """
+    Counts posts that reached the user's Redis feed after `since`, for the "N new posts" pill.
+
+    Query params:
+    - `since`: the newest feed score the client holds (a `next_cursor` of the form
+      `<score>:<post_id>` is accepted too). Omit it to just get the current `top_score`.
+    - `ids` (`1`/`true`): also return up to `limit` (default 20, max 100) new post IDs, newest first.
+
+    Authenticated from the JWT alone and answered with one Redis pipeline: no Postgres
+    or Firestore work. Posts only reach the feed through fan-out, so the count is exact
+    for followed authors.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [JWTStatelessUserAuthentication]
+    MAX_IDS = 100
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = float(since.split(':', 1)[0])
+            except ValueError:
+                since = None
+            if since is None or not math.isfinite(since):
+                return Response({"error": "since must be a feed score or cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        want_ids = request.query_params.get('ids', '').lower() in ('1', 'true', 'yes')
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), self.MAX_IDS))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        feed_key = f"feed:{request.user.id}"
+        try:
+            pipe = get_redis('feeds').pipeline(transaction=False)
+            pipe.zrevrange(feed_key, 0, 0, withscores=True)
+            if since is not None:
+                pipe.zcount(feed_key, f"({since}", '+inf')
+                if want_ids:
+                    pipe.zrevrangebyscore(feed_key, '+inf', f"({since}", start=0, num=limit)
+            results = pipe.execute()
+        except Exception:
+            logger.warning(f"Feed unavailable for new-post count of user {request.user.id}", exc_info=True)
+            return Response({"error": "Feed temporarily unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        top = results[0]
+        payload = {
+            "count": results[1] if since is not None else 0,
+            "top_score": top[0][1] if top else None,
+        }
+        if since is not None and want_ids:
+            payload["post_ids"] = [m.decode() if isinstance(m, bytes) else m for m in results[2]]
+        return Response(payload, status=status.HTTP_200_OK)
+
+
 # Custom Permission Example (simplified)
 class IsFirestoreDocOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj_data):
@@ -963,23 +1073,10 @@ class QuestionPostView(APIView):
                     post['has_liked'] = str(pid) in liked_set if pid else False
                 # Reward point totals for this page
                 firestore_post_ids = [p['id'] for p in posts_list if 'id' in p]
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=firestore_post_ids
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(firestore_post_ids)
 
                 # Batched rewarded presence for this user
-                try:
-                    rewarded_ids = RewardPointTransaction.objects.filter(
-                        giver=request.user,
-                        firestore_post_id__in=firestore_post_ids
-                    ).values_list('firestore_post_id', flat=True)
-                    rewarded_set = {str(r) for r in rewarded_ids}
-                except Exception:
-                    rewarded_set = set()
+                rewarded_set = batch_has_rewarded(request.user, firestore_post_ids)
 
                 for post in posts_list:
                     pid = post.get('id')
@@ -1078,20 +1175,10 @@ class RelatablePostView(APIView):
                 liked_set = batch_has_liked(user_id, post_ids_batch)
 
                 # Batched rewarded presence (did this user reward these posts?)
-                rewarded_post_ids = RewardPointTransaction.objects.filter(
-                    giver=request.user,
-                    firestore_post_id__in=post_ids_batch
-                ).values_list('firestore_post_id', flat=True)
-                rewarded_set = set(rewarded_post_ids)
+                rewarded_set = batch_has_rewarded(request.user, post_ids_batch)
 
                 # Reward point totals (sum per post)
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=post_ids_batch
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(post_ids_batch)
 
                 for post in posts_list:
                     pid = post.get('id')
@@ -1192,22 +1279,9 @@ class UpdatesPostView(APIView):
                     liked = batch_has_liked(user_id, post_ids)
                 except Exception:
                     liked = set()
-                try:
-                    rewarded_ids = RewardPointTransaction.objects.filter(
-                        giver=request.user,
-                        firestore_post_id__in=post_ids
-                    ).values_list('firestore_post_id', flat=True)
-                    rewarded = {str(r) for r in rewarded_ids}
-                except Exception:
-                    rewarded = set()
+                rewarded = batch_has_rewarded(request.user, post_ids)
                 # Reward point totals for this page
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=post_ids
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(post_ids)
                 for post in posts_list:
                     pid = str(post.get('id'))
                     post['has_liked'] = pid in liked
@@ -1307,22 +1381,9 @@ class MilestonePostView(APIView):
                     liked = batch_has_liked(user_id, post_ids)
                 except Exception:
                     liked = set()
-                try:
-                    rewarded_ids = RewardPointTransaction.objects.filter(
-                        giver=request.user,
-                        firestore_post_id__in=post_ids
-                    ).values_list('firestore_post_id', flat=True)
-                    rewarded = {str(r) for r in rewarded_ids}
-                except Exception:
-                    rewarded = set()
+                rewarded = batch_has_rewarded(request.user, post_ids)
                 # Reward point totals for this page
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=post_ids
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(post_ids)
                 for post in posts_list:
                     pid = str(post.get('id'))
                     post['has_liked'] = pid in liked
@@ -1364,6 +1425,8 @@ class BatchPostViewIncrementAPIView(APIView):
                 batch.update(post_ref, {'view_count': firestore.Increment(1)})
                 incremented += 1
         batch.commit()
+        if incremented:
+            invalidate_posts(set(post_ids))
         return Response({"message": f"{incremented} post view counts incremented (unique per user)."}, status=status.HTTP_200_OK)
     
 
@@ -1451,23 +1514,12 @@ class PostListCreateFirestoreView(APIView):
                     pid = post.get('id')
                     post['has_liked'] = str(pid) in liked_set if pid else False
 
-                rewarded_post_ids = RewardPointTransaction.objects.filter(
-                    giver=request.user,
-                    firestore_post_id__in=firestore_post_ids
-                ).values_list('firestore_post_id', flat=True)
-
-                rewarded_set = set(rewarded_post_ids)
+                rewarded_set = batch_has_rewarded(request.user, firestore_post_ids)
 
                 for post in posts_list:
                     post['has_rewarded'] = post['id'] in rewarded_set
                 # --- Reward point totals (sum of points per post) ---
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=firestore_post_ids
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(firestore_post_ids)
 
                 for post in posts_list:
                     post['reward_point_count'] = reward_map.get(post.get('id'), 0)
@@ -1521,6 +1573,9 @@ class PostListCreateFirestoreView(APIView):
                 
                 created_post = doc_ref.get().to_dict()
                 created_post['id'] = doc_ref.id
+                index_post_slug(post_payload['slug'], doc_ref.id)
+                remember_post_authors({doc_ref.id: request.user.id})
+                adjust_post_count(request.user.id, 1)
 
                 # --- Offload notification to Celery ---
                 notify_all_users_new_post.delay(
@@ -1545,8 +1600,9 @@ class PostListCreateFirestoreView(APIView):
 
 class PostDetailFirestoreView(APIView):
     """
-    Retrieve, update, or delete a single post from Firestore using document ID.
-    If using slugs, you'd query: db.collection('posts').where('slug', '==', slug_value).limit(1).stream()
+    Retrieve, update, or delete a single post from Firestore using document ID or slug.
+    Slugs resolve through the Redis `post:slug:<slug>` index; the post document itself
+    is served from the short-lived `post:doc:<id>` cache when possible.
     """
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsFirestoreDocOwner]
     authentication_classes = [JWTAuthentication]
@@ -1568,92 +1624,66 @@ class PostDetailFirestoreView(APIView):
         except Exception: # Broad exception for brevity
             return None, None
 
-    def get(self, request, post_id): # post_identifier can be ID or slug
-        # Determine if post_identifier is a slug or ID based on your URL pattern
-        # For this example, let's assume it's post_id. If using slug, pass is_slug=True
-        doc_ref, post_data = self.get_post_doc_and_data(post_id) #, is_slug=True if your URL uses slug)
+    def get_post_data(self, post_id_or_slug):
+        """
+        Resolve a post by ID or slug with at most one Firestore document read.
+        Returns (post_id, post_data) or (None, None).
+        """
+        post_id = resolve_post_slug(post_id_or_slug) or post_id_or_slug
+        post_data = get_cached_post(post_id)
+        if post_data is not None:
+            return post_id, post_data
 
-        if post_data:
-            post_data['id'] = doc_ref.id
-            post_data['view_count'] = doc_ref.get().to_dict().get('view_count', 0)
-            post_data['like_count'] = doc_ref.get().to_dict().get('like_count', 0)
+        doc_ref, post_data = self.get_post_doc_and_data(post_id)
+        if not post_data:
+            # Slug that predates the index: query once and backfill it.
+            doc_ref, post_data = self.get_post_doc_and_data(post_id_or_slug, is_slug=True)
+            if not post_data:
+                return None, None
+            index_post_slug(post_data.get('slug'), doc_ref.id)
 
-            
+        cache_post(doc_ref.id, post_data)
+        return doc_ref.id, post_data
 
-            # Hydrate author info
-            author_id = str(post_data.get('author_id'))
-            author_info = None
-            if author_id:
-                try:
-                    author = User.objects.only('id', 'email', 'profile_pic_url', 'is_verified').get(id=author_id)
-                    author_name = None
-                    if hasattr(author, 'student') and author.student.name:
-                        author_name = author.student.name
-                        display_name_slug = getattr(author.student, 'display_name_slug', None)
-                        author_faculty = author.student.faculty
-                        author_department = author.student.department
-                    elif hasattr(author, 'organization') and author.organization.organization_name:
-                        author_name = author.organization.organization_name
-                        exclusive = author.organization.exclusive
-                        display_name_slug = getattr(author.organization, 'display_name_slug', None)
-
-                    author_info = {
-                        "id": author.id,
-                        "email": author.email,
-                        "profile_pic_url": author.profile_pic_url,
-                        "name": author_name,
-                        "is_verified": author.is_verified if hasattr(author, 'is_verified') else False,
-                        "display_name_slug": display_name_slug,
-                        "exclusive": exclusive if hasattr(author, 'organization') else False,
-                        "faculty": author_faculty if hasattr(author, 'student') else None,
-                        "department": author_department if hasattr(author, 'student') else None,
-                    }
-                except User.DoesNotExist:
-                    author_info = {
-                        "id": author_id,
-                        "email": None,
-                        "profile_pic_url": None,
-                        "name": None,
-                        "is_verified": None
-                    }
-            else:
-                author_info = None
-            post_data['author_name'] = author_info['name'] if author_info else None
-            post_data['author_profile_pic_url'] = author_info['profile_pic_url'] if author_info else None
-            post_data['is_verified'] = author_info['is_verified'] if author_info else None
-            post_data['author_id'] = author_info['id'] if author_info else None
-            post_data['author_email'] = author_info['email'] if author_info else None
-            post_data['author_exclusive'] = author_info['exclusive'] if author_info else False
-            post_data['author_faculty'] = author_info['faculty'] if author_info else None
-            post_data['author_department'] = author_info['department'] if author_info else None
-            post_data['author_display_name_slug'] = display_name_slug
-
-            # Add has_liked
-            post_data['has_liked'] = False
-            if request.user.is_authenticated:
-                user_id = str(request.user.id)
-                like_doc_ref = db.collection('posts').document(post_data['id']).collection('likes').document(user_id)
-                post_data['has_liked'] = like_doc_ref.get().exists
-            
-            post_data['has_rewarded'] = False
-            if request.user.is_authenticated:
-                rewarded = RewardPointTransaction.objects.filter(
-                    giver=request.user,
-                    firestore_post_id=post_data['id']
-                ).exists()
-                post_data['has_rewarded'] = rewarded
-
-            # Total reward points for the post
-            try:
-                total_points = RewardPointTransaction.objects.filter(
-                    firestore_post_id=post_data['id']
-                ).aggregate(total=Sum('points'))['total'] or 0
-            except Exception:
-                total_points = 0
-            post_data['reward_point_count'] = total_points
+    def get(self, request, post_id): # post_id can be a document ID or a slug
+        post_id, post_data = self.get_post_data(post_id)
+        if not post_data:
+            return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            return Response(post_data, status=status.HTTP_200_OK)
-        return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+        post_data['id'] = post_id
+        post_data['view_count'] = post_data.get('view_count', 0)
+        post_data['like_count'] = post_data.get('like_count', 0)
+
+        # Hydrate author info from the shared author cache
+        author_id = post_data.get('author_id')
+        author_info = None
+        if author_id:
+            author_info = hydrate_authors_map([str(author_id)]).get(str(author_id)) or {
+                "id": author_id,
+                "email": None,
+                "profile_pic_url": None,
+                "name": None,
+                "is_verified": None,
+            }
+        post_data['author_name'] = author_info.get('name') if author_info else None
+        post_data['author_profile_pic_url'] = author_info.get('profile_pic_url') if author_info else None
+        post_data['is_verified'] = author_info.get('is_verified') if author_info else None
+        post_data['author_id'] = author_info.get('id') if author_info else None
+        post_data['author_email'] = author_info.get('email') if author_info else None
+        post_data['author_exclusive'] = author_info.get('exclusive', False) if author_info else False
+        post_data['author_faculty'] = author_info.get('faculty') if author_info else None
+        post_data['author_department'] = author_info.get('department') if author_info else None
+        post_data['author_display_name_slug'] = author_info.get('display_name_slug') if author_info else None
+
+        post_data['has_liked'] = False
+        post_data['has_rewarded'] = False
+        if request.user.is_authenticated:
+            post_data['has_liked'] = has_liked_post(request.user.id, post_id)
+            post_data['has_rewarded'] = post_id in batch_has_rewarded(request.user, [post_id])
+
+        post_data['reward_point_count'] = batch_reward_totals([post_id]).get(post_id, 0)
+
+        return Response(post_data, status=status.HTTP_200_OK)
 
     def put(self, request, post_id):
         if not request.user.is_authenticated:
@@ -1674,6 +1704,10 @@ class PostDetailFirestoreView(APIView):
                 return Response({"error": "No data provided for update."}, status=status.HTTP_400_BAD_REQUEST)
             try:
                 doc_ref.update(update_payload)
+                invalidate_posts([doc_ref.id])
+                if 'slug' in update_payload and update_payload['slug'] != post_data.get('slug'):
+                    drop_post_slug(post_data.get('slug'))
+                    index_post_slug(update_payload['slug'], doc_ref.id)
                 updated_post_data = doc_ref.get().to_dict()
                 updated_post_data['id'] = doc_ref.id
                 return Response(updated_post_data, status=status.HTTP_200_OK)
@@ -1696,6 +1730,14 @@ class PostDetailFirestoreView(APIView):
         try:
             # Important: Also delete associated comments, likes, shares (e.g., using a Cloud Function or batch writes)
             doc_ref.delete()
+            invalidate_posts([doc_ref.id])
+            drop_post_slug(post_data.get('slug'))
+            forget_post_author(doc_ref.id)
+            created_at = post_data.get('timestamp')
+            adjust_post_count(
+                request.user.id, -1,
+                created_at.astimezone(timezone.utc).date() if isinstance(created_at, datetime) else None,
+            )
             # Example: Batch delete for subcollection (do this carefully)
             # comments_ref = doc_ref.collection('comments')
             # for comment_doc in comments_ref.stream():
@@ -1797,11 +1839,12 @@ class CommentCreateFirestoreView(APIView):
                 # It's called like a regular function, and db.transaction() is implicitly passed.
                 # db.transaction() will retry the function automatically on contention.
                 new_comment_id = create_comment_and_increment_count(db.transaction(), post_ref, comment_payload)
+                invalidate_posts([post_id])
 
 
 
-                # Fetch the parent's author for notification if it's a reply
-                target_user = None
+                # Find the parent's author for notification if it's a reply
+                target_user_id = None
                 notification_title = ""
                 
                 if parent_comment_id:
@@ -1810,29 +1853,31 @@ class CommentCreateFirestoreView(APIView):
                     if parent_comment_doc.exists:
                         parent_author_id = parent_comment_doc.to_dict().get('author_id')
                         if parent_author_id and parent_author_id != str(request.user.id):
-                            target_user = User.objects.get(id=parent_author_id)
+                            target_user_id = parent_author_id
                             notification_title = "New Reply"
                     
                 else:
                     # Case 2: New comment on a post
                     post_author_id = post_doc_snapshot.to_dict().get('author_id')
                     if post_author_id and post_author_id != str(request.user.id):
-                        target_user = User.objects.get(id=post_author_id)
+                        target_user_id = post_author_id
                         notification_title = "New Comment on Your Post"
                 
-                # Send the push notification if a target user was found
-                if target_user:
-                    send_push_notification(
-                        user=target_user,
+                # Queue the push notification if a target user was found
+                if target_user_id:
+                    notify(
+                        target_user_id,
+                        "comment" if not parent_comment_id else "reply",
                         title=notification_title,
                         body=f"{user_name} commented: {comment_payload['text'][:50]}...",
                         data={
-                            "type": "comment" if not parent_comment_id else "reply",
                             "post_id": post_id,
                             "comment_id": new_comment_id,
                             "commenter_id": user_id,
                             "commenter_profile_pic_url": user_profile_pic_url,
-                        }
+                        },
+                        actor_id=user_id,
+                        actor_name=user_name,
                     )
                 
                 created_comment_doc = post_ref.collection('comments').document(new_comment_id).get()
@@ -1841,10 +1886,6 @@ class CommentCreateFirestoreView(APIView):
                 
                 return Response(created_comment_data, status=status.HTTP_201_CREATED)
 
-            except User.DoesNotExist:
-                logger.warning("Notification target user not found.")
-                # We can continue since the comment was still created successfully
-                return Response(created_comment_data, status=status.HTTP_201_CREATED)
             except ValueError as ve:
                 logger.error(f"Transaction failed: {str(ve)}")
                 return Response({"error": f"Transaction failed: {str(ve)}"}, status=status.HTTP_400_BAD_REQUEST)
@@ -1932,6 +1973,7 @@ class CommentDetailFirestoreView(APIView):
             comment_ref = self.get_comment_ref(post_id, comment_id)
             
             delete_comment_and_decrement_counts(db.transaction(), post_ref, comment_ref)
+            invalidate_posts([post_id])
             
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -2155,32 +2197,33 @@ class LikeToggleFirestoreView(APIView):
 
             transaction = db.transaction()
             liked_now = toggle_like_transaction(transaction, post_ref, like_ref, like_doc.exists)
+            invalidate_posts([post_id])
 
             # --- Send notification to post author if liked ---
             if liked_now:
                 post_data = post_doc.to_dict()
                 post_author_id = post_data.get('author_id')
                 if post_author_id and post_author_id != user_id:
-                    try:
-                        post_author = User.objects.get(id=post_author_id)
-                        send_push_notification(
-                            user=post_author,
-                            title="Your post was liked!",
-                            body=f"{user_name} liked your post.",
-                            data={"type": "like", "post_id": post_id}
-                        )
-                    except User.DoesNotExist:
-                        pass
+                    notify(
+                        post_author_id,
+                        "like",
+                        title="Your post was liked!",
+                        body=f"{user_name} liked your post.",
+                        data={"post_id": post_id},
+                        actor_id=user_id,
+                        actor_name=user_name,
+                    )
 
             # --- Update Redis user likes cache asynchronously (best-effort) ---
             try:
-                r = get_redis_client()
-                likes_key = f"user:likes:{user_id}"
-                if liked_now:
-                    r.sadd(likes_key, post_id)
-                    r.expire(likes_key, REDIS_LIKES_TTL)
-                else:
-                    r.srem(likes_key, post_id)
+                r = get_redis('cache')
+                likes_key, unliked_key = f"user:likes:{user_id}", f"user:unliked:{user_id}"
+                added, removed = (likes_key, unliked_key) if liked_now else (unliked_key, likes_key)
+                pipe = r.pipeline(transaction=False)
+                pipe.sadd(added, post_id)
+                pipe.expire(added, REDIS_LIKES_TTL)
+                pipe.srem(removed, post_id)
+                pipe.execute()
             except Exception:
                 logger.exception("Failed to update redis user likes cache")
 
@@ -2249,7 +2292,7 @@ class RewardPointSubmitView(generics.GenericAPIView, CreateModelMixin): # Rename
     permission_classes = [permissions.IsAuthenticated]
 
     # The POST method is handled by the CreateModelMixin, 
-    # and the Serializer's create method handles the UPSERT logic via IntegrityError.
+    # and the Serializer's create method does a single-statement UPSERT (RewardPointTransaction.upsert).
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
@@ -2270,6 +2313,63 @@ class UserPointsDetailView(generics.RetrieveAPIView):
     queryset = User.objects.all() 
     
 
+class UserPointsHistoryView(APIView):
+    """
+    Points received by a user over time, read from the daily reward rollup.
+
+    Query params:
+    - `period`: daily | weekly (default daily; weeks start on Monday)
+    - `from` / `to`: YYYY-MM-DD, inclusive. `to` defaults to today; `from` to 30 days
+      (daily) or 12 weeks (weekly) before `to`. At most 366 days.
+
+    The series is dense: buckets without rewards are returned with zeros.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+
+    MAX_DAYS = 366
+
+    def get(self, request, pk):
+        period = request.query_params.get('period', 'daily')
+        if period not in ('daily', 'weekly'):
+            return Response({'error': 'period must be daily or weekly.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            to_param = request.query_params.get('to')
+            end = datetime.strptime(to_param, '%Y-%m-%d').date() if to_param else datetime.now(timezone.utc).date()
+            from_param = request.query_params.get('from')
+            start = (
+                datetime.strptime(from_param, '%Y-%m-%d').date() if from_param
+                else end - timedelta(days=29 if period == 'daily' else 7 * 12 - 1)
+            )
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if period == 'weekly':
+            start -= timedelta(days=start.weekday())
+        if start > end or (end - start).days + 1 > self.MAX_DAYS:
+            return Response({'error': f'from must be before to and the range at most {self.MAX_DAYS} days.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = RewardDailyRollup.objects.filter(user_id=pk, day__gte=start, day__lte=end).values_list('day', 'points', 'tx_count')
+        step = 1 if period == 'daily' else 7
+        buckets = {}
+        cursor = start
+        while cursor <= end:
+            buckets[cursor] = {'start': cursor.isoformat(), 'points': 0, 'tx_count': 0}
+            cursor += timedelta(days=step)
+        for day, points, tx_count in rows:
+            bucket = buckets[day - timedelta(days=(day - start).days % step)]
+            bucket['points'] += points
+            bucket['tx_count'] += tx_count
+
+        return Response({
+            'user_id': pk,
+            'period': period,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'total_points': sum(b['points'] for b in buckets.values()),
+            'results': list(buckets.values()),
+        }, status=status.HTTP_200_OK)
+
+
 # class TrendingPostsFirestoreView(generics.ListAPIView):
 #     """
 #     Retrieve a list of trending posts from Firestore.
@@ -2454,22 +2554,9 @@ class ExclusiveOrgsRecentPostsView(APIView):
                     post_ids = [p['id'] for p in paginated_posts if 'id' in p]
                     liked_set = batch_has_liked(current_user_id, post_ids)
                     # Batched rewarded presence for this user
-                    try:
-                        rewarded_ids = RewardPointTransaction.objects.filter(
-                            giver=request.user,
-                            firestore_post_id__in=post_ids
-                        ).values_list('firestore_post_id', flat=True)
-                        rewarded_set = {str(r) for r in rewarded_ids}
-                    except Exception:
-                        rewarded_set = set()
+                    rewarded_set = batch_has_rewarded(request.user, post_ids)
                     # Reward totals per post
-                    try:
-                        reward_totals_qs = RewardPointTransaction.objects.filter(
-                            firestore_post_id__in=post_ids
-                        ).values('firestore_post_id').annotate(total=Sum('points'))
-                        reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                    except Exception:
-                        reward_map = {}
+                    reward_map = batch_reward_totals(post_ids)
 
                     for p in paginated_posts:
                         pid = str(p.get('id'))
@@ -2610,23 +2697,10 @@ class UserPostsFirestoreView(APIView):
             # Batch rewarded flags from Django model
             rewarded_set = set()
             if request.user.is_authenticated and paginated_post_ids:
-                try:
-                    rewarded_ids = RewardPointTransaction.objects.filter(
-                        giver=request.user,
-                        firestore_post_id__in=paginated_post_ids
-                    ).values_list('firestore_post_id', flat=True)
-                    rewarded_set = {str(rid) for rid in rewarded_ids}
-                except Exception:
-                    rewarded_set = set()
+                rewarded_set = batch_has_rewarded(request.user, paginated_post_ids)
 
                 # Reward totals per post for this page
-                try:
-                    reward_totals_qs = RewardPointTransaction.objects.filter(
-                        firestore_post_id__in=paginated_post_ids
-                    ).values('firestore_post_id').annotate(total=Sum('points'))
-                    reward_map = {r['firestore_post_id']: r['total'] for r in reward_totals_qs}
-                except Exception:
-                    reward_map = {}
+                reward_map = batch_reward_totals(paginated_post_ids)
 
             # Apply flags
             for post in paginated_posts:
@@ -2871,203 +2945,263 @@ class VerifiedOrgBadge(APIView):
         except Organization.DoesNotExist:
             return Response({"error": "Organization not found."}, status=status.HTTP_404_NOT_FOUND)
 
-REDIS_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/1')
 
-class RewardWeeklyLeaderboardView(APIView):
+def parse_week_start(week_param):
+    """Parse `week_start` as YYYY-MM-DD (any date in the week) or YYYY-Www. None means current week."""
+    if not week_param:
+        return None
+    try:
+        # Try parsing as ISO date first
+        return datetime.fromisoformat(week_param).date()
+    except ValueError:
+        pass
+    try:
+        # Try ISO week representation like '2025-W46'
+        year, week = week_param.split('-W')
+        return datetime.fromisocalendar(int(year), int(week), 1).date()
+    except Exception:
+        raise ValueError(f"Invalid week_start: {week_param}")
+
+
+class LeaderboardSnapshotView(APIView):
     """
-    View to retrieve the weekly leaderboard for rewards.
+    Base view for leaderboards served from pre-hydrated snapshots (see leaderboard_snapshots).
+
+    Returns the snapshot's top rows (capped at `LEADERBOARD_SNAPSHOT_SIZE`) and the
+    requesting user's own live rank under `me`.
+
+    Query params:
+    - `limit` (int, default 100)
     """
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [JWTAuthentication]
 
+    def get_board_key(self, request):
+        raise NotImplementedError
+
+    def format_row(self, row):
+        return row
+
     def get(self, request):
-        limit = int(request.query_params.get('limit', 100))
-        # default Redis url fallback if not in settings
-        r = redis.Redis.from_url(REDIS_URL)
-        # Optional: accept `week_start` query param to look up a specific ISO week.
-        # Accept formats: YYYY-MM-DD (any date in the week) or YYYY-Www (e.g. 2025-W46)
-        week_param = request.query_params.get('week_start')
-        dt = None
-        if week_param:
-            try:
-                # Try parsing as ISO date first
-                dt = datetime.fromisoformat(week_param).date()
-            except Exception:
-                try:
-                    # Try ISO week representation like '2025-W46'
-                    if '-W' in week_param:
-                        parts = week_param.split('-W')
-                        y = int(parts[0])
-                        w = int(parts[1])
-                        dt = datetime.fromisocalendar(y, w, 1).date()
-                except Exception:
-                    return Response({'error': 'Invalid week_start format. Use YYYY-MM-DD or YYYY-Www'}, status=status.HTTP_400_BAD_REQUEST)
-
-        key = key_weekly('points', dt)
-        members = r.zrevrange(key, 0, limit - 1, withscores=True)
-        user_ids = [int(m.decode() if isinstance(m, bytes) else m) for m, _ in members]
-        users_map = {u.id: u for u in User.objects.filter(id__in=user_ids)}
-        results = []
-        for member, score in members:
-            uid = member.decode() if isinstance(member, bytes) else member
-            u = users_map.get(int(uid))
-            results.append({
-                'user_id': uid,
-                'score': score,
-                'name': (getattr(u, 'student', None) and u.student.name) or (getattr(u, 'organization', None) and u.organization.organization_name) or (u.email if u else None),
-                'profile_pic_url': getattr(u, 'profile_pic_url', None) if u else None,
-            })
-        return Response({'results': results}, status=status.HTTP_200_OK)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 100)), SNAPSHOT_SIZE))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        board_key = self.get_board_key(request)
+        if isinstance(board_key, Response):
+            return board_key
+        try:
+            snapshot = get_snapshot(board_key)
+            me = get_member_rank(board_key, request.user.id)
+        except Exception:
+            logger.exception(f'Failed to load leaderboard {board_key}')
+            return Response({'error': 'Leaderboard temporarily unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({
+            'results': [self.format_row(row) for row in snapshot['results'][:limit]],
+            'me': self.format_row(me),
+            'generated_at': snapshot.get('generated_at'),
+        }, status=status.HTTP_200_OK)
 
 
-class RewardMonthlyLeaderboardView(APIView):
+class RewardWeeklyLeaderboardView(LeaderboardSnapshotView):
+    """
+    View to retrieve the weekly leaderboard for rewards.
+
+    Optional `week_start` selects a specific ISO week:
+    YYYY-MM-DD (any date in the week) or YYYY-Www (e.g. 2025-W46).
+    """
+
+    def get_board_key(self, request):
+        try:
+            dt = parse_week_start(request.query_params.get('week_start'))
+        except ValueError:
+            return Response({'error': 'Invalid week_start format. Use YYYY-MM-DD or YYYY-Www'}, status=status.HTTP_400_BAD_REQUEST)
+        return key_weekly('points', dt)
+
+
+class RewardMonthlyLeaderboardView(LeaderboardSnapshotView):
     """
     View to retrieve the monthly leaderboard for rewards.
     """
-    permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
 
-    def get(self, request):
-        limit = int(request.query_params.get('limit', 100))
-        r = redis.Redis.from_url(REDIS_URL)
-        key = key_monthly('points')
-        members = r.zrevrange(key, 0, limit - 1, withscores=True)
-        user_ids = [int(m.decode() if isinstance(m, bytes) else m) for m, _ in members]
-        users_map = {u.id: u for u in User.objects.filter(id__in=user_ids)}
-        results = []
-        for member, score in members:
-            uid = member.decode() if isinstance(member, bytes) else member
-            u = users_map.get(int(uid))
-            results.append({
-                'user_id': uid,
-                'score': score,
-                'name': (getattr(u, 'student', None) and u.student.name) or (getattr(u, 'organization', None) and u.organization.organization_name) or (u.email if u else None),
-                'profile_pic_url': getattr(u, 'profile_pic_url', None) if u else None,
-            })
-        return Response({'results': results}, status=status.HTTP_200_OK)
+    def get_board_key(self, request):
+        return key_monthly('points')
 
-class RewardAlltimeLeaderboardView(APIView):
+
+class RewardAlltimeLeaderboardView(LeaderboardSnapshotView):
     """
     View to retrieve the alltime leaderboard for rewards.
     """
+
+    def get_board_key(self, request):
+        return key_alltime('points')
+
+
+class RewardRangeLeaderboardView(LeaderboardSnapshotView):
+    """
+    View to retrieve the rewards leaderboard for an arbitrary date range (see leaderboard_ranges).
+
+    Query params (UTC dates, inclusive):
+    - `from` and `to`: YYYY-MM-DD; `to` defaults to today
+    - or `days`: the last N days including today
+
+    Ranges that are not cached yet can be built `LEADERBOARD_RANGE_BUILDS_PER_MINUTE`
+    times per user per minute; further ones get 429.
+    """
+
+    def get_board_key(self, request):
+        today = datetime.now(timezone.utc).date()
+        try:
+            if request.query_params.get('days'):
+                end = today
+                start = end - timedelta(days=int(request.query_params['days']) - 1)
+            else:
+                start = datetime.strptime(request.query_params['from'], '%Y-%m-%d').date()
+                to_param = request.query_params.get('to')
+                end = datetime.strptime(to_param, '%Y-%m-%d').date() if to_param else today
+        except (KeyError, ValueError):
+            return Response({'error': 'Provide `from` (and optionally `to`) as YYYY-MM-DD, or `days`.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        end = min(end, today)
+        if start > end:
+            return Response({'error': '`from` must not be after `to`.'}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days + 1 > RANGE_MAX_DAYS:
+            return Response({'error': f'Range cannot exceed {RANGE_MAX_DAYS} days.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if not get_redis('broker').exists(key_range('points', start, end)) and not allow_range_build(request.user.id):
+                return Response({'error': 'Too many new ranges requested. Please retry in a minute.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            return ensure_range_board(start, end)
+        except Exception:
+            logger.exception(f'Failed to build range leaderboard {start}..{end}')
+            return Response({'error': 'Leaderboard temporarily unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class CohortLeaderboardView(APIView):
+    """
+    Rewards leaderboard scoped to a faculty or department (see leaderboard_cohorts).
+
+    `kind` is `faculty` or `department`. Without a `cohort` slug in the URL the
+    caller's own faculty/department is used.
+
+    Query params:
+    - `period`: weekly | monthly | alltime (default weekly)
+    - `week_start` (weekly only): YYYY-MM-DD or YYYY-Www
+    - `limit` (int, default 100)
+    """
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [JWTAuthentication]
 
-    def get(self, request):
-        limit = int(request.query_params.get('limit', 100))
-        r = redis.Redis.from_url(REDIS_URL)
-        # For now we use the alltime key for yearly; you can add explicit yearly keys if desired
-        key = key_alltime('points')
-        members = r.zrevrange(key, 0, limit - 1, withscores=True)
-        user_ids = [int(m.decode() if isinstance(m, bytes) else m) for m, _ in members]
-        users_map = {u.id: u for u in User.objects.filter(id__in=user_ids)}
-        results = []
-        for member, score in members:
-            uid = member.decode() if isinstance(member, bytes) else member
-            u = users_map.get(int(uid))
-            results.append({
-                'user_id': uid,
-                'score': score,
-                'name': (getattr(u, 'student', None) and u.student.name) or (getattr(u, 'organization', None) and u.organization.organization_name) or (u.email if u else None),
-                'profile_pic_url': getattr(u, 'profile_pic_url', None) if u else None,
-            })
-        return Response({'results': results}, status=status.HTTP_200_OK)
+    def get(self, request, kind, cohort=None):
+        if kind not in COHORT_KINDS:
+            return Response({'error': 'kind must be faculty or department.'}, status=status.HTTP_400_BAD_REQUEST)
+        if cohort is None:
+            cohort = get_user_cohorts([request.user.id]).get(str(request.user.id), {}).get(kind)
+            if not cohort:
+                return Response({'error': f'You have no {kind} on your profile.'}, status=status.HTTP_404_NOT_FOUND)
+
+        metric = cohort_metric('points', kind, cohort)
+        period = request.query_params.get('period', 'weekly')
+        if period == 'weekly':
+            try:
+                board_key = key_weekly(metric, parse_week_start(request.query_params.get('week_start')))
+            except ValueError:
+                return Response({'error': 'Invalid week_start format. Use YYYY-MM-DD or YYYY-Www'}, status=status.HTTP_400_BAD_REQUEST)
+        elif period == 'monthly':
+            board_key = key_monthly(metric)
+        elif period == 'alltime':
+            board_key = key_alltime(metric)
+        else:
+            return Response({'error': 'period must be one of weekly, monthly, alltime.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 100)), SNAPSHOT_SIZE))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            members = get_redis('broker').zrevrange(board_key, 0, limit - 1, withscores=True)
+            user_ids = [m.decode() if isinstance(m, bytes) else m for m, _ in members]
+            users = hydrate_leaderboard_users(user_ids)
+            me = get_member_rank(board_key, request.user.id)
+        except Exception:
+            logger.exception(f'Failed to load cohort leaderboard {board_key}')
+            return Response({'error': 'Leaderboard temporarily unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-class TopPostersView(APIView):
+        results = [
+            {'user_id': uid, 'score': score, **users.get(uid, {'name': None, 'profile_pic_url': None})}
+            for uid, (_, score) in zip(user_ids, members)
+        ]
+        return Response({'kind': kind, 'cohort': cohort, 'period': period, 'results': results, 'me': me}, status=status.HTTP_200_OK)
+
+
+class TopPostersView(LeaderboardSnapshotView):
     """
     Return users ranked by total number of posts (all-time).
 
-    Behavior:
-    - If Redis key `leaderboard:posts:alltime` exists and has members, return top-N from Redis.
-    - Otherwise, if query param `compute=true` is provided, scan Firestore posts collection,
-      compute counts per `author_id`, optionally populate Redis, and return top-N.
-    - If neither condition is met, return 404 with instructions to run backfill or use compute=true.
+    `leaderboard:posts:alltime` is maintained incrementally on post create/delete and served
+    from its snapshot. If the board is empty (fresh Redis), a backfill is enqueued at most
+    once per `POSTS_BACKFILL_LOCK_SECONDS` and 202 is returned.
 
     Query params:
     - `limit` (int, default 100)
-    - `compute` (bool, optional) — when true, compute counts from Firestore synchronously.
     """
-    permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    BACKFILL_LOCK_KEY = 'leaderboard:posts:backfill_lock'
+
+    def get_board_key(self, request):
+        return key_alltime('posts')
+
+    def format_row(self, row):
+        return {**row, 'score': int(row['score'])}
 
     def get(self, request):
-        limit = int(request.query_params.get('limit', 100))
-        compute = request.query_params.get('compute', 'false').lower() in ('1', 'true', 'yes')
+        response = super().get(request)
+        if response.status_code != status.HTTP_200_OK or response.data['results']:
+            return response
 
-        # Try Redis first
         try:
-            r = get_redis_client()
-            key = 'leaderboard:posts:alltime'
-            members = r.zrevrange(key, 0, limit - 1, withscores=True)
-            if members:
-                user_ids = [int(m.decode() if isinstance(m, bytes) else m) for m, _ in members]
-                users_map = {u.id: u for u in User.objects.filter(id__in=user_ids)}
-                results = []
-                for member, score in members:
-                    uid = member.decode() if isinstance(member, bytes) else member
-                    u = users_map.get(int(uid))
-                    results.append({
-                        'user_id': uid,
-                        'score': int(score),
-                        'name': (getattr(u, 'student', None) and u.student.name) or (getattr(u, 'organization', None) and u.organization.organization_name) or (u.email if u else None),
-                        'profile_pic_url': getattr(u, 'profile_pic_url', None) if u else None,
-                    })
-                return Response({'results': results}, status=status.HTTP_200_OK)
+            lock_seconds = getattr(settings, 'POSTS_BACKFILL_LOCK_SECONDS', 60 * 10)
+            if get_redis('broker').set(self.BACKFILL_LOCK_KEY, '1', nx=True, ex=lock_seconds):
+                recompute_posts_alltime.delay()
         except Exception:
-            # Redis may be unavailable; fall through to compute option
-            logging.exception('Redis unavailable when fetching top posters')
+            logging.exception('Failed to enqueue posts backfill task')
+        return Response({'status': 'accepted', 'message': 'Leaderboard is being built. Please retry after a short while.'}, status=status.HTTP_202_ACCEPTED)
 
-        if not compute:
-            # Enqueue background backfill task and return 202 Accepted
-            try:
-                recompute_posts_alltime.delay()
-                return Response({'status': 'accepted', 'message': 'Background backfill started. Please retry after a short while.'}, status=status.HTTP_202_ACCEPTED)
-            except Exception:
-                logging.exception('Failed to enqueue posts backfill task')
-                return Response({'error': 'No cached data and failed to start backfill. Try ?compute=true or run the backfill management command.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Compute counts from Firestore (synchronous; may be slow)
-        counts = {}
-        try:
-            posts_ref = db.collection('posts')
-            for doc in posts_ref.stream():
-                data = doc.to_dict()
-                author_id = data.get('author_id')
-                if not author_id:
-                    continue
-                counts[author_id] = counts.get(author_id, 0) + 1
+class RewardMyRankView(APIView):
+    """
+    The caller's rank, score and the `k` users either side of them on a points leaderboard.
 
-            # Convert to sorted list
-            sorted_items = sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+    Query params:
+    - `period`: weekly | monthly | alltime (default weekly)
+    - `k` (int, default 5, max 25)
+    - `week_start` (weekly only): YYYY-MM-DD or YYYY-Www
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+
+    MAX_K = 25
+
+    def get(self, request):
+        period = request.query_params.get('period', 'weekly')
+        try:
+            k = max(0, min(int(request.query_params.get('k', 5)), self.MAX_K))
+        except ValueError:
+            return Response({'error': 'k must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Optionally populate Redis for future requests
+        if period == 'weekly':
             try:
-                r = get_redis_client()
-                pipe = r.pipeline()
-                key = 'leaderboard:posts:alltime'
-                # Replace the sorted set
-                pipe.delete(key)
-                for uid, cnt in sorted_items:
-                    pipe.zadd(key, {str(uid): int(cnt)})
-                # Set no expiry for alltime
-                pipe.execute()
-            except Exception:
-                logging.exception('Failed to populate Redis with top posters')
-
-            # Hydrate user info from Postgres
-            user_ids = [int(uid) for uid, _ in sorted_items if str(uid).isdigit()]
-            users_map = {u.id: u for u in User.objects.filter(id__in=user_ids)}
-            results = []
-            for uid, cnt in sorted_items:
-                u = users_map.get(int(uid)) if str(uid).isdigit() else None
-                results.append({
-                    'user_id': uid,
-                    'score': int(cnt),
-                    'name': (getattr(u, 'student', None) and u.student.name) or (getattr(u, 'organization', None) and u.organization.organization_name) or (u.email if u else None),
-                    'profile_pic_url': getattr(u, 'profile_pic_url', None) if u else None,
-                })
-            return Response({'results': results}, status=status.HTTP_200_OK)
+                board_key = key_weekly('points', parse_week_start(request.query_params.get('week_start')))
+            except ValueError:
+                return Response({'error': 'Invalid week_start format. Use YYYY-MM-DD or YYYY-Www'}, status=status.HTTP_400_BAD_REQUEST)
+        elif period == 'monthly':
+            board_key = key_monthly('points')
+        elif period == 'alltime':
+            board_key = key_alltime('points')
+        else:
+            return Response({'error': 'period must be one of weekly, monthly, alltime.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            me, neighbours = get_member_neighbourhood(board_key, request.user.id, k)
         except Exception:
-            logging.exception('Failed to compute top posters from Firestore')
-            return Response({'error': 'Failed to compute top posters'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.exception(f'Failed to load rank on {board_key}')
+            return Response({'error': 'Leaderboard temporarily unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'period': period, **me, 'neighbours': neighbours}, status=status.HTTP_200_OK)
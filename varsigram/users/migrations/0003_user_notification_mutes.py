@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_instagram_url_user_linkedin_url_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_mutes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
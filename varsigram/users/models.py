@@ -77,6 +77,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_verified = models.BooleanField(default=False)
     otp = models.CharField(max_length=6, blank=True, null=True)
     otp_expiry = models.DateTimeField(blank=True, null=True)
+    # Bitfield of muted notification types; see notifications_app.preferences.MUTE_BITS
+    notification_mutes = models.PositiveSmallIntegerField(default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['password']
@@ -121,10 +123,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     def total_received_points(self):
         """ 
         Calculates the total points the user has received across all their posts.
-        This uses the reverse relation 'received_rewards'.
+        This sums the per-day rollup (reverse relation 'reward_rollups') rather than
+        every transaction in 'received_rewards'.
         """
         # The author of the post is the current user (self)
-        return self.received_rewards.aggregate(
+        return self.reward_rollups.aggregate(
             total=Sum('points')
         )['total'] or 0
 
@@ -3,7 +3,8 @@ from django.dispatch import receiver
 from django.utils.text import slugify
 from django.utils import timezone
 from .models import Student, Organization
-from notifications_app.utils import send_push_notification
+from notifications_app.dispatch import notify
+from postMang.leaderboard_cohorts import invalidate_user_cohorts
 from django.contrib.auth.models import User
 
 @receiver(pre_save, sender=Student)
@@ -13,6 +14,11 @@ def create_student_slug(sender, instance, **kwargs):
         # timestamp = timezone.now().strftime("%Y%m%d%H%M%S%f")  # Include microseconds for higher precision
         instance.display_name_slug = f"{base_slug}-{instance.user.id}"
 
+@receiver(post_save, sender=Student)
+def refresh_student_cohorts(sender, instance, **kwargs):
+    # Faculty/department may have changed; leaderboard ingest re-reads them on the next reward.
+    invalidate_user_cohorts(instance.user_id)
+
 @receiver(pre_save, sender=Organization)
 def create_organization_slug(sender, instance, **kwargs):
     if not instance.display_name_slug:
@@ -24,11 +30,9 @@ def create_organization_slug(sender, instance, **kwargs):
 def welcome_new_user(sender, instance, created, **kwargs):
     if created:
         # Send a welcome email or notification
-        send_push_notification(
-            user=instance,
+        notify(
+            instance.id,
+            "welcome",
             title="Welcome to Varsigram!",
             body="Thank you for joining Varsigram. We're glad to have you!",
-            data={
-                "type": "welcome"
-            }
         )
\ No newline at end of file
@@ -10,11 +10,18 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter
+from channels.routing import ProtocolTypeRouter, URLRouter
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'varsigram.settings')
 
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from notifications_app.middleware import JWTAuthMiddleware  # noqa: E402
+from notifications_app.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    # You can add websocket protocols here if you use Channels
+    "http": django_asgi_app,
+    # Authenticated by JWT, not cookies, so no origin check is needed; native clients send no Origin
+    "websocket": JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
 })
@@ -27,11 +27,11 @@ app.conf.beat_schedule = {
         'args': (None,),  # Will use current date
     },
     
-    # Recompute all-time leaderboard daily at 2:00 AM UTC
-    # This ensures consistency even if Redis has issues
+    # Reconcile the all-time leaderboard weekly (Sunday 2:00 AM UTC) in case Redis lost
+    # events; day-to-day updates are applied exactly once by postMang.leaderboard_ingest
     'sync-alltime-leaderboard': {
         'task': 'postMang.tasks.recompute_points_alltime',
-        'schedule': crontab(hour=2, minute=0),  # Every day at 2:00 AM
+        'schedule': crontab(hour=2, minute=0, day_of_week=0),
     },
     
     # Optional: Recompute monthly leaderboard on the 1st of each month
@@ -40,6 +40,44 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=0, minute=5, day_of_month=1),  # 1st day of month at 00:05
         'args': (None,),
     },
+
+    # Re-render the pre-hydrated top-N leaderboard snapshots
+    'refresh-leaderboard-snapshots': {
+        'task': 'postMang.tasks.refresh_leaderboard_snapshots',
+        'schedule': crontab(minute='*/5'),
+    },
+
+    # Deactivate FCM tokens that stopped re-registering and delete long-inactive ones
+    'prune-stale-devices': {
+        'task': 'notifications_app.tasks.prune_stale_devices',
+        'schedule': crontab(hour=3, minute=30),
+    },
+
+    # Rewrite the Redis unread-notification counters from Postgres
+    'reconcile-unread-notification-counts': {
+        'task': 'notifications_app.tasks.reconcile_unread_notification_counts',
+        'schedule': crontab(minute=20),
+    },
+
+    # Delete (or archive) read notifications past NOTIFICATION_READ_RETENTION_DAYS
+    'purge-old-notifications': {
+        'task': 'notifications_app.tasks.purge_old_notifications',
+        'schedule': crontab(hour=4, minute=0),
+    },
+
+    # Rebuild the notification mute bitmaps from Postgres
+    'sync-notification-mute-bitmaps': {
+        'task': 'notifications_app.tasks.sync_notification_mute_bitmaps',
+        'schedule': crontab(hour=4, minute=30),
+    },
+}
+
+# Personal notifications are persisted and pushed by dedicated workers, e.g.
+# `celery -A varsigram worker -Q notifications`, so FCM latency never queues behind feed work.
+app.conf.task_routes = {
+    'notifications_app.tasks.flush_user_notifications': {'queue': 'notifications'},
+    'notifications_app.tasks.flush_notification_group': {'queue': 'notifications'},
+    'notifications_app.tasks.deliver_notifications': {'queue': 'notifications'},
 }
 
 app.conf.timezone = 'UTC'
@@ -0,0 +1,183 @@
+"""
+Shared Redis clients for the whole project.
+
+Use `get_redis(role)` instead of building clients with `redis.Redis.from_url`.
+Each role gets one process-wide `BlockingConnectionPool` with connect/read
+timeouts and periodic health checks, plus a circuit breaker:
+
+- `cache`  - rebuildable caches (author meta, post docs, slug index, like sets)
+- `feeds`  - per-user feed sorted sets written by fan-out
+- `broker` - app state kept next to Celery (leaderboards, metrics, job checkpoints)
+
+Every role defaults to `CELERY_BROKER_URL` (or `redis://localhost:6379/0`), so
+a single-instance deployment needs no extra configuration. Set
+`REDIS_CACHE_URL` / `REDIS_FEEDS_URL` / `REDIS_BROKER_URL` to split them.
+
+Read timeouts are per role (`REDIS_<ROLE>_SOCKET_TIMEOUT`, see
+`DEFAULT_SOCKET_TIMEOUTS`): request-path cache reads fail fast, while `feeds` and
+`broker` also carry bulk work (fan-out, board rebuilds, RENAME swaps, bitmap syncs)
+and get longer ones so a slow command is not counted against the breaker.
+
+When a role sees `REDIS_BREAKER_THRESHOLD` consecutive connection errors or
+timeouts, its breaker opens and every call raises `RedisUnavailable`
+immediately for `REDIS_BREAKER_RESET_SECONDS`, so callers go straight to their
+`except Exception` fallback instead of waiting out the socket timeout. After
+that a single probe call is let through; success closes the breaker.
+"""
+import logging
+import os
+import threading
+import time
+
+import redis
+from django.conf import settings
+from redis.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+ROLES = ('cache', 'feeds', 'broker')
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+DEFAULT_SOCKET_TIMEOUTS = {'cache': 1.0, 'feeds': 5.0, 'broker': 10.0}
+
+
+class RedisUnavailable(redis.exceptions.ConnectionError):
+    """Raised without touching the network while a role's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                raise RedisUnavailable(f"Redis circuit '{self.name}' is open")
+            # Half-open: let this caller probe, keep everyone else out for another window.
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        if self._failures or self._opened_at is not None:
+            with self._lock:
+                if self._opened_at is not None:
+                    logger.info(f"Redis circuit '{self.name}' closed")
+                self._failures = 0
+                self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Redis circuit '{self.name}' opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+_BREAKER_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
+
+class _GuardedPipeline(Pipeline):
+    def __init__(self, *args, breaker=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute(self, raise_on_error=True):
+        if not self.command_stack and not self.watching:
+            return []
+        self.breaker.before_call()
+        try:
+            result = super().execute(raise_on_error=raise_on_error)
+        except RedisUnavailable:
+            raise
+        except _BREAKER_ERRORS:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+
+class GuardedRedis(redis.Redis):
+    """`redis.Redis` whose commands and pipelines go through a CircuitBreaker."""
+
+    def __init__(self, *args, breaker=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute_command(self, *args, **options):
+        self.breaker.before_call()
+        try:
+            result = super().execute_command(*args, **options)
+        except RedisUnavailable:
+            raise
+        except _BREAKER_ERRORS:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return _GuardedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint, breaker=self.breaker
+        )
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def redis_url_for(role):
+    url = getattr(settings, f'REDIS_{role.upper()}_URL', None) or os.environ.get(f'REDIS_{role.upper()}_URL')
+    if url:
+        return url
+    broker_url = os.environ.get('CELERY_BROKER_URL') or getattr(settings, 'CELERY_BROKER_URL', None)
+    if broker_url and broker_url.startswith(('redis://', 'rediss://', 'unix://')):
+        return broker_url
+    return DEFAULT_REDIS_URL
+
+
+def socket_timeout_for(role):
+    timeout = getattr(settings, f'REDIS_{role.upper()}_SOCKET_TIMEOUT', None)
+    if timeout is None:
+        timeout = DEFAULT_SOCKET_TIMEOUTS[role]
+    return float(timeout)
+
+
+def _build_client(role):
+    pool = redis.BlockingConnectionPool.from_url(
+        redis_url_for(role),
+        max_connections=getattr(settings, 'REDIS_MAX_CONNECTIONS', 50),
+        timeout=getattr(settings, 'REDIS_POOL_TIMEOUT', 1.0),
+        socket_timeout=socket_timeout_for(role),
+        socket_connect_timeout=getattr(settings, 'REDIS_CONNECT_TIMEOUT', 0.5),
+        socket_keepalive=True,
+        health_check_interval=getattr(settings, 'REDIS_HEALTH_CHECK_INTERVAL', 30),
+    )
+    breaker = CircuitBreaker(
+        role,
+        failure_threshold=getattr(settings, 'REDIS_BREAKER_THRESHOLD', 5),
+        reset_seconds=getattr(settings, 'REDIS_BREAKER_RESET_SECONDS', 30),
+    )
+    return GuardedRedis(connection_pool=pool, breaker=breaker)
+
+
+def get_redis(role='cache'):
+    """Return the shared client for `role` ('cache', 'feeds' or 'broker')."""
+    if role not in ROLES:
+        raise ValueError(f"Unknown Redis role: {role}")
+    client = _clients.get(role)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(role)
+            if client is None:
+                client = _clients[role] = _build_client(role)
+    return client
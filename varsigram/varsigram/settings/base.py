@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'rest_framework.authtoken',
     'django_filters',
+    'channels',
     # 'social_django', # Uncomment if you enable it later
 
     #Local Apps
@@ -226,27 +227,50 @@ CELERY_TIMEZONE = 'Africa/Lagos' # Consistent with TIME_ZONE
 CELERY_ENABLE_UTC = True # Always good practice
 CELERY_RESULT_BACKEND = 'django-db'
 
+# Shared Redis clients (see varsigram/redis_client.py). Each role falls back to
+# CELERY_BROKER_URL when it is a redis:// URL, else redis://localhost:6379/0.
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL')
+REDIS_FEEDS_URL = os.environ.get('REDIS_FEEDS_URL')
+REDIS_BROKER_URL = os.environ.get('REDIS_BROKER_URL')
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 1.0))  # wait for a free pooled connection
+# Read timeouts per role: request-path cache reads fail fast, bulk feed/broker work gets longer
+REDIS_CACHE_SOCKET_TIMEOUT = float(os.environ.get('REDIS_CACHE_SOCKET_TIMEOUT', 1.0))
+REDIS_FEEDS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_FEEDS_SOCKET_TIMEOUT', 5.0))
+REDIS_BROKER_SOCKET_TIMEOUT = float(os.environ.get('REDIS_BROKER_SOCKET_TIMEOUT', 10.0))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.5))
+REDIS_HEALTH_CHECK_INTERVAL = 30
+REDIS_BREAKER_THRESHOLD = 5  # consecutive failures before skipping Redis
+REDIS_BREAKER_RESET_SECONDS = 30
+
+# Channel layer for websocket push (notifications_app.realtime). Falls back to
+# CELERY_BROKER_URL when it is a redis:// URL, like the shared Redis clients.
+_celery_broker_url = os.environ.get('CELERY_BROKER_URL', '')
+REDIS_CHANNELS_URL = os.environ.get('REDIS_CHANNELS_URL') or (
+    _celery_broker_url if _celery_broker_url.startswith(('redis://', 'rediss://')) else 'redis://localhost:6379/0'
+)
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [REDIS_CHANNELS_URL],
+            'capacity': 1000,  # per-channel buffer before sends to a slow client are dropped
+            'expiry': 30,
+        },
+    },
+}
+
 # Celery Beat schedule: periodic reconciliation jobs for leaderboards
 from celery.schedules import crontab
 
-# Run daily recompute for previous day at 00:10 UTC
+# Leaderboards are kept exact by postMang.leaderboard_ingest (idempotent deltas), so
+# the daily full recomputes are retired; the weekly rebuild only reconciles drift.
 CELERY_BEAT_SCHEDULE = {
-    'recompute-points-daily-midnight-utc': {
-        'task': 'postMang.tasks.recompute_points_daily',
-        'schedule': crontab(minute=10, hour=0),
-        'args': (),
-        # Note: To recompute the previous day, you can set args dynamically via a small wrapper task
-    },
     'recompute-points-weekly-monday-utc': {
         'task': 'postMang.tasks.recompute_points_weekly',
         'schedule': crontab(minute=15, hour=0, day_of_week=1),
         'args': (),
     },
-    'recompute-points-alltime-daily': {
-        'task': 'postMang.tasks.recompute_points_alltime',
-        'schedule': crontab(minute=30, hour=1),
-        'args': (),
-    }
 }
 
 LOGGING = {